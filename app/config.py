@@ -5,7 +5,26 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
     github_webhook_secret: str
-    github_token: str
+    github_token: str = ""  # May be empty when a GitHub App is configured
+    # More personal access tokens (comma-separated); calls go to the one with the most budget left
+    github_tokens: str = ""
+    # GitHub App: owners that installed it are called with their installation's token
+    github_app_id: str = ""
+    github_app_private_key: str = ""  # PEM; "\n" escapes are accepted
+    github_app_private_key_path: str = ""  # Or a PEM file
+    github_api_url: str = "https://api.github.com"  # GitHub Enterprise: https://HOST/api/v3
+    github_timeout_seconds: float = 30.0  # Per-request timeout for GitHub API calls
+    github_max_connections: int = 20  # Pooled keep-alive connections to the GitHub API
+    github_cache_max_bytes: int = 33_554_432  # ETag cache of GitHub GETs (0 disables it)
+    github_cache_path: str = "data/github_cache.json"  # Where the cache is saved across restarts
+    # Rate limit scheduling: lanes keep a share of the hourly limit for higher ones
+    github_webhook_reserve: float = 0.1  # Webhook processing stops with this share left
+    github_background_reserve: float = 0.3  # Syncs and backfills stop with this share left
+    github_burst_ratio: float = 0.1  # Share of its spendable budget a lane may use in a burst
+    github_max_retry_wait_seconds: float = 60.0  # Longer rate limit pauses fail the call instead
+    # Dashboard diff viewer: PR diffs cached on disk per head commit
+    diff_cache_max_bytes: int = 268_435_456  # 0 disables the cache
+    diff_cache_path: str = "data/diff_cache"
 
     slack_bot_token: str | None = None
     slack_signing_secret: str | None = None
@@ -31,6 +50,44 @@ class Settings(BaseSettings):
     nerd_completion_api_key: str
     nerd_completion_base_url: str
 
+    # Database configuration
+    database_url: str = ""  # Empty for SQLite at data/notifications.db, or postgresql://...
+    database_pool_size: int = 10  # Max pooled PostgreSQL connections per process
+    db_reader_connections: int = 4  # Pooled read-only SQLite connections
+    db_write_batch_size: int = 64  # Max mutations committed in one transaction
+    db_write_batch_delay_ms: float = 2.0  # How long a batch waits for more writers
+    stats_reconcile_interval_seconds: int = 3600  # How often to recount notification stats
+
+    # Retention: archive notifications in these statuses once untouched this long
+    retention_days: int = 0  # 0 keeps everything in the hot tables
+    # Comma-separated; "merged"/"closed" are set when GitHub reports the PR merged or closed
+    retention_statuses: str = "merged,closed"
+    retention_interval_seconds: int = 3600  # How often the archiver runs
+    retention_batch_size: int = 500  # Notifications moved per write transaction
+
+    # Webhook processing: events are queued in the database and handled by workers
+    webhook_max_body_bytes: int = 1_048_576  # Larger deliveries are rejected with 413
+    webhook_workers: int = 4  # Concurrent webhook jobs per process
+    webhook_max_attempts: int = 5  # Attempts before a job is dead-lettered
+    webhook_retry_base_seconds: float = 5.0  # First retry delay; doubles per attempt
+    webhook_retry_max_seconds: float = 600.0  # Cap on the retry delay
+    webhook_job_lease_seconds: float = 900.0  # A claimed job is retried if not finished by then
+    webhook_delivery_ttl_hours: float = 72.0  # How long delivery ids are remembered for dedupe
+    webhook_delivery_cache_size: int = 10000  # Recent delivery ids kept in memory per process
+    webhook_coalesce_seconds: float = 10.0  # Quiet period that merges a burst of events for one PR
+    webhook_coalesce_max_seconds: float = 60.0  # Longest a burst can hold back its PR's job
+    webhook_repo_concurrency: int = 3  # Jobs per repository running at once (0 = no cap)
+    webhook_repo_weights: str = ""  # Comma-separated repo=weight shares of the workers (default 1)
+
+    # Load shedding: past any limit (0 disables it), new PRs get an instant
+    # heuristic summary and the AI analysis is backfilled once load drops
+    shed_queue_depth: int = 100  # Queued webhook jobs
+    shed_llm_in_flight: int = 8  # LLM calls in flight in this process
+    shed_llm_p95_seconds: float = 45.0  # p95 latency of recent LLM calls
+    shed_recover_ratio: float = 0.5  # Shedding stops once every signal is under this share of its limit
+    analysis_backfill_interval_seconds: int = 30  # How often deferred analyses are backfilled
+    analysis_backfill_batch_size: int = 5  # Deferred analyses redone per run
+
     host: str = "0.0.0.0"
     port: int = 8000
     log_level: str = "INFO"
@@ -1,174 +1,284 @@
 """
 Database setup and models for notification dashboard
+
+The functions here are the app's storage API. They delegate to a
+StorageBackend chosen from settings.database_url: SQLite (the default) or
+PostgreSQL for deployments that run several app processes.
 """
-import aiosqlite
-import json
-from datetime import datetime
+import asyncio
+import logging
 from pathlib import Path
 
+from app.db_backend import (  # noqa: F401 - re-exported for callers
+    MAX_PAGE_SIZE,
+    SNIPPET_END,
+    SNIPPET_START,
+    ChangeListener,
+    PayloadMerge,
+    StorageBackend,
+    decode_cursor,
+    encode_cursor,
+)
+from app.db_sqlite import SQLiteBackend
+
+logger = logging.getLogger(__name__)
+
 DATABASE_PATH = Path("data/notifications.db")
 
+# The active backend; created from settings on first use unless set explicitly
+backend: StorageBackend | None = None
+
+
+def create_backend(database_url: str, pool_size: int = 10) -> StorageBackend:
+    """Build the backend for a database URL (sqlite:///path or postgresql://...)."""
+    if database_url.startswith(("postgresql://", "postgres://")):
+        from app.db_postgres import PostgresBackend
+        return PostgresBackend(database_url, pool_size=pool_size)
+    if database_url.startswith("sqlite:///"):
+        return SQLiteBackend(Path(database_url.removeprefix("sqlite:///")))
+    if not database_url:
+        return SQLiteBackend(DATABASE_PATH)
+    raise ValueError(f"Unsupported database URL: {database_url}")
+
+
+def get_backend() -> StorageBackend:
+    """The active backend, created from settings the first time it is needed."""
+    global backend
+    if backend is None:
+        # Imported lazily so the module can be used without app settings
+        from app.config import settings
+        backend = create_backend(settings.database_url, pool_size=settings.database_pool_size)
+    return backend
+
 
 async def init_db():
-    """Initialize the database with required tables."""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        # Notifications table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                pr_number INTEGER NOT NULL,
-                pr_title TEXT NOT NULL,
-                pr_url TEXT NOT NULL,
-                pr_body TEXT,
-                repository TEXT NOT NULL,
-                author TEXT NOT NULL,
-                author_avatar TEXT,
-                branch_from TEXT,
-                branch_to TEXT,
-                summary TEXT,
-                ai_analysis TEXT,  -- JSON string
-                files_changed INTEGER,
-                additions INTEGER,
-                deletions INTEGER,
-                complexity TEXT,
-                status TEXT DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # User actions table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS user_actions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                notification_id INTEGER,
-                action TEXT NOT NULL,
-                comment TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (notification_id) REFERENCES notifications(id)
-            )
-        """)
-
-        await db.commit()
+    """Connect to the database and bring its schema up to date."""
+    await get_backend().init()
+
+
+async def close_db():
+    """Flush queued writes and close the database connections."""
+    if backend is not None:
+        await backend.close()
+
+
+def add_change_listener(listener: ChangeListener):
+    """Be told about each committed notification insert or status change."""
+    get_backend().add_change_listener(listener)
 
 
 async def save_notification(pr_event, pr_summary: dict) -> int:
-    """Save a PR notification to the database."""
-    pr = pr_event.pull_request
-    repo = pr_event.repository
-
-    ai_analysis_json = json.dumps(pr_summary.get('ai_analysis', {}))
-
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute("""
-            INSERT INTO notifications (
-                pr_number, pr_title, pr_url, pr_body,
-                repository, author, author_avatar,
-                branch_from, branch_to,
-                summary, ai_analysis,
-                files_changed, additions, deletions, complexity
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            pr.number,
-            pr.title,
-            pr.html_url,
-            pr.body,
-            repo.full_name,
-            pr.user.login,
-            pr.user.avatar_url,
-            pr.head['ref'],
-            pr.base['ref'],
-            pr_summary.get('summary_text', ''),
-            ai_analysis_json,
-            pr_summary.get('files_changed', 0),
-            pr_summary.get('additions', 0),
-            pr_summary.get('deletions', 0),
-            pr_summary.get('complexity', 'Unknown')
-        ))
-
-        await db.commit()
-        return cursor.lastrowid
+    """
+    Save a PR notification to the database.
+
+    A PR has a single notification: later events for it update that row (and
+    count as an event on it) rather than adding another.
+    """
+    return await get_backend().save_notification(pr_event, pr_summary)
+
+
+async def upsert_notifications(batch: list[tuple]) -> list[int]:
+    """Save many (pr_event, pr_summary) pairs in one transaction; returns their ids."""
+    return await get_backend().upsert_notifications(batch)
+
+
+async def get_notifications_page(
+    status_filter: str = None,
+    limit: int = 50,
+    cursor: str = None,
+    include_archived: bool = False,
+) -> tuple[list[dict], str | None]:
+    """
+    Get one page of notifications, newest first.
+
+    Paginates by keyset on (created_at, id): every page costs the same no
+    matter how deep it is, and rows inserted while paging never shift later
+    pages. Returns the rows and the cursor for the next page (None on the last
+    page). Raises ValueError for a malformed cursor.
+    """
+    return await get_backend().get_notifications_page(
+        status_filter, limit, cursor, include_archived
+    )
 
 
 async def get_all_notifications(status_filter: str = None, limit: int = 50):
-    """Get all notifications, optionally filtered by status."""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    """Get the newest notifications, optionally filtered by status."""
+    rows, _ = await get_notifications_page(status_filter=status_filter, limit=limit)
+    return rows
+
+
+async def iter_notifications(status_filter: str = None, page_size: int = MAX_PAGE_SIZE):
+    """Iterate over every notification, newest first, one page at a time."""
+    cursor = None
+    while True:
+        rows, cursor = await get_notifications_page(status_filter, page_size, cursor)
+        for row in rows:
+            yield row
+        if cursor is None:
+            return
+
 
-        if status_filter:
-            cursor = await db.execute("""
-                SELECT * FROM notifications
-                WHERE status = ?
-                ORDER BY created_at DESC
-                LIMIT ?
-            """, (status_filter, limit))
-        else:
-            cursor = await db.execute("""
-                SELECT * FROM notifications
-                ORDER BY created_at DESC
-                LIMIT ?
-            """, (limit,))
+async def search_notifications(
+    text: str,
+    status_filter: str = None,
+    repository: str = None,
+    limit: int = 20,
+) -> list[dict]:
+    """
+    Full-text search over PR titles, bodies, summaries and AI key changes/risks.
 
-        rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+    Results are ranked by relevance, and each carries a `snippet` of the best
+    matching text with matches wrapped in SNIPPET_START/SNIPPET_END.
+    """
+    return await get_backend().search_notifications(text, status_filter, repository, limit)
 
 
-async def get_notification_by_id(notification_id: int):
-    """Get a single notification by ID."""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
+async def get_notification_by_id(
+    notification_id: int, include_details: bool = False, include_archived: bool = False
+):
+    """
+    Get a single notification by ID.
 
-        cursor = await db.execute("""
-            SELECT * FROM notifications WHERE id = ?
-        """, (notification_id,))
+    With include_details, pr_body and the full decoded ai_analysis are loaded;
+    otherwise `ai_analysis` is the card preview.
+    """
+    return await get_backend().get_notification_by_id(
+        notification_id, include_details, include_archived
+    )
 
-        row = await cursor.fetchone()
-        return dict(row) if row else None
+
+async def get_notification_by_pr(repository: str, pr_number: int):
+    """Get the notification for a PR."""
+    return await get_backend().get_notification_by_pr(repository, pr_number)
+
+
+async def get_notifications_pending_analysis(limit: int = 10) -> list[dict]:
+    """Notifications saved with a heuristic analysis that still need the AI one."""
+    return await get_backend().get_notifications_pending_analysis(limit)
+
+
+async def get_analysis_versions(notification_id: int, limit: int = 20) -> list[dict]:
+    """A notification's AI analysis history (one version per analysis), newest first."""
+    return await get_backend().get_analysis_versions(notification_id, limit)
 
 
 async def update_notification_status(notification_id: int, status: str):
     """Update the status of a notification."""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("""
-            UPDATE notifications
-            SET status = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """, (status, notification_id))
-
-        await db.commit()
+    await get_backend().update_notification_status(notification_id, status)
 
 
 async def save_user_action(notification_id: int, action: str, comment: str = None):
     """Save a user action on a notification."""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("""
-            INSERT INTO user_actions (notification_id, action, comment)
-            VALUES (?, ?, ?)
-        """, (notification_id, action, comment))
-
-        await db.commit()
+    return await get_backend().save_user_action(notification_id, action, comment)
 
 
 async def get_notification_stats():
     """Get summary statistics about notifications."""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-
-        cursor = await db.execute("""
-            SELECT
-                status,
-                COUNT(*) as count
-            FROM notifications
-            GROUP BY status
-        """)
-
-        rows = await cursor.fetchall()
-        stats = {row['status']: row['count'] for row in rows}
-
-        return {
-            'pending': stats.get('pending', 0),
-            'approved': stats.get('approved', 0),
-            'changes_requested': stats.get('changes_requested', 0),
-            'commented': stats.get('commented', 0),
-            'total': sum(stats.values())
-        }
+    return await get_backend().get_notification_stats()
+
+
+async def rebuild_notification_stats() -> dict:
+    """Recount the notification stats, repairing any drift."""
+    return await get_backend().rebuild_notification_stats()
+
+
+async def archive_old_notifications(
+    older_than_days: int, statuses: list[str], batch_size: int = 500
+) -> int:
+    """Move finished notifications out of the hot tables; returns how many moved."""
+    return await get_backend().archive_notifications(older_than_days, statuses, batch_size)
+
+
+async def archive_forever(
+    interval_seconds: int, older_than_days: int, statuses: list[str], batch_size: int
+):
+    """Background job: apply the retention policy, then repeat every interval."""
+    while True:
+        try:
+            await archive_old_notifications(older_than_days, statuses, batch_size)
+        except Exception as e:
+            logger.error(f"Error archiving notifications: {e}", exc_info=True)
+        await asyncio.sleep(interval_seconds)
+
+
+async def enqueue_job(
+    event_type: str,
+    payload: str,
+    delivery_id: str = None,
+    coalesce_key: str = None,
+    window_seconds: float = 0.0,
+    max_wait_seconds: float = 0.0,
+    merge: PayloadMerge = None,
+    repository: str = None,
+) -> int | None:
+    """
+    Durably queue a raw webhook event; returns the job id once committed, or
+    None if `delivery_id` was already received.
+
+    Events sharing a `coalesce_key` within the debounce window are merged
+    into one job (see StorageBackend.enqueue_job).
+    """
+    return await get_backend().enqueue_job(
+        event_type, payload, delivery_id, coalesce_key, window_seconds, max_wait_seconds, merge,
+        repository,
+    )
+
+
+async def prune_deliveries(older_than_seconds: float) -> int:
+    """Forget webhook delivery ids older than the deduplication window."""
+    return await get_backend().prune_deliveries(older_than_seconds)
+
+
+async def prune_deliveries_forever(interval_seconds: int, older_than_seconds: float):
+    """Background job: periodically expire remembered webhook delivery ids."""
+    while True:
+        try:
+            await prune_deliveries(older_than_seconds)
+        except Exception as e:
+            logger.error(f"Error pruning webhook deliveries: {e}", exc_info=True)
+        await asyncio.sleep(interval_seconds)
+
+
+async def claim_jobs(
+    limit: int,
+    lease_seconds: float,
+    per_repository_limit: int = 0,
+    repository_weights: dict[str, float] = None,
+) -> list[dict]:
+    """
+    Lease up to `limit` due webhook jobs for processing, round-robin across
+    repositories (see StorageBackend.claim_jobs).
+    """
+    return await get_backend().claim_jobs(
+        limit, lease_seconds, per_repository_limit, repository_weights
+    )
+
+
+async def complete_job(job_id: int):
+    """Remove a processed webhook job."""
+    await get_backend().complete_job(job_id)
+
+
+async def fail_job(job_id: int, error: str, retry_in: float | None):
+    """Retry a webhook job after `retry_in` seconds, or dead-letter it if None."""
+    await get_backend().fail_job(job_id, error, retry_in)
+
+
+async def recover_jobs() -> int:
+    """Requeue webhook jobs left running by a worker that is gone."""
+    return await get_backend().recover_jobs()
+
+
+async def get_job_queue_stats() -> dict:
+    """Webhook job counts per status and the age of the oldest due job."""
+    return await get_backend().get_job_queue_stats()
+
+
+async def reconcile_stats_forever(interval_seconds: int):
+    """Background job: periodically rebuild the stats counters."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await rebuild_notification_stats()
+        except Exception as e:
+            logger.error(f"Error reconciling notification stats: {e}", exc_info=True)
@@ -0,0 +1,313 @@
+"""
+Storage backend interface shared by the SQLite and PostgreSQL implementations
+"""
+import base64
+import json
+import logging
+import re
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on rows returned by a single page of notifications
+MAX_PAGE_SIZE = 200
+
+# Search snippet markers; control characters cannot occur in the indexed text, so
+# callers can escape the snippet and then turn these into highlight tags
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+
+# PR events that put a notification back in the reviewer's queue when they
+# arrive for a PR that already has one
+REQUEUE_EVENTS = ("reopened", "review_requested")
+
+# Webhook job states. Finished jobs are deleted; "dead" jobs ran out of attempts
+# and stay for inspection.
+JOB_STATUSES = ("queued", "running", "dead")
+
+# Combines a queued job's payload with a newer event's payload for the same key
+PayloadMerge = Callable[[str, str], str]
+
+# Receives {"notification_id": int, "action": "new" | "update"} after a write commits
+ChangeListener = Callable[[dict], Awaitable[None]]
+
+
+def encode_cursor(created_at: str, notification_id: int) -> str:
+    """Build an opaque pagination cursor pointing just past a row."""
+    raw = json.dumps([created_at, notification_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    """Decode a cursor from encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, notification_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+    if not isinstance(created_at, str) or not isinstance(notification_id, int):
+        raise ValueError("Invalid cursor")
+    return created_at, notification_id
+
+
+def search_terms(text: str) -> list[str]:
+    """Split free search text into words; operators typed by the user become plain text."""
+    return re.findall(r"\w+", text)
+
+
+def format_stats(stats: dict) -> dict:
+    """Shape per-status counts the way the dashboard expects."""
+    return {
+        'pending': stats.get('pending', 0),
+        'approved': stats.get('approved', 0),
+        'changes_requested': stats.get('changes_requested', 0),
+        'commented': stats.get('commented', 0),
+        'total': sum(stats.values())
+    }
+
+
+def format_job_stats(counts: dict, lag_seconds: float | None) -> dict:
+    """Shape webhook job queue depth and lag for monitoring."""
+    stats = {status: counts.get(status, 0) for status in JOB_STATUSES}
+    stats['lag_seconds'] = round(max(0.0, lag_seconds or 0.0), 3)
+    return stats
+
+
+def notification_fields(pr_event, pr_summary: dict) -> dict:
+    """Column values for a notification, extracted from a PR event and its summary."""
+    pr = pr_event.pull_request
+    return {
+        'pr_number': pr.number,
+        'pr_title': pr.title,
+        'pr_url': pr.html_url,
+        'pr_body': pr.body,
+        'repository': pr_event.repository.full_name,
+        'author': pr.user.login,
+        'author_avatar': pr.user.avatar_url,
+        'branch_from': pr.head.ref,
+        'branch_to': pr.base.ref,
+        'summary': pr_summary.get('summary_text', ''),
+        'ai_analysis': pr_summary.get('ai_analysis', {}),
+        'files_changed': pr_summary.get('files_changed', 0),
+        'additions': pr_summary.get('additions', 0),
+        'deletions': pr_summary.get('deletions', 0),
+        'complexity': pr_summary.get('complexity', 'Unknown'),
+        'last_event': getattr(pr_event, 'action', None),
+        'head_sha': pr.head.sha,
+        'analysis_changes': pr_summary.get('analysis_changes'),
+        'analysis_pending': bool(pr_summary.get('analysis_pending')),
+        # A backfilled analysis refreshes the row without counting as a PR event
+        'event_count': 0 if pr_summary.get('backfill') else 1,
+    }
+
+
+def latest_per_pr(rows: list[dict]) -> dict[tuple[str, int], dict]:
+    """notification_fields rows keyed by (repository, pr_number); later rows win."""
+    return {(row['repository'], row['pr_number']): row for row in rows}
+
+
+class StorageBackend(ABC):
+    """
+    Everything the app needs from its notification store.
+
+    Rows are plain dicts in the same shape for every backend: list queries
+    return the card columns with `ai_analysis` holding the card preview, and
+    get_notification_by_id(include_details=True) adds `pr_body` and the full
+    analysis. `created_at`/`updated_at` are "YYYY-MM-DD HH:MM:SS" UTC strings.
+    """
+
+    def __init__(self):
+        self._change_listeners: list[ChangeListener] = []
+
+    @abstractmethod
+    async def init(self):
+        """Open connections and bring the schema up to date."""
+
+    @abstractmethod
+    async def close(self):
+        """Flush pending writes and close every connection."""
+
+    async def save_notification(self, pr_event, pr_summary: dict) -> int:
+        """Save a PR notification (see upsert_notifications) and return its id."""
+        return (await self.upsert_notifications([(pr_event, pr_summary)]))[0]
+
+    @abstractmethod
+    async def upsert_notifications(self, batch: list[tuple]) -> list[int]:
+        """
+        Save (pr_event, pr_summary) pairs in one transaction; returns their ids.
+
+        There is one notification per (repository, pr_number): an event for a
+        PR that already has one refreshes its content, bumps `event_count` and
+        records `last_event` instead of adding a row. REQUEUE_EVENTS also reset
+        its status to pending. Listeners hear "new" or "update" accordingly.
+
+        Each saved AI analysis also becomes the PR's next analysis version,
+        tagged with the head SHA it covers (see get_analysis_versions).
+
+        A summary with `analysis_pending` marks a placeholder analysis to be
+        redone (see get_notifications_pending_analysis); one with `backfill`
+        is such a redo and leaves event_count, last_event and status alone.
+        """
+
+    @abstractmethod
+    async def get_notifications_page(
+        self,
+        status_filter: str = None,
+        limit: int = 50,
+        cursor: str = None,
+        include_archived: bool = False,
+    ) -> tuple[list[dict], str | None]:
+        """One page of notifications, newest first, plus the next page's cursor."""
+
+    @abstractmethod
+    async def get_notification_by_id(
+        self, notification_id: int, include_details: bool = False, include_archived: bool = False
+    ):
+        """A single notification (None if missing)."""
+
+    @abstractmethod
+    async def get_notification_by_pr(self, repository: str, pr_number: int):
+        """The notification for a PR (None if missing)."""
+
+    @abstractmethod
+    async def get_notifications_pending_analysis(self, limit: int = 10) -> list[dict]:
+        """Notifications whose AI analysis is still a placeholder, least recently updated first."""
+
+    @abstractmethod
+    async def get_analysis_versions(self, notification_id: int, limit: int = 20) -> list[dict]:
+        """
+        A notification's AI analysis history, newest first.
+
+        Rows have version, head_sha, ai_analysis (the full analysis as of that
+        version), changes (for an incremental update, the analysis of just the
+        new commits; None for a full one), created_at, and since_last_review
+        (created after the latest user action on the notification).
+        """
+
+    @abstractmethod
+    async def update_notification_status(self, notification_id: int, status: str):
+        """Set a notification's status."""
+
+    @abstractmethod
+    async def save_user_action(self, notification_id: int, action: str, comment: str = None) -> int:
+        """Record a user action and return its id."""
+
+    @abstractmethod
+    async def get_notification_stats(self) -> dict:
+        """Per-status counts, shaped by format_stats."""
+
+    @abstractmethod
+    async def rebuild_notification_stats(self) -> dict:
+        """Recount the stats from scratch (repairing any materialized counters)."""
+
+    @abstractmethod
+    async def archive_notifications(
+        self, older_than_days: int, statuses: list[str], batch_size: int = 500
+    ) -> int:
+        """
+        Move notifications in `statuses` not updated for `older_than_days` (with
+        their details and user actions) out of the hot tables, in batches.
+        Returns how many were archived. Archived rows keep their ids and are
+        only returned by calls that pass include_archived.
+        """
+
+    @abstractmethod
+    async def search_notifications(
+        self, text: str, status_filter: str = None, repository: str = None, limit: int = 20
+    ) -> list[dict]:
+        """Full-text search, best match first; each row has a marked-up `snippet`."""
+
+    @abstractmethod
+    async def enqueue_job(
+        self,
+        event_type: str,
+        payload: str,
+        delivery_id: str | None = None,
+        coalesce_key: str | None = None,
+        window_seconds: float = 0.0,
+        max_wait_seconds: float = 0.0,
+        merge: PayloadMerge | None = None,
+        repository: str | None = None,
+    ) -> int | None:
+        """
+        Durably queue a raw webhook event (JSON text); returns the job id once
+        committed. `repository` is what claim_jobs schedules fairly by. A `delivery_id` seen before (and not yet pruned) is not
+        queued again: returns None.
+
+        A job with a `coalesce_key` is debounced: it becomes due after
+        `window_seconds`, and an event with the same key arriving while it is
+        still queued is folded into it (payload = merge(queued, new), or the
+        new payload) instead of becoming a job of its own. Each merge restarts
+        the window, but the job is never held more than `max_wait_seconds`
+        after it was created. A job queued again by fail_job takes no more
+        events, so its backoff stands. Returns the id of the job the event
+        joined.
+        """
+
+    @abstractmethod
+    async def prune_deliveries(self, older_than_seconds: float) -> int:
+        """Forget delivery ids recorded more than `older_than_seconds` ago; returns how many."""
+
+    @abstractmethod
+    async def claim_jobs(
+        self,
+        limit: int,
+        lease_seconds: float,
+        per_repository_limit: int = 0,
+        repository_weights: dict[str, float] | None = None,
+    ) -> list[dict]:
+        """
+        Take up to `limit` due jobs and mark them running.
+
+        Repositories are served weighted round-robin: a job's turn is its
+        position in its repository's queue plus the jobs that repository
+        already has running, divided by the repository's weight (default 1),
+        lowest first and oldest first within a turn. So a repository with a
+        deep backlog cannot hold back another's next job. With a
+        `per_repository_limit`, no repository gets more running jobs than
+        that. Jobs without a repository share one queue.
+
+        A claim is a lease: a running job whose lease expired (its worker died)
+        is due again. Each claim counts as an attempt. Rows have id,
+        event_type, repository, payload (JSON text), attempts and events (how
+        many events were coalesced into the job).
+        """
+
+    @abstractmethod
+    async def complete_job(self, job_id: int):
+        """Remove a finished job."""
+
+    @abstractmethod
+    async def fail_job(self, job_id: int, error: str, retry_in: float | None):
+        """Record a failed attempt: retry after `retry_in` seconds, or dead-letter if None."""
+
+    @abstractmethod
+    async def recover_jobs(self) -> int:
+        """
+        Requeue running jobs whose worker is gone (called at startup); returns
+        how many. A backend shared between processes only requeues expired leases.
+        """
+
+    @abstractmethod
+    async def get_job_queue_stats(self) -> dict:
+        """Jobs per status plus the age of the oldest due job, shaped by format_job_stats."""
+
+    def add_change_listener(self, listener: ChangeListener):
+        """
+        Call `listener` after each committed notification insert or status change.
+
+        Backends that share a database between processes deliver changes made
+        by every process, not only this one.
+        """
+        if listener not in self._change_listeners:
+            self._change_listeners.append(listener)
+
+    async def _emit_change(self, notification_id: int, action: str):
+        event = {"notification_id": notification_id, "action": action}
+        for listener in self._change_listeners:
+            try:
+                await listener(event)
+            except Exception as e:
+                logger.error(f"Error in notification change listener: {e}", exc_info=True)
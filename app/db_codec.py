@@ -0,0 +1,38 @@
+"""
+Compression for large text columns stored as BLOBs
+"""
+import json
+import zlib
+
+# zlib level 6 is the library default: most of the size win of level 9 at a
+# fraction of the CPU cost on write
+COMPRESSION_LEVEL = 6
+
+
+def compress_text(text: str | None) -> bytes | None:
+    """Compress a text value for storage (None stays None)."""
+    if text is None:
+        return None
+    return zlib.compress(text.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def decompress_text(blob: bytes | None) -> str | None:
+    """Inverse of compress_text."""
+    if blob is None:
+        return None
+    return zlib.decompress(blob).decode("utf-8")
+
+
+def compress_json(value) -> bytes:
+    """Serialize a JSON-compatible value and compress it."""
+    return compress_text(json.dumps(value))
+
+
+def decompress_json(blob: bytes | None, default=None):
+    """Inverse of compress_json; returns `default` for a missing or corrupt blob."""
+    if blob is None:
+        return default
+    try:
+        return json.loads(decompress_text(blob))
+    except (zlib.error, ValueError):
+        return default
@@ -0,0 +1,423 @@
+"""
+Schema definition and versioned migrations for the notifications database
+"""
+import json
+import logging
+
+from app.db_codec import compress_text, decompress_json, decompress_text
+
+logger = logging.getLogger(__name__)
+
+# Base tables, created idempotently on every startup
+BASE_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS notifications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pr_number INTEGER NOT NULL,
+        pr_title TEXT NOT NULL,
+        pr_url TEXT NOT NULL,
+        pr_body TEXT,
+        repository TEXT NOT NULL,
+        author TEXT NOT NULL,
+        author_avatar TEXT,
+        branch_from TEXT,
+        branch_to TEXT,
+        summary TEXT,
+        ai_analysis TEXT,  -- JSON string
+        files_changed INTEGER,
+        additions INTEGER,
+        deletions INTEGER,
+        complexity TEXT,
+        status TEXT DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_actions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        notification_id INTEGER,
+        action TEXT NOT NULL,
+        comment TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (notification_id) REFERENCES notifications(id)
+    )
+    """,
+)
+
+# Number of key changes kept inline for the dashboard cards
+PREVIEW_KEY_CHANGES = 3
+
+
+def analysis_preview(ai_analysis: dict | None) -> str | None:
+    """JSON for the small slice of the AI analysis that the dashboard cards render."""
+    if not ai_analysis or not ai_analysis.get("functional_summary"):
+        return None
+    return json.dumps({
+        "functional_summary": ai_analysis["functional_summary"],
+        "key_changes": list(ai_analysis.get("key_changes") or [])[:PREVIEW_KEY_CHANGES],
+    })
+
+
+async def _move_large_columns_to_details(db):
+    """Copy pr_body/ai_analysis into notification_details as compressed blobs."""
+    cursor = await db.execute("SELECT id, pr_body, ai_analysis FROM notifications")
+    while True:
+        rows = await cursor.fetchmany(500)
+        if not rows:
+            break
+
+        details = []
+        previews = []
+        for notification_id, pr_body, ai_analysis_json in rows:
+            try:
+                ai_analysis = json.loads(ai_analysis_json) if ai_analysis_json else {}
+            except ValueError:
+                ai_analysis = {}
+            details.append((notification_id, compress_text(pr_body), compress_text(ai_analysis_json)))
+            previews.append((analysis_preview(ai_analysis), notification_id))
+
+        await db.executemany(
+            "INSERT OR REPLACE INTO notification_details (notification_id, pr_body, ai_analysis)"
+            " VALUES (?, ?, ?)",
+            details,
+        )
+        await db.executemany(
+            "UPDATE notifications SET analysis_preview = ? WHERE id = ?", previews
+        )
+
+
+def search_analysis_text(ai_analysis: dict | None) -> str:
+    """The AI analysis text that is indexed for full-text search."""
+    if not ai_analysis:
+        return ""
+    parts = [str(change) for change in ai_analysis.get("key_changes") or []]
+    if ai_analysis.get("risk_assessment"):
+        parts.append(str(ai_analysis["risk_assessment"]))
+    return "\n".join(parts)
+
+
+async def _backfill_search_index(db):
+    """Index existing notifications; the body and analysis are only stored compressed."""
+    cursor = await db.execute("""
+        SELECT n.id, n.pr_title, n.summary, d.pr_body, d.ai_analysis
+        FROM notifications n
+        LEFT JOIN notification_details d ON d.notification_id = n.id
+    """)
+    while True:
+        rows = await cursor.fetchmany(500)
+        if not rows:
+            break
+        await db.executemany(
+            "INSERT INTO notification_search (rowid, pr_title, pr_body, summary, analysis)"
+            " VALUES (?, ?, ?, ?, ?)",
+            [
+                (notification_id, pr_title, decompress_text(pr_body), summary,
+                 search_analysis_text(decompress_json(ai_analysis, {})))
+                for notification_id, pr_title, summary, pr_body, ai_analysis in rows
+            ],
+        )
+
+
+# (version, description, statements) - applied in order, tracked via PRAGMA user_version.
+# A statement is either SQL or an async callable taking the connection (for data
+# migrations that need Python). Never edit a released migration; append a new one instead.
+MIGRATIONS = [
+    (
+        1,
+        "Indexes for dashboard lists, stats and PR lookups",
+        (
+            # Status-filtered list (WHERE status = ? ORDER BY created_at DESC); also a
+            # covering index for the GROUP BY status stats query
+            "CREATE INDEX IF NOT EXISTS idx_notifications_status_created"
+            " ON notifications(status, created_at)",
+            # Unfiltered list (ORDER BY created_at DESC LIMIT ?)
+            "CREATE INDEX IF NOT EXISTS idx_notifications_created"
+            " ON notifications(created_at)",
+            # Lookups by PR from the webhook handler and sync utilities
+            "CREATE INDEX IF NOT EXISTS idx_notifications_repo_pr"
+            " ON notifications(repository, pr_number)",
+            # Action history per notification
+            "CREATE INDEX IF NOT EXISTS idx_user_actions_notification_created"
+            " ON user_actions(notification_id, created_at)",
+        ),
+    ),
+    (
+        2,
+        "Materialized per-status notification counters",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS notification_stats (
+                status TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            )
+            """,
+            # Triggers run inside the writing statement's transaction, so the
+            # counters can never disagree with a committed notifications row.
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_notification_stats_insert
+            AFTER INSERT ON notifications
+            BEGIN
+                INSERT INTO notification_stats (status, count) VALUES (NEW.status, 1)
+                ON CONFLICT(status) DO UPDATE SET count = count + 1;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_notification_stats_update
+            AFTER UPDATE OF status ON notifications
+            WHEN OLD.status IS NOT NEW.status
+            BEGIN
+                UPDATE notification_stats SET count = count - 1 WHERE status = OLD.status;
+                INSERT INTO notification_stats (status, count) VALUES (NEW.status, 1)
+                ON CONFLICT(status) DO UPDATE SET count = count + 1;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_notification_stats_delete
+            AFTER DELETE ON notifications
+            BEGIN
+                UPDATE notification_stats SET count = count - 1 WHERE status = OLD.status;
+            END
+            """,
+            # Backfill from existing history
+            """
+            INSERT OR REPLACE INTO notification_stats (status, count)
+            SELECT status, COUNT(*) FROM notifications GROUP BY status
+            """,
+        ),
+    ),
+    (
+        3,
+        "Move pr_body and ai_analysis into a compressed side table",
+        (
+            # Loaded only when a single notification is opened, so list scans
+            # touch far fewer pages
+            """
+            CREATE TABLE IF NOT EXISTS notification_details (
+                notification_id INTEGER PRIMARY KEY REFERENCES notifications(id),
+                pr_body BLOB,  -- zlib-compressed UTF-8
+                ai_analysis BLOB  -- zlib-compressed JSON
+            )
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_notification_details_delete
+            AFTER DELETE ON notifications
+            BEGIN
+                DELETE FROM notification_details WHERE notification_id = OLD.id;
+            END
+            """,
+            # Small JSON ({functional_summary, key_changes[:3]}) the cards render
+            "ALTER TABLE notifications ADD COLUMN analysis_preview TEXT",
+            _move_large_columns_to_details,
+            "ALTER TABLE notifications DROP COLUMN pr_body",
+            "ALTER TABLE notifications DROP COLUMN ai_analysis",
+        ),
+    ),
+    (
+        4,
+        "Full-text search index over titles, bodies, summaries and AI analysis",
+        (
+            # rowid is the notification id. pr_body and analysis are stored
+            # compressed in notification_details, which SQL cannot read, so the
+            # write path indexes them; the triggers keep the plain columns in sync.
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS notification_search USING fts5(
+                pr_title, pr_body, summary, analysis,
+                tokenize = 'porter unicode61 remove_diacritics 2'
+            )
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_notification_search_update
+            AFTER UPDATE OF pr_title, summary ON notifications
+            BEGIN
+                UPDATE notification_search
+                SET pr_title = NEW.pr_title, summary = NEW.summary
+                WHERE rowid = NEW.id;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_notification_search_delete
+            AFTER DELETE ON notifications
+            BEGIN
+                DELETE FROM notification_search WHERE rowid = OLD.id;
+            END
+            """,
+            _backfill_search_index,
+        ),
+    ),
+    (
+        5,
+        "One notification per PR, updated in place by later events",
+        (
+            "ALTER TABLE notifications ADD COLUMN event_count INTEGER NOT NULL DEFAULT 1",
+            "ALTER TABLE notifications ADD COLUMN last_event TEXT",
+            # Fold duplicate rows into the newest one per PR: it takes over their
+            # event count and user actions, and the delete triggers clean up the rest
+            """
+            UPDATE notifications
+            SET event_count = (
+                SELECT COUNT(*) FROM notifications d
+                WHERE d.repository = notifications.repository
+                  AND d.pr_number = notifications.pr_number
+            )
+            WHERE id IN (
+                SELECT MAX(id) FROM notifications
+                GROUP BY repository, pr_number HAVING COUNT(*) > 1
+            )
+            """,
+            """
+            UPDATE user_actions
+            SET notification_id = (
+                SELECT MAX(k.id) FROM notifications d
+                JOIN notifications k
+                  ON k.repository = d.repository AND k.pr_number = d.pr_number
+                WHERE d.id = user_actions.notification_id
+            )
+            WHERE notification_id IN (
+                SELECT id FROM notifications
+                WHERE id NOT IN (SELECT MAX(id) FROM notifications GROUP BY repository, pr_number)
+            )
+            """,
+            """
+            DELETE FROM notifications
+            WHERE id NOT IN (SELECT MAX(id) FROM notifications GROUP BY repository, pr_number)
+            """,
+            "DROP INDEX IF EXISTS idx_notifications_repo_pr",
+            # The conflict target for the save_notification upsert
+            "CREATE UNIQUE INDEX idx_notifications_repo_pr"
+            " ON notifications(repository, pr_number)",
+        ),
+    ),
+    (
+        6,
+        "Durable queue of webhook events awaiting processing",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS webhook_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                event_type TEXT NOT NULL,
+                payload BLOB NOT NULL,  -- zlib-compressed JSON body
+                status TEXT NOT NULL DEFAULT 'queued',  -- queued | running | dead
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                -- When a queued job is next due; for a running job, when its lease expires
+                run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            # Claiming due jobs and measuring lag
+            "CREATE INDEX IF NOT EXISTS idx_webhook_jobs_status_run_after"
+            " ON webhook_jobs(status, run_after)",
+        ),
+    ),
+    (
+        7,
+        "Recently received webhook delivery ids, for deduplicating redeliveries",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS webhook_deliveries (
+                delivery_id TEXT PRIMARY KEY,  -- X-GitHub-Delivery
+                received_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            ) WITHOUT ROWID
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_received"
+            " ON webhook_deliveries(received_at)",
+        ),
+    ),
+    (
+        8,
+        "Coalesce bursts of webhook events for the same PR into one job",
+        (
+            "ALTER TABLE webhook_jobs ADD COLUMN coalesce_key TEXT",  # e.g. org/repo#12
+            "ALTER TABLE webhook_jobs ADD COLUMN events INTEGER NOT NULL DEFAULT 1",
+            # Finding the queued job a new event joins
+            "CREATE INDEX IF NOT EXISTS idx_webhook_jobs_queued_key"
+            " ON webhook_jobs(coalesce_key) WHERE status = 'queued'",
+        ),
+    ),
+    (
+        9,
+        "Per-PR history of AI analysis versions",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS analysis_versions (
+                notification_id INTEGER NOT NULL REFERENCES notifications(id),
+                version INTEGER NOT NULL,
+                head_sha TEXT,  -- PR head the analysis covers
+                ai_analysis BLOB NOT NULL,  -- zlib-compressed JSON
+                changes BLOB,  -- zlib-compressed JSON; incremental updates only
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (notification_id, version)
+            ) WITHOUT ROWID
+            """,
+            # History is not archived: an archived card keeps only its final analysis
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_analysis_versions_delete
+            AFTER DELETE ON notifications
+            BEGIN
+                DELETE FROM analysis_versions WHERE notification_id = OLD.id;
+            END
+            """,
+        ),
+    ),
+    (
+        10,
+        "Repository of each webhook job, for fair scheduling",
+        (
+            "ALTER TABLE webhook_jobs ADD COLUMN repository TEXT",
+        ),
+    ),
+    (
+        11,
+        "Flag notifications holding a heuristic analysis awaiting the AI one",
+        (
+            "ALTER TABLE notifications ADD COLUMN analysis_pending INTEGER NOT NULL DEFAULT 0",
+            # The backfill's work list; normally empty
+            "CREATE INDEX IF NOT EXISTS idx_notifications_analysis_pending"
+            " ON notifications(updated_at) WHERE analysis_pending = 1",
+        ),
+    ),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def apply_migrations(db, up_to: int | None = None) -> int:
+    """
+    Bring an open aiosqlite connection up to SCHEMA_VERSION (or `up_to`).
+
+    Each version is applied in one transaction with its user_version bump:
+    a migration that fails leaves the database at the previous version, so
+    it can be fixed and re-run. Returns the schema version after migrating.
+    """
+    for statement in BASE_SCHEMA:
+        await db.execute(statement)
+
+    cursor = await db.execute("PRAGMA user_version")
+    current = (await cursor.fetchone())[0]
+
+    target = SCHEMA_VERSION if up_to is None else up_to
+
+    for version, description, statements in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+        # DDL would otherwise autocommit statement by statement
+        await db.commit()
+        await db.execute("BEGIN")
+        try:
+            for statement in statements:
+                if callable(statement):
+                    await statement(db)
+                else:
+                    await db.execute(statement)
+            await db.execute(f"PRAGMA user_version = {version}")
+        except BaseException:
+            await db.rollback()
+            raise
+        await db.commit()
+        logger.info(f"Applied database migration {version}: {description}")
+        current = version
+
+    return current
+
@@ -0,0 +1,147 @@
+"""
+SQLite connection pool: one writer and a set of readers kept open for the app lifetime
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+# sqlite3 keeps an LRU of compiled statements per connection; long-lived
+# connections therefore reuse prepared statements across requests.
+STATEMENT_CACHE_SIZE = 256
+
+# Applied to every connection when it is opened
+CONNECTION_PRAGMAS = (
+    # Only takes effect on a new file (or after a VACUUM); lets deleted pages
+    # be handed back to the filesystem a few at a time
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",  # Durable in WAL mode, fsync only at checkpoints
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -16000",  # ~16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",  # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+class DatabasePool:
+    """
+    Owns the long-lived SQLite connections used by the app.
+
+    WAL mode lets the readers run concurrently with the single writer, and
+    funnelling every write through one connection (guarded by a lock) means
+    writers never race each other into `database is locked`.
+    """
+
+    def __init__(self, path: Path, readers: int | None = None, attach: dict | None = None):
+        self.path = Path(path)
+        # Extra database files ATTACHed to every connection, as {schema name: path}
+        self.attach = {name: Path(attached) for name, attached in (attach or {}).items()}
+        # None means "use settings.db_reader_connections", resolved when the pool opens
+        self.reader_count = readers
+        self._writer: aiosqlite.Connection | None = None
+        self._reader_conns: list[aiosqlite.Connection] = []
+        self._idle_readers: asyncio.Queue | None = None
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def open(self):
+        """Open the writer and reader connections (no-op if already open)."""
+        if self._writer is not None:
+            return
+
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+
+            if self.reader_count is None:
+                # Imported lazily so the module can be used without app settings
+                from app.config import settings
+                self.reader_count = settings.db_reader_connections
+            self.reader_count = max(1, self.reader_count)
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            # The writer goes first so the file exists and is in WAL mode
+            writer = await self._connect()
+            readers = [await self._connect(read_only=True) for _ in range(self.reader_count)]
+
+            self._idle_readers = asyncio.Queue()
+            for conn in readers:
+                self._idle_readers.put_nowait(conn)
+            self._reader_conns = readers
+            self._writer = writer
+
+            logger.info(
+                f"Opened database pool at {self.path} (1 writer, {self.reader_count} readers)"
+            )
+
+    async def close(self):
+        """Close every pooled connection."""
+        async with self._open_lock:
+            if self._writer is None:
+                return
+
+            for conn in self._reader_conns:
+                await conn.close()
+            await self._writer.close()
+
+            self._writer = None
+            self._reader_conns = []
+            self._idle_readers = None
+            logger.info("Closed database pool")
+
+    async def _connect(self, read_only: bool = False) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = aiosqlite.Row
+
+        # Cursors are closed right away: a pragma statement left unfinished
+        # keeps a read transaction open, which blocks the next connection's ATTACH
+        for pragma in CONNECTION_PRAGMAS:
+            async with conn.execute(pragma):
+                pass
+        for name, attached in self.attach.items():
+            attached.parent.mkdir(parents=True, exist_ok=True)
+            async with conn.execute(f"ATTACH DATABASE ? AS {name}", (str(attached),)):
+                pass
+            async with conn.execute(f"PRAGMA {name}.journal_mode = WAL"):
+                pass
+        if read_only:
+            await conn.execute("PRAGMA query_only = ON")
+
+        return conn
+
+    @asynccontextmanager
+    async def reader(self):
+        """Borrow a read-only connection from the pool."""
+        await self.open()
+        conn = await self._idle_readers.get()
+        try:
+            yield conn
+        finally:
+            self._idle_readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self):
+        """
+        Hold the writer connection for one transaction.
+
+        Commits when the block exits normally and rolls back on error.
+        """
+        await self.open()
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            else:
+                await self._writer.commit()
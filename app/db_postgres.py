@@ -0,0 +1,875 @@
+"""
+PostgreSQL storage backend for running several app processes or hosts on one database
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime
+
+from app.db_backend import (
+    MAX_PAGE_SIZE,
+    REQUEUE_EVENTS,
+    SNIPPET_END,
+    SNIPPET_START,
+    PayloadMerge,
+    StorageBackend,
+    decode_cursor,
+    encode_cursor,
+    format_job_stats,
+    format_stats,
+    latest_per_pr,
+    notification_fields,
+    search_terms,
+)
+from app.db_codec import compress_json, compress_text, decompress_json, decompress_text
+from app.db_migrations import analysis_preview, search_analysis_text
+
+logger = logging.getLogger(__name__)
+
+# LISTEN/NOTIFY channel carrying {"notification_id", "action"} change events
+CHANGE_CHANNEL = "notification_changes"
+
+# Serializes schema setup when several processes start at once
+SCHEMA_LOCK_ID = 7_240_316
+
+# Serializes webhook job claims, so per-repository limits hold across processes
+CLAIM_LOCK_ID = 7_240_317
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Idempotent; applied on every startup under SCHEMA_LOCK_ID. Timestamps are UTC
+# truncated to whole seconds, like SQLite's CURRENT_TIMESTAMP, so they round-trip
+# through cursors exactly.
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS notifications (
+        id BIGSERIAL PRIMARY KEY,
+        pr_number INTEGER NOT NULL,
+        pr_title TEXT NOT NULL,
+        pr_url TEXT NOT NULL,
+        repository TEXT NOT NULL,
+        author TEXT NOT NULL,
+        author_avatar TEXT,
+        branch_from TEXT,
+        branch_to TEXT,
+        summary TEXT,
+        analysis_preview TEXT,
+        files_changed INTEGER,
+        additions INTEGER,
+        deletions INTEGER,
+        complexity TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        created_at TIMESTAMP(0) NOT NULL DEFAULT date_trunc('second', now() AT TIME ZONE 'utc'),
+        updated_at TIMESTAMP(0) NOT NULL DEFAULT date_trunc('second', now() AT TIME ZONE 'utc')
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS notification_details (
+        notification_id BIGINT PRIMARY KEY REFERENCES notifications(id) ON DELETE CASCADE,
+        pr_body BYTEA,  -- zlib-compressed UTF-8
+        ai_analysis BYTEA  -- zlib-compressed JSON
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS notification_search (
+        notification_id BIGINT PRIMARY KEY REFERENCES notifications(id) ON DELETE CASCADE,
+        document TEXT NOT NULL,  -- Source text for ts_headline snippets
+        vector TSVECTOR NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_actions (
+        id BIGSERIAL PRIMARY KEY,
+        notification_id BIGINT,
+        action TEXT NOT NULL,
+        comment TEXT,
+        created_at TIMESTAMP(0) NOT NULL DEFAULT date_trunc('second', now() AT TIME ZONE 'utc')
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_notifications_status_created"
+    " ON notifications(status, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_notifications_created ON notifications(created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_user_actions_notification_created"
+    " ON user_actions(notification_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_notification_search_vector"
+    " ON notification_search USING GIN (vector)",
+    # Retention: same columns, primary keys and indexes as the hot tables
+    "CREATE TABLE IF NOT EXISTS archived_notifications"
+    " (LIKE notifications INCLUDING DEFAULTS INCLUDING INDEXES)",
+    "CREATE TABLE IF NOT EXISTS archived_notification_details"
+    " (LIKE notification_details INCLUDING INDEXES)",
+    "CREATE TABLE IF NOT EXISTS archived_user_actions"
+    " (LIKE user_actions INCLUDING DEFAULTS INCLUDING INDEXES)",
+    # One notification per PR. Added after the archive tables so that they keep
+    # a row per archived notification; new columns go to both tables, in the
+    # same order, so INSERT ... SELECT * still lines up.
+    "ALTER TABLE notifications ADD COLUMN IF NOT EXISTS event_count INTEGER NOT NULL DEFAULT 1",
+    "ALTER TABLE notifications ADD COLUMN IF NOT EXISTS last_event TEXT",
+    "ALTER TABLE archived_notifications"
+    " ADD COLUMN IF NOT EXISTS event_count INTEGER NOT NULL DEFAULT 1",
+    "ALTER TABLE archived_notifications ADD COLUMN IF NOT EXISTS last_event TEXT",
+    # Fold duplicate rows from before the unique key into the newest one per PR
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('idx_notifications_repo_pr_unique') IS NULL THEN
+            UPDATE notifications n SET event_count = d.events
+            FROM (
+                SELECT MAX(id) AS id, COUNT(*) AS events FROM notifications
+                GROUP BY repository, pr_number HAVING COUNT(*) > 1
+            ) d
+            WHERE n.id = d.id;
+
+            UPDATE user_actions a SET notification_id = k.id
+            FROM notifications d
+            JOIN notifications k
+              ON k.repository = d.repository AND k.pr_number = d.pr_number AND k.id > d.id
+            WHERE a.notification_id = d.id
+              AND NOT EXISTS (
+                  SELECT 1 FROM notifications newer
+                  WHERE newer.repository = k.repository AND newer.pr_number = k.pr_number
+                    AND newer.id > k.id
+              );
+
+            DELETE FROM notifications d USING notifications k
+            WHERE k.repository = d.repository AND k.pr_number = d.pr_number AND k.id > d.id;
+
+            CREATE UNIQUE INDEX idx_notifications_repo_pr_unique
+                ON notifications(repository, pr_number);
+            DROP INDEX IF EXISTS idx_notifications_repo_pr;
+        END IF;
+    END
+    $$
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS webhook_jobs (
+        id BIGSERIAL PRIMARY KEY,
+        event_type TEXT NOT NULL,
+        payload BYTEA NOT NULL,  -- zlib-compressed JSON body
+        status TEXT NOT NULL DEFAULT 'queued',  -- queued | running | dead
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        -- When a queued job is next due; for a running job, when its lease expires
+        run_after TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+        created_at TIMESTAMP(0) NOT NULL DEFAULT date_trunc('second', now() AT TIME ZONE 'utc'),
+        updated_at TIMESTAMP(0) NOT NULL DEFAULT date_trunc('second', now() AT TIME ZONE 'utc')
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_webhook_jobs_status_run_after"
+    " ON webhook_jobs(status, run_after)",
+    """
+    CREATE TABLE IF NOT EXISTS webhook_deliveries (
+        delivery_id TEXT PRIMARY KEY,  -- X-GitHub-Delivery
+        received_at TIMESTAMP(0) NOT NULL DEFAULT date_trunc('second', now() AT TIME ZONE 'utc')
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_received"
+    " ON webhook_deliveries(received_at)",
+    # Per-PR coalescing of webhook bursts
+    "ALTER TABLE webhook_jobs ADD COLUMN IF NOT EXISTS coalesce_key TEXT",
+    "ALTER TABLE webhook_jobs ADD COLUMN IF NOT EXISTS events INTEGER NOT NULL DEFAULT 1",
+    "CREATE INDEX IF NOT EXISTS idx_webhook_jobs_queued_key"
+    " ON webhook_jobs(coalesce_key) WHERE status = 'queued'",
+    # Heuristic analyses awaiting the AI one (both tables, keeping columns aligned)
+    "ALTER TABLE notifications"
+    " ADD COLUMN IF NOT EXISTS analysis_pending BOOLEAN NOT NULL DEFAULT FALSE",
+    "ALTER TABLE archived_notifications"
+    " ADD COLUMN IF NOT EXISTS analysis_pending BOOLEAN NOT NULL DEFAULT FALSE",
+    "CREATE INDEX IF NOT EXISTS idx_notifications_analysis_pending"
+    " ON notifications(updated_at) WHERE analysis_pending",
+    # Fair scheduling of webhook jobs across repositories
+    "ALTER TABLE webhook_jobs ADD COLUMN IF NOT EXISTS repository TEXT",
+    # Per-PR AI analysis history; not archived, an archived card keeps only its
+    # final analysis
+    """
+    CREATE TABLE IF NOT EXISTS analysis_versions (
+        notification_id BIGINT NOT NULL REFERENCES notifications(id) ON DELETE CASCADE,
+        version INTEGER NOT NULL,
+        head_sha TEXT,  -- PR head the analysis covers
+        ai_analysis BYTEA NOT NULL,  -- zlib-compressed JSON
+        changes BYTEA,  -- zlib-compressed JSON; incremental updates only
+        created_at TIMESTAMP(0) NOT NULL DEFAULT date_trunc('second', now() AT TIME ZONE 'utc'),
+        PRIMARY KEY (notification_id, version)
+    )
+    """,
+    # Per-status notification counters kept by a trigger in the writing
+    # transaction, so the dashboard stats don't scan the history
+    """
+    CREATE OR REPLACE FUNCTION notification_stats_count() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE notification_stats SET count = count - 1 WHERE status = OLD.status;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO notification_stats (status, count) VALUES (NEW.status, 1)
+            ON CONFLICT (status) DO UPDATE SET count = notification_stats.count + 1;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    # Created with its triggers and backfilled in the schema transaction;
+    # CREATE TRIGGER holds off writers until it commits
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('notification_stats') IS NULL THEN
+            CREATE TABLE notification_stats (
+                status TEXT PRIMARY KEY,
+                count BIGINT NOT NULL DEFAULT 0
+            );
+            CREATE TRIGGER trg_notification_stats_insert_delete
+                AFTER INSERT OR DELETE ON notifications
+                FOR EACH ROW EXECUTE FUNCTION notification_stats_count();
+            CREATE TRIGGER trg_notification_stats_update
+                AFTER UPDATE OF status ON notifications
+                FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status)
+                EXECUTE FUNCTION notification_stats_count();
+            INSERT INTO notification_stats (status, count)
+            SELECT status, COUNT(*) FROM notifications GROUP BY status;
+        END IF;
+    END
+    $$
+    """,
+)
+
+CARD_FIELDS = (
+    "id", "pr_number", "pr_title", "pr_url", "repository", "author", "author_avatar",
+    "branch_from", "branch_to", "summary", "analysis_preview",
+    "files_changed", "additions", "deletions", "complexity",
+    "status", "event_count", "last_event", "analysis_pending", "created_at", "updated_at",
+)
+CARD_COLUMNS = ", ".join(f"n.{field}" for field in CARD_FIELDS)
+
+# Hot table -> archive table. Archive tables are created LIKE the hot ones, so
+# their columns line up for INSERT ... SELECT *.
+ARCHIVED_TABLES = {
+    "notifications": "archived_notifications",
+    "notification_details": "archived_notification_details",
+    "user_actions": "archived_user_actions",
+}
+
+# Title, summary, AI analysis and body weighted A-D, mirroring the SQLite bm25 weights
+SEARCH_VECTOR = """
+    setweight(to_tsvector('english', coalesce($2::text, '')), 'A')
+    || setweight(to_tsvector('english', coalesce($3::text, '')), 'B')
+    || setweight(to_tsvector('english', coalesce($4::text, '')), 'C')
+    || setweight(to_tsvector('english', coalesce($5::text, '')), 'D')
+"""
+
+
+# Refreshes the PR's existing notification instead of adding a second row
+UPSERT_NOTIFICATION = f"""
+    INSERT INTO notifications (
+        pr_number, pr_title, pr_url,
+        repository, author, author_avatar,
+        branch_from, branch_to,
+        summary, analysis_preview,
+        files_changed, additions, deletions, complexity,
+        last_event, event_count, analysis_pending
+    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17)
+    ON CONFLICT (repository, pr_number) DO UPDATE SET
+        pr_title = excluded.pr_title,
+        pr_url = excluded.pr_url,
+        author = excluded.author,
+        author_avatar = excluded.author_avatar,
+        branch_from = excluded.branch_from,
+        branch_to = excluded.branch_to,
+        summary = excluded.summary,
+        analysis_preview = excluded.analysis_preview,
+        files_changed = excluded.files_changed,
+        additions = excluded.additions,
+        deletions = excluded.deletions,
+        complexity = excluded.complexity,
+        analysis_pending = excluded.analysis_pending,
+        last_event = CASE WHEN excluded.event_count > 0
+                          THEN excluded.last_event ELSE notifications.last_event END,
+        event_count = notifications.event_count + excluded.event_count,
+        status = CASE WHEN excluded.event_count > 0 AND excluded.last_event IN {REQUEUE_EVENTS!r}
+                      THEN 'pending' ELSE notifications.status END,
+        updated_at = date_trunc('second', now() AT TIME ZONE 'utc')
+"""
+
+# The (repository, pr_number) pairs in $1/$2
+PR_IDS = """
+    SELECT n.id, n.repository, n.pr_number
+    FROM notifications n
+    JOIN unnest($1::text[], $2::int[]) AS k(repository, pr_number) USING (repository, pr_number)
+"""
+
+
+def build_tsquery(text: str) -> str | None:
+    """
+    Turn free text into a to_tsquery expression: every word must match, the
+    last one as a prefix. Returns None if there is nothing to search for.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return None
+    return " & ".join(terms) + ":*"
+
+
+def _card(record) -> dict:
+    notification = dict(record)
+    for column in ('created_at', 'updated_at'):
+        if isinstance(notification.get(column), datetime):
+            notification[column] = notification[column].strftime(TIMESTAMP_FORMAT)
+    preview = notification.pop('analysis_preview')
+    notification['ai_analysis'] = json.loads(preview) if preview else None
+    return notification
+
+
+class PostgresBackend(StorageBackend):
+    """
+    Notifications in PostgreSQL, shared by any number of app processes.
+
+    Uses an asyncpg connection pool, INSERT ... RETURNING for new ids, and
+    LISTEN/NOTIFY so every process hears about changes made by the others.
+    asyncpg is an optional dependency, imported when the backend starts.
+    """
+
+    def __init__(self, dsn: str, pool_size: int = 10):
+        super().__init__()
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self.pool = None
+        self._listener = None
+        self._listener_tasks: set[asyncio.Task] = set()
+
+    async def init(self):
+        if self.pool is not None:
+            return
+        try:
+            import asyncpg
+        except ImportError as e:
+            raise RuntimeError(
+                "DATABASE_URL points at PostgreSQL but asyncpg is not installed"
+            ) from e
+
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=self.pool_size)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", SCHEMA_LOCK_ID)
+                for statement in SCHEMA:
+                    await conn.execute(statement)
+
+        # A dedicated connection, since a LISTEN only lasts as long as its session
+        self._listener = await asyncpg.connect(self.dsn)
+        await self._listener.add_listener(CHANGE_CHANNEL, self._on_notify)
+        logger.info(f"Connected to PostgreSQL (pool size {self.pool_size})")
+
+    async def close(self):
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+        for task in list(self._listener_tasks):
+            task.cancel()
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Ignoring malformed {channel} payload: {payload!r}")
+            return
+        task = asyncio.create_task(self._emit_change(event['notification_id'], event['action']))
+        self._listener_tasks.add(task)
+        task.add_done_callback(self._listener_tasks.discard)
+
+    @staticmethod
+    async def _notify(conn, notification_id: int, action: str):
+        # Delivered when (and only if) the surrounding transaction commits
+        await conn.execute(
+            "SELECT pg_notify($1, $2)",
+            CHANGE_CHANNEL,
+            json.dumps({"notification_id": notification_id, "action": action}),
+        )
+
+    async def upsert_notifications(self, batch: list[tuple]) -> list[int]:
+        rows = [notification_fields(pr_event, pr_summary) for pr_event, pr_summary in batch]
+        if not rows:
+            return []
+        latest = latest_per_pr(rows)
+        keys = ([repository for repository, _ in latest], [number for _, number in latest])
+
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                existing = {record['id'] for record in await conn.fetch(PR_IDS, *keys)}
+
+                await conn.executemany(UPSERT_NOTIFICATION, [
+                    (
+                        row['pr_number'], row['pr_title'], row['pr_url'],
+                        row['repository'], row['author'], row['author_avatar'],
+                        row['branch_from'], row['branch_to'],
+                        row['summary'], analysis_preview(row['ai_analysis']),
+                        row['files_changed'], row['additions'], row['deletions'],
+                        row['complexity'], row['last_event'], row['event_count'],
+                        row['analysis_pending'],
+                    )
+                    for row in rows
+                ])
+
+                ids = {
+                    (record['repository'], record['pr_number']): record['id']
+                    for record in await conn.fetch(PR_IDS, *keys)
+                }
+
+                await conn.executemany("""
+                    INSERT INTO notification_details (notification_id, pr_body, ai_analysis)
+                    VALUES ($1, $2, $3)
+                    ON CONFLICT (notification_id) DO UPDATE
+                    SET pr_body = excluded.pr_body, ai_analysis = excluded.ai_analysis
+                """, [
+                    (ids[key], compress_text(row['pr_body']), compress_json(row['ai_analysis']))
+                    for key, row in latest.items()
+                ])
+
+                # The notification row is locked by the upsert, so MAX(version) is stable
+                await conn.executemany("""
+                    INSERT INTO analysis_versions
+                        (notification_id, version, head_sha, ai_analysis, changes)
+                    SELECT $1, COALESCE(MAX(version), 0) + 1, $2, $3, $4
+                    FROM analysis_versions WHERE notification_id = $1
+                """, [
+                    (
+                        ids[key], row['head_sha'], compress_json(row['ai_analysis']),
+                        compress_json(row['analysis_changes']) if row['analysis_changes'] else None,
+                    )
+                    for key, row in latest.items() if row['ai_analysis']
+                ])
+
+                await conn.executemany(f"""
+                    INSERT INTO notification_search (notification_id, document, vector)
+                    VALUES (
+                        $1,
+                        concat_ws(E'\\n', $2::text, $3::text, $4::text, $5::text),
+                        {SEARCH_VECTOR}
+                    )
+                    ON CONFLICT (notification_id) DO UPDATE
+                    SET document = excluded.document, vector = excluded.vector
+                """, [
+                    (
+                        ids[key], row['pr_title'], row['summary'],
+                        search_analysis_text(row['ai_analysis']), row['pr_body'],
+                    )
+                    for key, row in latest.items()
+                ])
+
+                for notification_id in ids.values():
+                    await self._notify(
+                        conn, notification_id, "update" if notification_id in existing else "new"
+                    )
+
+        return [ids[(row['repository'], row['pr_number'])] for row in rows]
+
+    async def get_notifications_page(
+        self,
+        status_filter: str = None,
+        limit: int = 50,
+        cursor: str = None,
+        include_archived: bool = False,
+    ) -> tuple[list[dict], str | None]:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        conditions = []
+        params = []
+        if status_filter:
+            params.append(status_filter)
+            conditions.append(f"n.status = ${len(params)}")
+        if cursor:
+            created_at, notification_id = decode_cursor(cursor)
+            try:
+                created_at = datetime.strptime(created_at, TIMESTAMP_FORMAT)
+            except ValueError as e:
+                raise ValueError("Invalid cursor") from e
+            params.extend((created_at, notification_id))
+            conditions.append(f"(n.created_at, n.id) < (${len(params) - 1}, ${len(params)})")
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit + 1)
+        source = "notifications n"
+        if include_archived:
+            fields = ", ".join(CARD_FIELDS)
+            source = f"""(
+                SELECT {fields} FROM notifications
+                UNION ALL
+                SELECT {fields} FROM archived_notifications
+            ) n"""
+
+        async with self.pool.acquire() as conn:
+            records = await conn.fetch(f"""
+                SELECT {CARD_COLUMNS} FROM {source}
+                {where}
+                ORDER BY n.created_at DESC, n.id DESC
+                LIMIT ${len(params)}
+            """, *params)
+
+        rows = [_card(record) for record in records]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+
+        return rows, next_cursor
+
+    async def search_notifications(
+        self, text: str, status_filter: str = None, repository: str = None, limit: int = 20
+    ) -> list[dict]:
+        query = build_tsquery(text)
+        if query is None:
+            return []
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        headline_options = (
+            f'StartSel="{SNIPPET_START}", StopSel="{SNIPPET_END}", MinWords=5, MaxWords=12'
+        )
+        params = [query, headline_options]
+        conditions = ["s.vector @@ q.query"]
+        if status_filter:
+            params.append(status_filter)
+            conditions.append(f"n.status = ${len(params)}")
+        if repository:
+            params.append(repository)
+            conditions.append(f"n.repository = ${len(params)}")
+        params.append(limit)
+
+        async with self.pool.acquire() as conn:
+            records = await conn.fetch(f"""
+                SELECT {CARD_COLUMNS},
+                       ts_headline('english', s.document, q.query, $2) AS snippet
+                FROM notification_search s
+                JOIN notifications n ON n.id = s.notification_id
+                CROSS JOIN to_tsquery('english', $1) AS q(query)
+                WHERE {' AND '.join(conditions)}
+                ORDER BY ts_rank_cd(s.vector, q.query) DESC, n.id DESC
+                LIMIT ${len(params)}
+            """, *params)
+
+        return [_card(record) for record in records]
+
+    async def get_notification_by_id(
+        self, notification_id: int, include_details: bool = False, include_archived: bool = False
+    ):
+        tables = [("notifications", "notification_details")]
+        if include_archived:
+            tables.append(("archived_notifications", "archived_notification_details"))
+
+        async with self.pool.acquire() as conn:
+            for notifications, details in tables:
+                # $2 short-circuits the details join unless it was asked for
+                record = await conn.fetchrow(f"""
+                    SELECT {CARD_COLUMNS}, d.pr_body, d.ai_analysis AS analysis_blob
+                    FROM {notifications} n
+                    LEFT JOIN {details} d ON d.notification_id = n.id AND $2
+                    WHERE n.id = $1
+                """, notification_id, include_details)
+                if record:
+                    break
+            else:
+                return None
+
+        notification = _card(record)
+        pr_body = notification.pop('pr_body')
+        analysis_blob = notification.pop('analysis_blob')
+        if include_details:
+            notification['pr_body'] = decompress_text(pr_body)
+            notification['ai_analysis'] = decompress_json(analysis_blob, {})
+        return notification
+
+    async def archive_notifications(
+        self, older_than_days: int, statuses: list[str], batch_size: int = 500
+    ) -> int:
+        """
+        Moves rows into the archived_* tables, one short transaction per batch.
+        SKIP LOCKED lets archivers on several nodes share the work.
+        """
+        if not statuses:
+            return 0
+        archived = 0
+
+        while True:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    ids = [record['id'] for record in await conn.fetch("""
+                        SELECT id FROM notifications
+                        WHERE status = ANY($1::text[])
+                          AND updated_at <= (now() AT TIME ZONE 'utc') - make_interval(days => $2)
+                        ORDER BY id
+                        LIMIT $3
+                        FOR UPDATE SKIP LOCKED
+                    """, statuses, max(0, older_than_days), batch_size)]
+                    if not ids:
+                        break
+
+                    for table, archive_table in ARCHIVED_TABLES.items():
+                        match = "id" if table == "notifications" else "notification_id"
+                        await conn.execute(f"""
+                            INSERT INTO {archive_table}
+                            SELECT * FROM {table} WHERE {match} = ANY($1::bigint[])
+                            ON CONFLICT DO NOTHING
+                        """, ids)
+
+                    await conn.execute(
+                        "DELETE FROM user_actions WHERE notification_id = ANY($1::bigint[])", ids
+                    )
+                    # Details and search entries go with it (ON DELETE CASCADE)
+                    await conn.execute("DELETE FROM notifications WHERE id = ANY($1::bigint[])", ids)
+
+            archived += len(ids)
+            if len(ids) < batch_size:
+                break
+
+        if archived:
+            logger.info(f"Archived {archived} notifications")
+        return archived
+
+    async def get_notification_by_pr(self, repository: str, pr_number: int):
+        async with self.pool.acquire() as conn:
+            record = await conn.fetchrow(f"""
+                SELECT {CARD_COLUMNS} FROM notifications n
+                WHERE n.repository = $1 AND n.pr_number = $2
+            """, repository, pr_number)
+        return _card(record) if record else None
+
+    async def get_notifications_pending_analysis(self, limit: int = 10) -> list[dict]:
+        async with self.pool.acquire() as conn:
+            records = await conn.fetch(f"""
+                SELECT {CARD_COLUMNS} FROM notifications n
+                WHERE n.analysis_pending
+                ORDER BY n.updated_at
+                LIMIT $1
+            """, max(1, min(limit, MAX_PAGE_SIZE)))
+        return [_card(record) for record in records]
+
+    async def get_analysis_versions(self, notification_id: int, limit: int = 20) -> list[dict]:
+        async with self.pool.acquire() as conn:
+            records = await conn.fetch("""
+                SELECT v.version, v.head_sha, v.ai_analysis, v.changes, v.created_at,
+                       v.created_at > COALESCE(
+                           (SELECT MAX(a.created_at) FROM user_actions a
+                            WHERE a.notification_id = v.notification_id), '-infinity'
+                       ) AS since_last_review
+                FROM analysis_versions v
+                WHERE v.notification_id = $1
+                ORDER BY v.version DESC
+                LIMIT $2
+            """, notification_id, max(1, min(limit, MAX_PAGE_SIZE)))
+
+        return [
+            {
+                'version': record['version'],
+                'head_sha': record['head_sha'],
+                'ai_analysis': decompress_json(record['ai_analysis'], {}),
+                'changes': decompress_json(record['changes']),
+                'created_at': record['created_at'].strftime(TIMESTAMP_FORMAT),
+                'since_last_review': record['since_last_review'],
+            }
+            for record in records
+        ]
+
+    async def update_notification_status(self, notification_id: int, status: str):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("""
+                    UPDATE notifications
+                    SET status = $1, updated_at = date_trunc('second', now() AT TIME ZONE 'utc')
+                    WHERE id = $2
+                """, status, notification_id)
+                await self._notify(conn, notification_id, "update")
+
+    async def save_user_action(self, notification_id: int, action: str, comment: str = None) -> int:
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval("""
+                INSERT INTO user_actions (notification_id, action, comment)
+                VALUES ($1, $2, $3)
+                RETURNING id
+            """, notification_id, action, comment)
+
+    async def get_notification_stats(self) -> dict:
+        """
+        Reads the trigger-maintained notification_stats counters, so the cost
+        does not grow with the size of the history.
+        """
+        async with self.pool.acquire() as conn:
+            records = await conn.fetch("SELECT status, count FROM notification_stats")
+        return format_stats({record['status']: record['count'] for record in records})
+
+    async def rebuild_notification_stats(self) -> dict:
+        """Logs a warning if the materialized counters had drifted."""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                # Writers wait for the recount (a status-index scan)
+                await conn.execute("LOCK TABLE notifications IN SHARE MODE")
+                records = await conn.fetch("SELECT status, count FROM notification_stats")
+                before = {
+                    record['status']: record['count'] for record in records if record['count']
+                }
+
+                await conn.execute("DELETE FROM notification_stats")
+                await conn.execute("""
+                    INSERT INTO notification_stats (status, count)
+                    SELECT status, COUNT(*) FROM notifications GROUP BY status
+                """)
+                records = await conn.fetch("SELECT status, count FROM notification_stats")
+                after = {record['status']: record['count'] for record in records}
+
+        if before != after:
+            logger.warning(f"Notification stats drifted; rebuilt {before} -> {after}")
+
+        return format_stats(after)
+
+    async def enqueue_job(
+        self,
+        event_type: str,
+        payload: str,
+        delivery_id: str | None = None,
+        coalesce_key: str | None = None,
+        window_seconds: float = 0.0,
+        max_wait_seconds: float = 0.0,
+        merge: PayloadMerge | None = None,
+        repository: str | None = None,
+    ) -> int | None:
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if delivery_id is not None:
+                    recorded = await conn.fetchval("""
+                        INSERT INTO webhook_deliveries (delivery_id) VALUES ($1)
+                        ON CONFLICT DO NOTHING
+                        RETURNING delivery_id
+                    """, delivery_id)
+                    if recorded is None:
+                        return None
+
+                if coalesce_key is not None:
+                    # A job claimed meanwhile no longer matches once the lock is granted;
+                    # a retry keeps its backoff and attempts: the event gets a job of its own
+                    queued = await conn.fetchrow("""
+                        SELECT id, payload FROM webhook_jobs
+                        WHERE coalesce_key = $1 AND status = 'queued' AND attempts = 0
+                        ORDER BY id DESC
+                        LIMIT 1
+                        FOR UPDATE
+                    """, coalesce_key)
+                    if queued:
+                        merged = payload
+                        if merge is not None:
+                            merged = merge(decompress_text(queued['payload']), payload)
+                        await conn.execute("""
+                            UPDATE webhook_jobs
+                            SET payload = $2, events = events + 1,
+                                run_after = LEAST(
+                                    (now() AT TIME ZONE 'utc') + make_interval(secs => $3),
+                                    created_at + make_interval(secs => $4)
+                                ),
+                                updated_at = date_trunc('second', now() AT TIME ZONE 'utc')
+                            WHERE id = $1
+                        """, queued['id'], compress_text(merged),
+                            float(window_seconds), float(max_wait_seconds))
+                        return queued['id']
+
+                return await conn.fetchval("""
+                    INSERT INTO webhook_jobs (event_type, payload, coalesce_key, repository, run_after)
+                    VALUES ($1, $2, $3, $4, (now() AT TIME ZONE 'utc') + make_interval(secs => $5))
+                    RETURNING id
+                """, event_type, compress_text(payload), coalesce_key, repository,
+                    float(window_seconds))
+
+    async def prune_deliveries(self, older_than_seconds: float) -> int:
+        async with self.pool.acquire() as conn:
+            result = await conn.execute("""
+                DELETE FROM webhook_deliveries
+                WHERE received_at < (now() AT TIME ZONE 'utc') - make_interval(secs => $1)
+            """, float(older_than_seconds))
+        return int(result.split()[-1])
+
+    async def claim_jobs(
+        self,
+        limit: int,
+        lease_seconds: float,
+        per_repository_limit: int = 0,
+        repository_weights: dict[str, float] | None = None,
+    ) -> list[dict]:
+        """
+        Claims from every process take turns (an advisory lock held for the
+        claim's short transaction), so they all see the same running counts.
+        """
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", CLAIM_LOCK_ID)
+                records = await conn.fetch("""
+                    WITH running AS (
+                        SELECT repository, COUNT(*) AS running FROM webhook_jobs
+                        WHERE status = 'running' AND run_after > (now() AT TIME ZONE 'utc')
+                        GROUP BY repository
+                    ), turns AS (
+                        SELECT j.id, j.run_after,
+                               ROW_NUMBER() OVER (
+                                   PARTITION BY j.repository ORDER BY j.run_after, j.id
+                               ) + COALESCE(r.running, 0) AS slot,
+                               COALESCE(($3::jsonb ->> j.repository)::float8, 1.0) AS weight
+                        FROM webhook_jobs j
+                        LEFT JOIN running r ON r.repository IS NOT DISTINCT FROM j.repository
+                        WHERE j.status IN ('queued', 'running')
+                          AND j.run_after <= (now() AT TIME ZONE 'utc')
+                    )
+                    UPDATE webhook_jobs j
+                    SET status = 'running', attempts = j.attempts + 1,
+                        run_after = (now() AT TIME ZONE 'utc') + make_interval(secs => $2),
+                        updated_at = date_trunc('second', now() AT TIME ZONE 'utc')
+                    FROM (
+                        SELECT id FROM turns
+                        WHERE $4 <= 0 OR slot <= $4
+                        ORDER BY slot / weight, run_after, id
+                        LIMIT $1
+                    ) due
+                    -- Rechecked if a concurrent complete/fail changed the row meanwhile
+                    WHERE j.id = due.id AND j.status IN ('queued', 'running')
+                      AND j.run_after <= (now() AT TIME ZONE 'utc')
+                    RETURNING j.id, j.event_type, j.repository, j.payload, j.attempts, j.events
+                """, limit, float(lease_seconds), json.dumps(repository_weights or {}),
+                    per_repository_limit)
+
+        jobs = [dict(record) | {'payload': decompress_text(record['payload'])} for record in records]
+        return sorted(jobs, key=lambda job: job['id'])
+
+    async def complete_job(self, job_id: int):
+        async with self.pool.acquire() as conn:
+            await conn.execute("DELETE FROM webhook_jobs WHERE id = $1", job_id)
+
+    async def fail_job(self, job_id: int, error: str, retry_in: float | None):
+        async with self.pool.acquire() as conn:
+            await conn.execute("""
+                UPDATE webhook_jobs
+                SET status = $2, last_error = $3,
+                    run_after = (now() AT TIME ZONE 'utc') + make_interval(secs => $4),
+                    updated_at = date_trunc('second', now() AT TIME ZONE 'utc')
+                WHERE id = $1
+            """, job_id, "dead" if retry_in is None else "queued", error, float(retry_in or 0))
+
+    async def recover_jobs(self) -> int:
+        """
+        Other processes may still be working on their jobs, so only expired
+        leases are requeued (claim_jobs would retake them anyway).
+        """
+        async with self.pool.acquire() as conn:
+            result = await conn.execute("""
+                UPDATE webhook_jobs
+                SET status = 'queued', updated_at = date_trunc('second', now() AT TIME ZONE 'utc')
+                WHERE status = 'running' AND run_after <= (now() AT TIME ZONE 'utc')
+            """)
+        return int(result.split()[-1])
+
+    async def get_job_queue_stats(self) -> dict:
+        async with self.pool.acquire() as conn:
+            records = await conn.fetch(
+                "SELECT status, COUNT(*) AS count FROM webhook_jobs GROUP BY status"
+            )
+            lag = await conn.fetchval("""
+                SELECT EXTRACT(EPOCH FROM (now() AT TIME ZONE 'utc') - MIN(run_after))::float8
+                FROM webhook_jobs
+                WHERE status = 'queued' AND run_after <= (now() AT TIME ZONE 'utc')
+            """)
+        return format_job_stats({record['status']: record['count'] for record in records}, lag)
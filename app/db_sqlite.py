@@ -0,0 +1,760 @@
+"""
+SQLite storage backend (the default): one database file, pooled connections
+"""
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+
+from app.db_backend import (
+    MAX_PAGE_SIZE,
+    REQUEUE_EVENTS,
+    SNIPPET_END,
+    SNIPPET_START,
+    PayloadMerge,
+    StorageBackend,
+    decode_cursor,
+    encode_cursor,
+    format_job_stats,
+    format_stats,
+    latest_per_pr,
+    notification_fields,
+    search_terms,
+)
+from app.db_codec import compress_json, compress_text, decompress_json, decompress_text
+from app.db_migrations import analysis_preview, apply_migrations, search_analysis_text
+from app.db_pool import DatabasePool
+from app.db_writer import WriteQueue
+
+logger = logging.getLogger(__name__)
+
+# Columns the dashboard cards render. pr_body and the full AI analysis live in
+# notification_details and are only read for a single notification.
+CARD_COLUMNS = """
+    id, pr_number, pr_title, pr_url, repository, author, author_avatar,
+    branch_from, branch_to, summary, analysis_preview,
+    files_changed, additions, deletions, complexity,
+    status, event_count, last_event, analysis_pending, created_at, updated_at
+"""
+
+# Refreshes the PR's existing notification instead of adding a second row
+UPSERT_NOTIFICATION = f"""
+    INSERT INTO notifications (
+        pr_number, pr_title, pr_url,
+        repository, author, author_avatar,
+        branch_from, branch_to,
+        summary, analysis_preview,
+        files_changed, additions, deletions, complexity,
+        last_event, event_count, analysis_pending
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(repository, pr_number) DO UPDATE SET
+        pr_title = excluded.pr_title,
+        pr_url = excluded.pr_url,
+        author = excluded.author,
+        author_avatar = excluded.author_avatar,
+        branch_from = excluded.branch_from,
+        branch_to = excluded.branch_to,
+        summary = excluded.summary,
+        analysis_preview = excluded.analysis_preview,
+        files_changed = excluded.files_changed,
+        additions = excluded.additions,
+        deletions = excluded.deletions,
+        complexity = excluded.complexity,
+        analysis_pending = excluded.analysis_pending,
+        last_event = CASE WHEN excluded.event_count > 0
+                          THEN excluded.last_event ELSE last_event END,
+        event_count = event_count + excluded.event_count,
+        status = CASE WHEN excluded.event_count > 0 AND excluded.last_event IN {REQUEUE_EVENTS!r}
+                      THEN 'pending' ELSE status END,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+
+# Each due webhook job's turn in its repository (its queue position plus the
+# repository's unexpired running jobs) and the repository's weight from the
+# JSON object in the parameter
+DUE_JOB_TURNS = """
+    SELECT j.id, j.run_after,
+           ROW_NUMBER() OVER (PARTITION BY j.repository ORDER BY j.run_after, j.id)
+               + COALESCE(r.running, 0) AS slot,
+           COALESCE(w.value, 1.0) AS weight
+    FROM webhook_jobs j
+    LEFT JOIN (
+        SELECT repository, COUNT(*) AS running FROM webhook_jobs
+        WHERE status = 'running' AND run_after > datetime('now')
+        GROUP BY repository
+    ) r ON r.repository IS j.repository
+    LEFT JOIN json_each(?) w ON w.key = j.repository
+    WHERE j.status IN ('queued', 'running') AND j.run_after <= datetime('now')
+"""
+
+# Tables copied into the archive database, with the column that identifies a row
+ARCHIVED_TABLES = {
+    "notifications": "id",
+    "notification_details": "notification_id",
+    "user_actions": "id",
+}
+
+# Freed pages handed back to the filesystem per writer-lock hold
+VACUUM_PAGES_PER_STEP = 2000
+
+
+def build_search_query(text: str) -> str | None:
+    """
+    Turn free text into an FTS5 MATCH expression.
+
+    Every word must match (the last one as a prefix, for search-as-you-type).
+    Words are quoted, so FTS5 operators typed by the user are treated as text.
+    Returns None if there is nothing to search for.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _card(row) -> dict:
+    """Turn a CARD_COLUMNS row into a dict with the card's `ai_analysis` preview."""
+    notification = dict(row)
+    preview = notification.pop('analysis_preview')
+    notification['ai_analysis'] = json.loads(preview) if preview else None
+    notification['analysis_pending'] = bool(notification['analysis_pending'])
+    return notification
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Notifications in a local SQLite file.
+
+    Reads use a pool of WAL readers; every mutation goes through the
+    group-commit WriteQueue. Change events only reach listeners in this
+    process, so run a single app process against one file.
+
+    Archived notifications move to a second file (by default
+    <name>_archive.db next to the database), attached to every connection as
+    the `archive` schema.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        readers: int | None = None,
+        write_batch: int | None = None,
+        write_delay: float | None = None,
+        archive_path: Path | None = None,
+    ):
+        super().__init__()
+        path = Path(path)
+        # Whether freed pages can be returned in steps (set by init)
+        self.incremental_vacuum = False
+        if archive_path is None:
+            archive_path = path.with_name(f"{path.stem}_archive{path.suffix}")
+        self.pool = DatabasePool(path, readers=readers, attach={"archive": archive_path})
+        # Started on the first write; it looks up `pool` at that point, so a
+        # replaced pool is picked up.
+        self.write_queue = WriteQueue(
+            lambda: self.pool, max_batch=write_batch, max_delay=write_delay
+        )
+
+    async def init(self):
+        async with self.pool.writer() as db:
+            await apply_migrations(db)
+            await self._ensure_archive_schema(db)
+            cursor = await db.execute("PRAGMA main.auto_vacuum")
+            self.incremental_vacuum = (await cursor.fetchone())[0] == 2  # INCREMENTAL
+        if not self.incremental_vacuum:
+            logger.warning(
+                "The database predates incremental auto_vacuum, so space freed by archiving"
+                " is not returned to the filesystem. To convert it (one full VACUUM: it takes"
+                " the database offline for a while and needs free disk space about its size),"
+                " run python -m utils.enable_incremental_vacuum while the app is stopped."
+            )
+
+    @staticmethod
+    async def _ensure_archive_schema(db):
+        """Create the archive tables, adding any columns the hot tables have gained since."""
+        for table, key in ARCHIVED_TABLES.items():
+            await db.execute(
+                f"CREATE TABLE IF NOT EXISTS archive.{table} AS SELECT * FROM main.{table} WHERE 0"
+            )
+            cursor = await db.execute(f"PRAGMA main.table_info({table})")
+            hot = [(row['name'], row['type']) for row in await cursor.fetchall()]
+            cursor = await db.execute(f"PRAGMA archive.table_info({table})")
+            archived = {row['name'] for row in await cursor.fetchall()}
+            for name, column_type in hot:
+                if name not in archived:
+                    await db.execute(
+                        f"ALTER TABLE archive.{table} ADD COLUMN {name} {column_type}"
+                    )
+            await db.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_archived_{table}_key"
+                f" ON {table}({key})"
+            )
+
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS archive.idx_archived_notifications_created"
+            " ON notifications(created_at, id)"
+        )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS archive.idx_archived_notifications_status_created"
+            " ON notifications(status, created_at)"
+        )
+
+    async def enable_incremental_vacuum(self) -> bool:
+        """
+        Switch a database created before auto_vacuum was configured, with one
+        full VACUUM (a maintenance step: it holds the writer for as long as
+        the rebuild takes and needs free disk space about the database's
+        size). Returns False if it was already incremental.
+        """
+        async with self.pool.writer() as db:
+            cursor = await db.execute("PRAGMA main.auto_vacuum")
+            if (await cursor.fetchone())[0] == 2:  # INCREMENTAL
+                self.incremental_vacuum = True
+                return False
+            logger.info("Enabling incremental auto_vacuum; rebuilding the database")
+            started = time.monotonic()
+            await db.execute("PRAGMA main.auto_vacuum = INCREMENTAL")
+            await db.commit()
+            await db.execute("VACUUM main")
+        self.incremental_vacuum = True
+        logger.info(f"Rebuilt the database in {time.monotonic() - started:.1f}s")
+        return True
+
+    async def close(self):
+        used_pool = self.write_queue.pool
+        await self.write_queue.stop()
+        await self.pool.close()
+        if used_pool is not None and used_pool is not self.pool:
+            await used_pool.close()
+
+    async def upsert_notifications(self, batch: list[tuple]) -> list[int]:
+        rows = [notification_fields(pr_event, pr_summary) for pr_event, pr_summary in batch]
+        if not rows:
+            return []
+        latest = latest_per_pr(rows)
+        keys = json.dumps(list(latest))
+        # Compress outside the writer so the batch transaction stays short
+        details = {
+            key: (compress_text(row['pr_body']), compress_json(row['ai_analysis']))
+            for key, row in latest.items()
+        }
+        versions = {
+            key: (
+                row['head_sha'], details[key][1],
+                compress_json(row['analysis_changes']) if row['analysis_changes'] else None,
+            )
+            for key, row in latest.items() if row['ai_analysis']
+        }
+
+        async def upsert(db):
+            lookup = """
+                SELECT id, repository, pr_number FROM notifications
+                WHERE (repository, pr_number) IN (
+                    SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?)
+                )
+            """
+            cursor = await db.execute(lookup, (keys,))
+            existing = {row['id'] for row in await cursor.fetchall()}
+
+            await db.executemany(UPSERT_NOTIFICATION, [
+                (
+                    row['pr_number'], row['pr_title'], row['pr_url'],
+                    row['repository'], row['author'], row['author_avatar'],
+                    row['branch_from'], row['branch_to'],
+                    row['summary'], analysis_preview(row['ai_analysis']),
+                    row['files_changed'], row['additions'], row['deletions'], row['complexity'],
+                    row['last_event'], row['event_count'], row['analysis_pending'],
+                )
+                for row in rows
+            ])
+
+            cursor = await db.execute(lookup, (keys,))
+            ids = {
+                (row['repository'], row['pr_number']): row['id']
+                for row in await cursor.fetchall()
+            }
+
+            await db.executemany("""
+                INSERT OR REPLACE INTO notification_details (notification_id, pr_body, ai_analysis)
+                VALUES (?, ?, ?)
+            """, [(ids[key], *blobs) for key, blobs in details.items()])
+
+            await db.executemany("""
+                INSERT INTO analysis_versions (notification_id, version, head_sha, ai_analysis, changes)
+                SELECT ?, COALESCE(MAX(version), 0) + 1, ?, ?, ?
+                FROM analysis_versions WHERE notification_id = ?
+            """, [(ids[key], *version, ids[key]) for key, version in versions.items()])
+
+            await db.execute(
+                "DELETE FROM notification_search WHERE rowid IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(ids.values())),),
+            )
+            await db.executemany("""
+                INSERT INTO notification_search (rowid, pr_title, pr_body, summary, analysis)
+                VALUES (?, ?, ?, ?, ?)
+            """, [
+                (
+                    ids[key], row['pr_title'], row['pr_body'], row['summary'],
+                    search_analysis_text(row['ai_analysis']),
+                )
+                for key, row in latest.items()
+            ])
+
+            return ids, existing
+
+        ids, existing = await self.write_queue.submit(upsert)
+        for notification_id in ids.values():
+            await self._emit_change(
+                notification_id, "update" if notification_id in existing else "new"
+            )
+        return [ids[(row['repository'], row['pr_number'])] for row in rows]
+
+    async def get_notifications_page(
+        self,
+        status_filter: str = None,
+        limit: int = 50,
+        cursor: str = None,
+        include_archived: bool = False,
+    ) -> tuple[list[dict], str | None]:
+        """
+        Uses keyset pagination on (created_at, id), so every page costs the same
+        index seek no matter how deep it is, and rows inserted while paging never
+        shift later pages.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        conditions = []
+        params = []
+        if status_filter:
+            conditions.append("status = ?")
+            params.append(status_filter)
+        if cursor:
+            conditions.append("(created_at, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        source = "main.notifications"
+        if include_archived:
+            # Archived rows keep their ids, so the keyset spans both tables
+            source = f"""(
+                SELECT {CARD_COLUMNS} FROM main.notifications
+                UNION ALL
+                SELECT {CARD_COLUMNS} FROM archive.notifications
+            )"""
+
+        async with self.pool.reader() as db:
+            # Fetch one extra row to learn whether another page exists
+            db_cursor = await db.execute(f"""
+                SELECT {CARD_COLUMNS} FROM {source}
+                {where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            """, (*params, limit + 1))
+
+            rows = [_card(row) for row in await db_cursor.fetchall()]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+
+        return rows, next_cursor
+
+    async def search_notifications(
+        self, text: str, status_filter: str = None, repository: str = None, limit: int = 20
+    ) -> list[dict]:
+        """Ranked by bm25 over the FTS5 index; title matches weigh most."""
+        match = build_search_query(text)
+        if match is None:
+            return []
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        conditions = ["notification_search MATCH ?"]
+        params = [match]
+        if status_filter:
+            conditions.append("n.status = ?")
+            params.append(status_filter)
+        if repository:
+            conditions.append("n.repository = ?")
+            params.append(repository)
+
+        card_columns = ", ".join(f"n.{column.strip()}" for column in CARD_COLUMNS.split(","))
+
+        async with self.pool.reader() as db:
+            cursor = await db.execute(f"""
+                SELECT {card_columns},
+                       snippet(notification_search, -1, ?, ?, '…', 12) AS snippet
+                FROM notification_search
+                JOIN notifications n ON n.id = notification_search.rowid
+                WHERE {' AND '.join(conditions)}
+                ORDER BY bm25(notification_search, 10.0, 1.0, 4.0, 2.0)
+                LIMIT ?
+            """, (SNIPPET_START, SNIPPET_END, *params, limit))
+
+            return [_card(row) for row in await cursor.fetchall()]
+
+    async def get_notification_by_id(
+        self, notification_id: int, include_details: bool = False, include_archived: bool = False
+    ):
+        schemas = ("main", "archive") if include_archived else ("main",)
+        async with self.pool.reader() as db:
+            for schema in schemas:
+                cursor = await db.execute(f"""
+                    SELECT {CARD_COLUMNS} FROM {schema}.notifications WHERE id = ?
+                """, (notification_id,))
+                row = await cursor.fetchone()
+                if row:
+                    break
+            else:
+                return None
+            notification = _card(row)
+
+            if include_details:
+                cursor = await db.execute(f"""
+                    SELECT pr_body, ai_analysis FROM {schema}.notification_details
+                    WHERE notification_id = ?
+                """, (notification_id,))
+                details = await cursor.fetchone()
+
+        if include_details:
+            notification['pr_body'] = decompress_text(details['pr_body']) if details else None
+            notification['ai_analysis'] = (
+                decompress_json(details['ai_analysis'], {}) if details else {}
+            )
+
+        return notification
+
+    async def archive_notifications(
+        self, older_than_days: int, statuses: list[str], batch_size: int = 500
+    ) -> int:
+        """
+        Each batch holds the writer for two short transactions. The first
+        copies the rows into the archive and commits; the second deletes from
+        the hot tables only the notifications the archive now holds (triggers
+        drop their search entries, details and stat counts). A transaction
+        over ATTACHed databases in WAL mode is not atomic across the files,
+        so each one writes a single file: a crash in between leaves the rows
+        in both databases, never in neither, and the next run (an upsert into
+        the archive) finishes the move. Afterwards the freed pages are
+        returned to the filesystem in steps.
+        """
+        if not statuses:
+            return 0
+        cutoff = f"-{max(0, older_than_days)} days"
+        archived = 0
+
+        while True:
+            async with self.pool.writer() as db:
+                cursor = await db.execute("""
+                    SELECT id FROM main.notifications
+                    WHERE status IN (SELECT value FROM json_each(?))
+                      AND updated_at <= datetime('now', ?)
+                    ORDER BY id
+                    LIMIT ?
+                """, (json.dumps(statuses), cutoff, batch_size))
+                batch = [row['id'] for row in await cursor.fetchall()]
+                if not batch:
+                    break
+                ids = json.dumps(batch)
+
+                for table in ARCHIVED_TABLES:
+                    match = "id" if table == "notifications" else "notification_id"
+                    cursor = await db.execute(f"PRAGMA main.table_info({table})")
+                    columns = ", ".join(row['name'] for row in await cursor.fetchall())
+                    await db.execute(f"""
+                        INSERT OR REPLACE INTO archive.{table} ({columns})
+                        SELECT {columns} FROM main.{table}
+                        WHERE {match} IN (SELECT value FROM json_each(?))
+                    """, (ids,))
+                await db.commit()
+
+                # Still holding the writer, so no write lands between the two
+                cursor = await db.execute(
+                    "SELECT id FROM archive.notifications"
+                    " WHERE id IN (SELECT value FROM json_each(?))", (ids,)
+                )
+                moved = [row['id'] for row in await cursor.fetchall()]
+                ids = json.dumps(moved)
+                await db.execute(
+                    "DELETE FROM main.user_actions"
+                    " WHERE notification_id IN (SELECT value FROM json_each(?))", (ids,)
+                )
+                await db.execute(
+                    "DELETE FROM main.notifications WHERE id IN (SELECT value FROM json_each(?))",
+                    (ids,),
+                )
+
+            archived += len(moved)
+            if len(batch) < batch_size or len(moved) < len(batch):
+                break
+            # Let queued writes have the lock between batches
+            await asyncio.sleep(0)
+
+        if archived:
+            logger.info(f"Archived {archived} notifications")
+            await self._incremental_vacuum()
+        return archived
+
+    async def _incremental_vacuum(self):
+        if not self.incremental_vacuum:
+            # Nothing would free the pages; see enable_incremental_vacuum
+            return
+        while True:
+            async with self.pool.writer() as db:
+                cursor = await db.execute("PRAGMA main.freelist_count")
+                if not (await cursor.fetchone())[0]:
+                    return
+                # Each result row is one freed page; it only runs while rows are read
+                cursor = await db.execute(
+                    f"PRAGMA main.incremental_vacuum({VACUUM_PAGES_PER_STEP})"
+                )
+                await cursor.fetchall()
+            await asyncio.sleep(0)
+
+    async def get_notification_by_pr(self, repository: str, pr_number: int):
+        async with self.pool.reader() as db:
+            cursor = await db.execute(f"""
+                SELECT {CARD_COLUMNS} FROM notifications
+                WHERE repository = ? AND pr_number = ?
+            """, (repository, pr_number))
+
+            row = await cursor.fetchone()
+            return _card(row) if row else None
+
+    async def get_notifications_pending_analysis(self, limit: int = 10) -> list[dict]:
+        async with self.pool.reader() as db:
+            cursor = await db.execute(f"""
+                SELECT {CARD_COLUMNS} FROM notifications
+                WHERE analysis_pending = 1
+                ORDER BY updated_at
+                LIMIT ?
+            """, (max(1, min(limit, MAX_PAGE_SIZE)),))
+            return [_card(row) for row in await cursor.fetchall()]
+
+    async def get_analysis_versions(self, notification_id: int, limit: int = 20) -> list[dict]:
+        async with self.pool.reader() as db:
+            cursor = await db.execute("""
+                SELECT v.version, v.head_sha, v.ai_analysis, v.changes, v.created_at,
+                       v.created_at > COALESCE(
+                           (SELECT MAX(a.created_at) FROM user_actions a
+                            WHERE a.notification_id = v.notification_id), ''
+                       ) AS since_last_review
+                FROM analysis_versions v
+                WHERE v.notification_id = ?
+                ORDER BY v.version DESC
+                LIMIT ?
+            """, (notification_id, max(1, min(limit, MAX_PAGE_SIZE))))
+            rows = await cursor.fetchall()
+
+        return [
+            {
+                'version': row['version'],
+                'head_sha': row['head_sha'],
+                'ai_analysis': decompress_json(row['ai_analysis'], {}),
+                'changes': decompress_json(row['changes']),
+                'created_at': row['created_at'],
+                'since_last_review': bool(row['since_last_review']),
+            }
+            for row in rows
+        ]
+
+    async def update_notification_status(self, notification_id: int, status: str):
+        async def update(db):
+            await db.execute("""
+                UPDATE notifications
+                SET status = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (status, notification_id))
+
+        await self.write_queue.submit(update)
+        await self._emit_change(notification_id, "update")
+
+    async def save_user_action(self, notification_id: int, action: str, comment: str = None) -> int:
+        async def insert(db):
+            cursor = await db.execute("""
+                INSERT INTO user_actions (notification_id, action, comment)
+                VALUES (?, ?, ?)
+            """, (notification_id, action, comment))
+            return cursor.lastrowid
+
+        return await self.write_queue.submit(insert)
+
+    async def get_notification_stats(self) -> dict:
+        """
+        Reads the trigger-maintained notification_stats counters, so the cost
+        does not grow with the size of the history.
+        """
+        async with self.pool.reader() as db:
+            cursor = await db.execute("""
+                SELECT status, count FROM notification_stats
+            """)
+
+            rows = await cursor.fetchall()
+            return format_stats({row['status']: row['count'] for row in rows})
+
+    async def rebuild_notification_stats(self) -> dict:
+        """Logs a warning if the materialized counters had drifted."""
+        async with self.pool.writer() as db:
+            cursor = await db.execute("SELECT status, count FROM notification_stats")
+            before = {row['status']: row['count'] for row in await cursor.fetchall() if row['count']}
+
+            await db.execute("DELETE FROM notification_stats")
+            await db.execute("""
+                INSERT INTO notification_stats (status, count)
+                SELECT status, COUNT(*) FROM notifications GROUP BY status
+            """)
+
+            cursor = await db.execute("SELECT status, count FROM notification_stats")
+            after = {row['status']: row['count'] for row in await cursor.fetchall()}
+
+        if before != after:
+            logger.warning(f"Notification stats drifted; rebuilt {before} -> {after}")
+
+        return format_stats(after)
+
+    async def enqueue_job(
+        self,
+        event_type: str,
+        payload: str,
+        delivery_id: str | None = None,
+        coalesce_key: str | None = None,
+        window_seconds: float = 0.0,
+        max_wait_seconds: float = 0.0,
+        merge: PayloadMerge | None = None,
+        repository: str | None = None,
+    ) -> int | None:
+        payload_blob = compress_text(payload)
+        window = f"+{window_seconds} seconds"
+
+        async def insert(db):
+            if delivery_id is not None:
+                cursor = await db.execute(
+                    "INSERT OR IGNORE INTO webhook_deliveries (delivery_id) VALUES (?)",
+                    (delivery_id,),
+                )
+                if cursor.rowcount == 0:
+                    return None
+
+            if coalesce_key is not None:
+                # A retry keeps its backoff and attempts: the event gets a job of its own
+                cursor = await db.execute("""
+                    SELECT id, payload FROM webhook_jobs
+                    WHERE coalesce_key = ? AND status = 'queued' AND attempts = 0
+                    ORDER BY id DESC
+                    LIMIT 1
+                """, (coalesce_key,))
+                queued = await cursor.fetchone()
+                if queued:
+                    merged = payload_blob
+                    if merge is not None:
+                        merged = compress_text(merge(decompress_text(queued['payload']), payload))
+                    await db.execute("""
+                        UPDATE webhook_jobs
+                        SET payload = ?, events = events + 1,
+                            run_after = min(datetime('now', ?), datetime(created_at, ?)),
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    """, (merged, window, f"+{max_wait_seconds} seconds", queued['id']))
+                    return queued['id']
+
+            cursor = await db.execute("""
+                INSERT INTO webhook_jobs (event_type, payload, coalesce_key, repository, run_after)
+                VALUES (?, ?, ?, ?, datetime('now', ?))
+            """, (event_type, payload_blob, coalesce_key, repository, window))
+            return cursor.lastrowid
+
+        return await self.write_queue.submit(insert)
+
+    async def prune_deliveries(self, older_than_seconds: float) -> int:
+        async def delete(db):
+            cursor = await db.execute(
+                "DELETE FROM webhook_deliveries WHERE received_at < datetime('now', ?)",
+                (f"-{older_than_seconds} seconds",),
+            )
+            return cursor.rowcount
+
+        return await self.write_queue.submit(delete)
+
+    async def claim_jobs(
+        self,
+        limit: int,
+        lease_seconds: float,
+        per_repository_limit: int = 0,
+        repository_weights: dict[str, float] | None = None,
+    ) -> list[dict]:
+        weights = json.dumps(repository_weights or {})
+
+        async def claim(db):
+            cursor = await db.execute(f"""
+                UPDATE webhook_jobs
+                SET status = 'running', attempts = attempts + 1,
+                    run_after = datetime('now', ?), updated_at = CURRENT_TIMESTAMP
+                WHERE id IN (
+                    SELECT id FROM ({DUE_JOB_TURNS})
+                    WHERE ? <= 0 OR slot <= ?
+                    ORDER BY slot * 1.0 / weight, run_after, id
+                    LIMIT ?
+                )
+                RETURNING id, event_type, repository, payload, attempts, events
+            """, (
+                f"+{lease_seconds} seconds", weights,
+                per_repository_limit, per_repository_limit, limit,
+            ))
+            return await cursor.fetchall()
+
+        rows = await self.write_queue.submit(claim)
+        jobs = [dict(row) | {'payload': decompress_text(row['payload'])} for row in rows]
+        return sorted(jobs, key=lambda job: job['id'])
+
+    async def complete_job(self, job_id: int):
+        async def delete(db):
+            await db.execute("DELETE FROM webhook_jobs WHERE id = ?", (job_id,))
+
+        await self.write_queue.submit(delete)
+
+    async def fail_job(self, job_id: int, error: str, retry_in: float | None):
+        async def update(db):
+            await db.execute("""
+                UPDATE webhook_jobs
+                SET status = ?, last_error = ?,
+                    run_after = datetime('now', ?), updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (
+                "dead" if retry_in is None else "queued",
+                error,
+                f"+{retry_in or 0} seconds",
+                job_id,
+            ))
+
+        await self.write_queue.submit(update)
+
+    async def recover_jobs(self) -> int:
+        """Requeues every running job: only one process uses the file."""
+        async def requeue(db):
+            cursor = await db.execute("""
+                UPDATE webhook_jobs
+                SET status = 'queued', run_after = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'running'
+            """)
+            return cursor.rowcount
+
+        return await self.write_queue.submit(requeue)
+
+    async def get_job_queue_stats(self) -> dict:
+        async with self.pool.reader() as db:
+            cursor = await db.execute(
+                "SELECT status, COUNT(*) AS count FROM webhook_jobs GROUP BY status"
+            )
+            counts = {row['status']: row['count'] for row in await cursor.fetchall()}
+            cursor = await db.execute("""
+                SELECT (julianday('now') - julianday(MIN(run_after))) * 86400
+                FROM webhook_jobs
+                WHERE status = 'queued' AND run_after <= datetime('now')
+            """)
+            lag = (await cursor.fetchone())[0]
+
+        return format_job_stats(counts, lag)
@@ -0,0 +1,179 @@
+"""
+Group-commit write queue: coalesces database mutations into shared transactions
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+import aiosqlite
+
+from app.db_pool import DatabasePool
+
+logger = logging.getLogger(__name__)
+
+# A mutation receives the writer connection and returns its result (e.g. lastrowid)
+Mutation = Callable[[aiosqlite.Connection], Awaitable[Any]]
+
+
+class WriteQueue:
+    """
+    Single background writer that batches mutations from many callers.
+
+    Each batch is one transaction (one commit, so one WAL sync) holding up to
+    `max_batch` operations that arrived within `max_delay` seconds. If any
+    operation fails, the transaction is rolled back and the batch replayed
+    with every operation in its own SAVEPOINT, so only the failing operation
+    is reported to its caller and the rest still commit.
+
+    `get_pool` is called when the writer starts, so the queue always writes to
+    the pool that is current at that point. Batch settings left as None are
+    read from app settings at the same time.
+    """
+
+    def __init__(
+        self,
+        get_pool: Callable[[], DatabasePool],
+        max_batch: int | None = None,
+        max_delay: float | None = None,
+    ):
+        self.get_pool = get_pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pool: DatabasePool | None = None
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+        # Monitoring counters
+        self.batches_committed = 0
+        self.operations_committed = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the background writer task (no-op if already running)."""
+        if self.is_running:
+            return
+
+        if self.max_batch is None or self.max_delay is None:
+            # Imported lazily so the module can be used without app settings
+            from app.config import settings
+            if self.max_batch is None:
+                self.max_batch = settings.db_write_batch_size
+            if self.max_delay is None:
+                self.max_delay = settings.db_write_batch_delay_ms / 1000
+        self.max_batch = max(1, self.max_batch)
+        self.max_delay = max(0.0, self.max_delay)
+
+        self.pool = self.get_pool()
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush pending mutations, then stop the writer task."""
+        if not self.is_running:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._queue = None
+
+    async def submit(self, mutation: Mutation) -> Any:
+        """Queue a mutation and wait until the transaction containing it commits."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((mutation, future))
+        return await future
+
+    async def _run(self):
+        batch = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                self._drain_into(batch)
+
+                # Give concurrent writers a moment to join a batch that is not full yet
+                if self.max_delay and len(batch) < self.max_batch:
+                    await asyncio.sleep(self.max_delay)
+                    self._drain_into(batch)
+
+                try:
+                    await self._commit_batch(batch)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                batch = []
+        finally:
+            # Cancelled mid-batch (the transaction was rolled back) or with work
+            # still queued: never leave a caller waiting forever.
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(
+                        RuntimeError("Write queue stopped before the write was committed")
+                    )
+
+    def _drain_into(self, batch: list):
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+    async def _commit_batch(self, batch: list):
+        live = [(mutation, future) for mutation, future in batch if not future.cancelled()]
+        try:
+            try:
+                outcomes = await self._run_transaction(live, isolate=False)
+            except _OperationFailed:
+                # Replay with per-operation savepoints to isolate the failure
+                outcomes = await self._run_transaction(live, isolate=True)
+        except Exception as e:
+            logger.error(f"Error committing write batch of {len(batch)}: {e}", exc_info=True)
+            for _, future in live:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches_committed += 1
+        self.operations_committed += len(live)
+
+        # Only report success once the whole transaction is durable
+        for (_, future), (ok, value) in zip(live, outcomes):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    async def _run_transaction(self, operations: list, isolate: bool) -> list:
+        outcomes = []
+        async with self.pool.writer() as db:
+            await db.execute("BEGIN")
+            for mutation, _ in operations:
+                if not isolate:
+                    try:
+                        outcomes.append((True, await mutation(db)))
+                    except Exception as e:
+                        raise _OperationFailed() from e
+                    continue
+
+                await db.execute("SAVEPOINT write_op")
+                try:
+                    result = await mutation(db)
+                except Exception as e:
+                    await db.execute("ROLLBACK TO write_op")
+                    await db.execute("RELEASE write_op")
+                    outcomes.append((False, e))
+                else:
+                    await db.execute("RELEASE write_op")
+                    outcomes.append((True, result))
+        return outcomes
+
+
+class _OperationFailed(Exception):
+    """Internal: an operation failed in a batch that ran without savepoints."""
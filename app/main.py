@@ -1,3 +1,5 @@
+import asyncio
+import contextlib
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
@@ -6,6 +8,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.routes import github, slack, health, dashboard
 from app import database
+from app.services.github_service import github_service
+from app.services.pr_summary_service import backfill_pending_analyses_forever
+from app.services.webhook_queue import webhook_queue
+from app.services.websocket_manager import ws_manager
 
 logging.basicConfig(
     level=settings.log_level,
@@ -18,11 +24,45 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     logger.info("Starting Code Review Slack Bot...")
     logger.info(f"Environment: {settings.environment}")
+    # Push every committed change (from any app process, with PostgreSQL) to dashboards
+    database.add_change_listener(broadcast_change)
     # Initialize database
     await database.init_db()
     logger.info("Database initialized")
+    await webhook_queue.start(github.process_webhook_event)
+    background_tasks = [
+        asyncio.create_task(
+            database.reconcile_stats_forever(settings.stats_reconcile_interval_seconds)
+        ),
+        asyncio.create_task(database.prune_deliveries_forever(
+            3600, settings.webhook_delivery_ttl_hours * 3600
+        )),
+        asyncio.create_task(backfill_pending_analyses_forever(
+            settings.analysis_backfill_interval_seconds, settings.analysis_backfill_batch_size
+        )),
+    ]
+    if settings.retention_days > 0:
+        background_tasks.append(asyncio.create_task(database.archive_forever(
+            settings.retention_interval_seconds,
+            settings.retention_days,
+            [status.strip() for status in settings.retention_statuses.split(",") if status.strip()],
+            settings.retention_batch_size,
+        )))
     yield
     logger.info("Shutting down Code Review Slack Bot...")
+    await webhook_queue.stop()
+    for task in background_tasks:
+        task.cancel()
+    # Let in-flight jobs release the writer before the pool closes
+    for task in background_tasks:
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    await github_service.close()
+    await database.close_db()
+
+
+async def broadcast_change(event: dict):
+    await ws_manager.broadcast_notification_update(event["notification_id"], event["action"])
 
 
 app = FastAPI(
@@ -1,3 +1,11 @@
+"""
+GitHub webhook models
+
+They declare only the fields the app reads. Validating straight from the raw
+body (Model.model_validate_json) lets pydantic-core skip everything else in
+the payload -- most of it is the full repository object repeated under head,
+base and repository -- without building Python objects for it.
+"""
 from pydantic import BaseModel, Field
 from typing import Literal
 
@@ -13,15 +21,21 @@ class Repository(BaseModel):
     html_url: str
 
 
+class Branch(BaseModel):
+    ref: str
+    sha: str
+
+
 class PullRequest(BaseModel):
     number: int
     title: str
     html_url: str
     state: str
+    merged: bool = False
     body: str | None = None
     user: User
-    head: dict
-    base: dict
+    head: Branch
+    base: Branch
     additions: int = 0
     deletions: int = 0
     changed_files: int = 0
@@ -33,6 +47,11 @@ class PullRequestEvent(BaseModel):
     repository: Repository
     sender: User
     requested_reviewer: User | None = None
+    # Head SHAs around the push, on synchronize events
+    before: str | None = None
+    after: str | None = None
+    # Set when several events for the PR were merged into this one (oldest first)
+    coalesced_actions: list[str] = []
 
 
 class Review(BaseModel):
@@ -47,3 +66,23 @@ class ReviewEvent(BaseModel):
     review: Review
     pull_request: PullRequest
     repository: Repository
+
+
+class PullRequestRef(BaseModel):
+    number: int
+
+
+class RepositoryRef(BaseModel):
+    full_name: str
+
+
+class WebhookEnvelope(BaseModel):
+    """What the webhook endpoint needs from any event before queueing it."""
+    action: str | None = None
+    repository: RepositoryRef | None = None
+
+
+class PullRequestEnvelope(WebhookEnvelope):
+    """What the webhook endpoint needs from a pull_request event: its PR key."""
+    pull_request: PullRequestRef
+    repository: RepositoryRef
@@ -1,6 +1,7 @@
 """
 Dashboard API endpoints with username/password authentication
 """
+import html
 import logging
 import json
 import hashlib
@@ -12,6 +13,7 @@ from pydantic import BaseModel
 
 from app import database
 from app.services.github_service import github_service
+from app.services.github_scheduler import interactive_github_lane
 from app.services.email_service import email_service
 from app.services.public_url_service import get_public_url, get_login_url
 from app.services.websocket_manager import ws_manager
@@ -19,7 +21,8 @@ from app.config import settings
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+# A user is waiting on every GitHub call made from here
+router = APIRouter(dependencies=[Depends(interactive_github_lane)])
 templates = Jinja2Templates(directory="app/templates")
 
 # In-memory session store (use Redis in production)
@@ -282,15 +285,7 @@ async def forgot_password_page(request: Request):
 async def dashboard_home(request: Request, user: dict = Depends(get_current_user)):
     """Render the main dashboard page."""
     stats = await database.get_notification_stats()
-    notifications = await database.get_all_notifications(limit=20)
-
-    # Parse AI analysis JSON for each notification
-    for notif in notifications:
-        if notif.get('ai_analysis'):
-            try:
-                notif['ai_analysis'] = json.loads(notif['ai_analysis'])
-            except:
-                notif['ai_analysis'] = {}
+    notifications, next_cursor = await database.get_notifications_page(limit=20)
 
     # Get public URL for WebSocket connection
     public_url = get_public_url()
@@ -303,73 +298,128 @@ async def dashboard_home(request: Request, user: dict = Depends(get_current_user
         "request": request,
         "stats": stats,
         "notifications": notifications,
+        "next_cursor": next_cursor,
         "ws_url": ws_url
     })
 
 
 @router.get("/api/notifications")
 async def get_notifications(
+    response: Response,
     status: str | None = None,
     limit: int = 50,
+    cursor: str | None = None,
+    include_archived: bool = False,
     user: dict = Depends(get_current_user)
 ):
-    """Get all notifications."""
-    notifications = await database.get_all_notifications(status_filter=status, limit=limit)
-
-    # Parse AI analysis JSON
-    for notif in notifications:
-        if notif.get('ai_analysis'):
-            try:
-                notif['ai_analysis'] = json.loads(notif['ai_analysis'])
-            except:
-                notif['ai_analysis'] = {}
+    """
+    Get one page of notifications.
+
+    When more rows exist, the X-Next-Cursor response header holds the cursor
+    to pass back as ?cursor= for the next page. include_archived=true also
+    returns notifications moved out by the retention policy.
+    """
+    notifications, next_cursor = await _get_notifications_page(
+        status, limit, cursor, include_archived
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
     return notifications
 
 
 @router.get("/api/dashboard-data")
 async def get_dashboard_data(
+    cursor: str | None = None,
     user: dict = Depends(get_current_user)
 ):
     """Get dashboard data (stats + notifications) for dynamic refresh."""
     stats = await database.get_notification_stats()
-    notifications = await database.get_all_notifications(limit=20)
-
-    # Parse AI analysis JSON for each notification
-    for notif in notifications:
-        if notif.get('ai_analysis'):
-            try:
-                notif['ai_analysis'] = json.loads(notif['ai_analysis'])
-            except:
-                notif['ai_analysis'] = {}
+    notifications, next_cursor = await _get_notifications_page(None, 20, cursor)
 
     return {
         "stats": stats,
-        "notifications": notifications
+        "notifications": notifications,
+        "next_cursor": next_cursor
     }
 
 
+@router.get("/api/search")
+async def search_notifications(
+    q: str,
+    status: str | None = None,
+    repository: str | None = None,
+    limit: int = 20,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Full-text search over PR titles, bodies, AI summaries, key changes and risks.
+
+    Results are ranked by relevance. Each has a `snippet` that is HTML-escaped,
+    with the matched terms wrapped in <mark>.
+    """
+    results = await database.search_notifications(
+        q, status_filter=status, repository=repository, limit=limit
+    )
+    for result in results:
+        result['snippet'] = (
+            html.escape(result['snippet'] or "")
+            .replace(database.SNIPPET_START, "<mark>")
+            .replace(database.SNIPPET_END, "</mark>")
+        )
+    return results
+
+
+async def _get_notifications_page(
+    status: str | None, limit: int, cursor: str | None, include_archived: bool = False
+):
+    """Fetch a notifications page, turning a malformed cursor into a 400."""
+    try:
+        return await database.get_notifications_page(
+            status_filter=status, limit=limit, cursor=cursor, include_archived=include_archived
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/api/notifications/{notification_id}")
 async def get_notification(
     notification_id: int,
+    include_archived: bool = False,
     user: dict = Depends(get_current_user)
 ):
-    """Get a single notification by ID."""
-    notification = await database.get_notification_by_id(notification_id)
+    """Get a single notification by ID, including the PR body and full AI analysis."""
+    notification = await database.get_notification_by_id(
+        notification_id, include_details=True, include_archived=include_archived
+    )
 
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
 
-    # Parse AI analysis JSON
-    if notification.get('ai_analysis'):
-        try:
-            notification['ai_analysis'] = json.loads(notification['ai_analysis'])
-        except:
-            notification['ai_analysis'] = {}
-
     return notification
 
 
+@router.get("/api/notifications/{notification_id}/analysis-versions")
+async def get_analysis_versions(
+    notification_id: int,
+    limit: int = 20,
+    user: dict = Depends(get_current_user)
+):
+    """
+    AI analysis history for a notification, newest first. Versions flagged
+    since_last_review show what changed since someone last acted on the PR.
+    """
+    notification = await database.get_notification_by_id(notification_id)
+
+    if not notification:
+        raise HTTPException(status_code=404, detail="Notification not found")
+
+    return {
+        "notification_id": notification_id,
+        "versions": await database.get_analysis_versions(notification_id, limit),
+    }
+
+
 @router.post("/api/notifications/{notification_id}/approve")
 async def approve_pr(
     notification_id: int,
@@ -565,9 +615,12 @@ async def get_pr_diff(
         raise HTTPException(status_code=404, detail="Notification not found")
 
     try:
-        diff = github_service.get_pr_diff(
+        # The diff cache is looked up by the head GitHub reports now (a
+        # revalidation through the ETag cache), not the last analyzed one,
+        # which is stale while a push is waiting to be analyzed
+        diff = await github_service.get_pr_diff(
             notification['repository'],
-            notification['pr_number']
+            notification['pr_number'],
         )
 
         return {
@@ -1,47 +1,133 @@
-import json
 import logging
+import re
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
 
-from app.models.github import PullRequestEvent, ReviewEvent
+from app.models.github import PullRequestEnvelope, PullRequestEvent, ReviewEvent, WebhookEnvelope
 from app.utils.github_signature import verify_github_signature
+from app.services.github_scheduler import Lane, github_lane
+from app.services.github_service import github_service
 from app.services.slack_service import slack_service
 from app.services.slack_webhook_service import slack_webhook_service
-from app.services.pr_summary_service import generate_pr_summary
+from app.services.pr_summary_service import generate_incremental_pr_summary, generate_pr_summary
+from app.services.webhook_queue import webhook_queue
+from app.utils import fast_json
 from app.config import settings
 from app import database
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Pull request actions that (re)build the PR's notification and AI summary
+ANALYZED_ACTIONS = ("opened", "reopened", "review_requested")
 
-@router.post("/github")
+# Event type -> actions its handler acts on; any other action is dropped unqueued
+HANDLED_ACTIONS = {
+    "pull_request": (*ANALYZED_ACTIONS, "synchronize", "closed"),
+    "pull_request_review": ("submitted",),
+}
+
+# GitHub serializes "action" as the first key, so it can be read without decoding
+LEADING_ACTION = re.compile(rb'\s*\{\s*"action"\s*:\s*"([a-z_]+)"')
+
+
+@router.post("/github", status_code=202)
 async def github_webhook(request: Request):
-    await verify_github_signature(request)
+    """
+    Verify and durably queue the event, then acknowledge at once; the work
+    (GitHub calls, AI summary) happens in the webhook_queue workers, well
+    inside GitHub's delivery timeout.
+    """
+    body = await verify_github_signature(request)
 
     event_type = request.headers.get("X-GitHub-Event")
-    body = await request.body()
-    payload = json.loads(body)
-
     logger.info(f"Received GitHub webhook: {event_type}")
 
-    try:
-        if event_type == "pull_request":
-            await handle_pull_request_event(payload)
-        elif event_type == "pull_request_review":
-            await handle_review_event(payload)
-        else:
-            logger.info(f"Ignoring event type: {event_type}")
-
-        return {"status": "success"}
-    except Exception as e:
-        logger.error(f"Error processing webhook: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    if event_type not in EVENT_HANDLERS:
+        logger.info(f"Ignoring event type: {event_type}")
+        return JSONResponse({"status": "ignored"}, status_code=200)
 
+    # Most deliveries (labels, edits, assignments...) are dropped here, before decoding
+    action = peek_action(body)
+    if action is not None and action not in HANDLED_ACTIONS[event_type]:
+        logger.info(f"Ignoring {event_type} action: {action}")
+        return JSONResponse({"status": "ignored"}, status_code=200)
 
-async def handle_pull_request_event(payload: dict):
-    event = PullRequestEvent(**payload)
+    envelope_model = PullRequestEnvelope if event_type == "pull_request" else WebhookEnvelope
+    try:
+        envelope = envelope_model.model_validate_json(body)
+    except ValidationError:
+        raise HTTPException(status_code=400, detail=f"Payload is not a valid {event_type} event")
+    if envelope.action not in HANDLED_ACTIONS[event_type]:
+        logger.info(f"Ignoring {event_type} action: {envelope.action}")
+        return JSONResponse({"status": "ignored"}, status_code=200)
+
+    # GitHub redelivers on timeouts and errors; the repeat must not re-run the pipeline
+    delivery_id = request.headers.get("X-GitHub-Delivery")
+    coalesce_key = merge = None
+    if event_type == "pull_request":
+        # A burst of events for one PR (opened + review requests, rapid pushes)
+        # is processed once, with the latest PR state
+        coalesce_key = f"{envelope.repository.full_name}#{envelope.pull_request.number}"
+        merge = merge_pull_request_events
+    # Workers are shared fairly between repositories
+    repository = envelope.repository.full_name if envelope.repository else None
+    job_id = await webhook_queue.enqueue(
+        event_type, body.decode("utf-8"), delivery_id, coalesce_key, merge, repository
+    )
+    if job_id is None:
+        logger.info(f"Ignoring duplicate delivery {delivery_id}")
+        return JSONResponse({"status": "duplicate"}, status_code=200)
+    return {"status": "queued", "job_id": job_id}
+
+
+def peek_action(body: bytes) -> str | None:
+    """The event's action if the body starts with it, else None (decode to find out)."""
+    match = LEADING_ACTION.match(body, 0, 256)
+    return match.group(1).decode() if match else None
+
+
+def merge_pull_request_events(queued: str, latest: str) -> str:
+    """
+    Fold a newer pull_request event into a queued one for the same PR.
+
+    The newer payload carries the latest PR state. If an earlier event in the
+    burst would have run the analysis and the newest one would not (e.g.
+    opened, then synchronize), the merged event keeps that earlier action so
+    the analysis still runs. `coalesced_actions` lists every action merged,
+    and `before` stays the head before the first push of the burst.
+    """
+    earlier = fast_json.loads(queued)
+    merged = fast_json.loads(latest)
+    actions = earlier.get("coalesced_actions") or [earlier.get("action")]
+    actions.append(merged.get("action"))
+    if earlier.get("before"):
+        merged["before"] = earlier["before"]
+
+    if merged.get("action") not in ANALYZED_ACTIONS:
+        analyzed = [action for action in actions if action in ANALYZED_ACTIONS]
+        if analyzed:
+            merged["action"] = analyzed[-1]
+    merged["coalesced_actions"] = actions
+    return fast_json.dumps(merged)
+
+
+async def process_webhook_event(event_type: str, payload: str):
+    """Run a queued webhook (raw JSON body); exceptions make the queue retry it."""
+    with github_lane(Lane.WEBHOOK):
+        await EVENT_HANDLERS[event_type](payload)
+
+
+async def handle_pull_request_event(payload: str):
+    event = PullRequestEvent.model_validate_json(payload)
+    if event.coalesced_actions:
+        logger.info(
+            f"PR #{event.pull_request.number} in {event.repository.full_name}: processing "
+            f"{len(event.coalesced_actions)} coalesced events as one"
+        )
 
-    if event.action in ["opened", "reopened", "review_requested"]:
+    if event.action in ANALYZED_ACTIONS:
         pr_summary = await generate_pr_summary(event)
 
         # Save notification to database
@@ -54,14 +140,70 @@ async def handle_pull_request_event(payload: dict):
         logger.info(
             f"Sent PR notification for #{event.pull_request.number} in {event.repository.full_name}"
         )
+        await prefetch_diff(event)
     elif event.action == "synchronize":
+        await reanalyze_pushed_commits(event)
+
+    # The latest PR state, also when a close was coalesced with earlier events
+    if event.pull_request.state == "closed":
+        await record_pr_closed(event)
+
+
+async def record_pr_closed(event: PullRequestEvent):
+    """Mark a closed PR's notification merged or closed (the statuses retention archives)."""
+    pr = event.pull_request
+    repository = event.repository.full_name
+    notification = await database.get_notification_by_pr(repository, pr.number)
+    if notification is None:
+        return
+    status = "merged" if pr.merged else "closed"
+    if notification["status"] != status:
+        await database.update_notification_status(notification["id"], status)
+        logger.info(f"PR #{pr.number} in {repository} {status}; notification #{notification['id']}")
+
+
+async def prefetch_diff(event: PullRequestEvent):
+    """Cache the diff of the PR's new head, so "View changes" doesn't wait on GitHub."""
+    pr = event.pull_request
+    await github_service.prefetch_pr_diff(
+        event.repository.full_name, pr.number, event.after or pr.head.sha
+    )
+
+
+async def reanalyze_pushed_commits(event: PullRequestEvent):
+    """Refresh an already analyzed PR's notification after a push, analyzing only the new commits."""
+    pr = event.pull_request
+    repository = event.repository.full_name
+    notification = await database.get_notification_by_pr(repository, pr.number)
+    if notification is None:
+        logger.info(f"PR #{pr.number} updated in {repository}; no notification to refresh")
+        return
+
+    versions = await database.get_analysis_versions(notification["id"], limit=1)
+    if notification["analysis_pending"]:
+        # A deferred (heuristic) analysis is no base for a delta; redo it all
+        previous = {}
+    elif versions:
+        previous = versions[0]
+    else:
+        # Analyzed before versions were recorded: assume it covers the push's base
+        details = await database.get_notification_by_id(notification["id"], include_details=True)
+        previous = {"head_sha": event.before, "ai_analysis": details and details["ai_analysis"]}
+
+    pr_summary = await generate_incremental_pr_summary(event, previous)
+    if pr_summary is None:
+        logger.info(f"PR #{pr.number} in {repository}: analysis already covers {pr.head.sha[:7]}")
+    else:
+        notification_id = await database.save_notification(event, pr_summary)
+        kind = "incrementally" if pr_summary.get("analysis_changes") else "fully"
         logger.info(
-            f"PR #{event.pull_request.number} updated in {event.repository.full_name}"
+            f"Re-analyzed PR #{pr.number} in {repository} {kind}; notification #{notification_id}"
         )
+    await prefetch_diff(event)
 
 
-async def handle_review_event(payload: dict):
-    event = ReviewEvent(**payload)
+async def handle_review_event(payload: str):
+    event = ReviewEvent.model_validate_json(payload)
 
     if event.action == "submitted":
         # Slack integration disabled - using ReviewFlow dashboard
@@ -70,3 +212,9 @@ async def handle_review_event(payload: dict):
         logger.info(
             f"Sent review notification for PR #{event.pull_request.number} in {event.repository.full_name}"
         )
+
+
+EVENT_HANDLERS = {
+    "pull_request": handle_pull_request_event,
+    "pull_request_review": handle_review_event,
+}
@@ -1,6 +1,10 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 
+from app.services.admission_control import admission_controller
+from app.services.github_service import github_service
+from app.services.webhook_queue import webhook_queue
+
 router = APIRouter()
 
 
@@ -12,3 +16,68 @@ class HealthResponse(BaseModel):
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
     return HealthResponse(status="healthy", message="Code Review Slack Bot is running")
+
+
+class QueueHealthResponse(BaseModel):
+    queued: int
+    running: int
+    dead: int
+    lag_seconds: float
+    workers: int
+    processed: int
+    retried: int
+    dead_lettered: int
+    deliveries: int
+    duplicate_deliveries: int
+    dedupe_hit_rate: float
+    events_coalesced: int
+    shedding: bool
+    summaries_shed: int
+    analyses_backfilled: int
+    llm_in_flight: int
+    llm_p95_seconds: float
+
+
+@router.get("/health/queue", response_model=QueueHealthResponse)
+async def queue_health():
+    """
+    Webhook job queue depth, lag (age of the oldest due job), worker counters,
+    the share of deliveries dropped as duplicates, and whether AI analysis is
+    being shed to heuristic summaries.
+    """
+    return QueueHealthResponse(**await webhook_queue.stats() | admission_controller.stats())
+
+
+class GitHubHealthResponse(BaseModel):
+    cache_entries: int
+    cache_bytes: int
+    cache_hits: int
+    cache_misses: int
+    cache_hit_rate: float
+    rate_limit_saved: int
+    rate_limit_remaining: int | None
+    rate_limits: dict[str, dict[str, float]] = {}
+    paused_seconds: float = 0.0
+    rate_limited: int = 0
+    throttled: dict[str, int] = {}
+    waiting: int = 0
+    credentials: dict[str, int] = {}
+    diff_cache: dict[str, int] = {}
+
+
+@router.get("/health/github", response_model=GitHubHealthResponse)
+async def github_health():
+    """
+    GitHub API ETag cache: entries and size, how many reads were answered by
+    a 304 (each one a request not counted against the rate limit), and the
+    rate limit left as of the last response. Then the call scheduler: the
+    budget per rate limit resource, how long calls are paused after a rate
+    limit response, how often that happened, calls held back per lane and
+    calls waiting now. Last, the requests sent with each credential (token
+    number or App installation, never the token itself), and the diff
+    viewer's cache: PR heads and patches on disk, their size, hits and misses.
+    """
+    stats = github_service.client.stats()
+    if github_service.diff_cache is not None:
+        stats["diff_cache"] = github_service.diff_cache.stats()
+    return GitHubHealthResponse(**stats)
@@ -1,13 +1,15 @@
 import json
 import logging
-from fastapi import APIRouter, Request, Form
+from fastapi import APIRouter, Depends, Request, Form
 from typing import Annotated
 
+from app.services.github_scheduler import interactive_github_lane
 from app.services.github_service import github_service
 from app.services.slack_service import slack_service
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+# A user is waiting on every GitHub call made from here
+router = APIRouter(dependencies=[Depends(interactive_github_lane)])
 
 
 @router.post("/interactions")
@@ -0,0 +1,133 @@
+"""
+Admission control for AI analysis: shed load to heuristic summaries when saturated
+"""
+import contextlib
+import logging
+import time
+from collections import deque
+
+from app import database
+
+logger = logging.getLogger(__name__)
+
+# How long an LLM call's latency counts toward the p95
+LATENCY_WINDOW_SECONDS = 300.0
+
+# Queue depth is read from the database at most this often
+QUEUE_DEPTH_TTL_SECONDS = 1.0
+
+
+class AdmissionController:
+    """
+    Decides whether a PR gets its AI analysis now or a heuristic one.
+
+    It watches the webhook queue depth, LLM calls in flight and the p95
+    latency of recent LLM calls. Crossing any limit (0 disables it) starts
+    shedding; shedding stops once every signal is back under recover_ratio of
+    its limit, so the mode does not flap at the boundary.
+
+    Settings left as None are read from app settings on first use.
+    """
+
+    def __init__(
+        self,
+        max_queue_depth: int | None = None,
+        max_llm_in_flight: int | None = None,
+        max_llm_p95_seconds: float | None = None,
+        recover_ratio: float | None = None,
+    ):
+        self.max_queue_depth = max_queue_depth
+        self.max_llm_in_flight = max_llm_in_flight
+        self.max_llm_p95_seconds = max_llm_p95_seconds
+        self.recover_ratio = recover_ratio
+        self.llm_in_flight = 0
+        self.shedding = False
+        # (finished at, seconds) per LLM call
+        self._latencies: deque[tuple[float, float]] = deque(maxlen=1000)
+        self._queue_depth = 0
+        self._queue_depth_read_at = float("-inf")
+
+        # Monitoring counters
+        self.summaries_shed = 0
+        self.analyses_backfilled = 0
+
+    def _configure(self):
+        if None not in (self.max_queue_depth, self.max_llm_in_flight,
+                        self.max_llm_p95_seconds, self.recover_ratio):
+            return
+        # Imported lazily so the module can be used without app settings
+        from app.config import settings
+        if self.max_queue_depth is None:
+            self.max_queue_depth = settings.shed_queue_depth
+        if self.max_llm_in_flight is None:
+            self.max_llm_in_flight = settings.shed_llm_in_flight
+        if self.max_llm_p95_seconds is None:
+            self.max_llm_p95_seconds = settings.shed_llm_p95_seconds
+        if self.recover_ratio is None:
+            self.recover_ratio = settings.shed_recover_ratio
+
+    @contextlib.asynccontextmanager
+    async def track_llm_call(self):
+        """Count an LLM call as in flight and record its latency."""
+        self.llm_in_flight += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.llm_in_flight -= 1
+            now = time.monotonic()
+            self._latencies.append((now, now - start))
+
+    def llm_p95_seconds(self) -> float:
+        """p95 latency of the LLM calls finished within LATENCY_WINDOW_SECONDS (0 if none)."""
+        cutoff = time.monotonic() - LATENCY_WINDOW_SECONDS
+        recent = sorted(seconds for finished, seconds in self._latencies if finished >= cutoff)
+        if not recent:
+            return 0.0
+        return recent[min(len(recent) - 1, int(0.95 * len(recent)))]
+
+    async def queue_depth(self) -> int:
+        """Queued webhook jobs, refreshed at most every QUEUE_DEPTH_TTL_SECONDS."""
+        now = time.monotonic()
+        if now - self._queue_depth_read_at >= QUEUE_DEPTH_TTL_SECONDS:
+            try:
+                self._queue_depth = (await database.get_job_queue_stats())["queued"]
+            except Exception as e:
+                logger.error(f"Error reading webhook queue depth: {e}")
+            self._queue_depth_read_at = now
+        return self._queue_depth
+
+    async def is_overloaded(self) -> bool:
+        """Re-evaluate the load and return whether new analyses should be shed."""
+        self._configure()
+        signals = {
+            "LLM calls in flight": (self.llm_in_flight, self.max_llm_in_flight),
+            "LLM p95 seconds": (self.llm_p95_seconds(), self.max_llm_p95_seconds),
+        }
+        if self.max_queue_depth:
+            signals["queue depth"] = (await self.queue_depth(), self.max_queue_depth)
+        factor = self.recover_ratio if self.shedding else 1.0
+        high = [
+            f"{name} {value:g}/{limit:g}"
+            for name, (value, limit) in signals.items()
+            if limit and value >= limit * factor
+        ]
+
+        if high and not self.shedding:
+            logger.warning(f"Shedding AI analysis load ({', '.join(high)}); using heuristic summaries")
+        elif self.shedding and not high:
+            logger.info("Load is back to normal; AI analysis resumed")
+        self.shedding = bool(high)
+        return self.shedding
+
+    def stats(self) -> dict:
+        return {
+            "shedding": self.shedding,
+            "summaries_shed": self.summaries_shed,
+            "analyses_backfilled": self.analyses_backfilled,
+            "llm_in_flight": self.llm_in_flight,
+            "llm_p95_seconds": round(self.llm_p95_seconds(), 3),
+        }
+
+
+admission_controller = AdmissionController()
@@ -1,6 +1,7 @@
 import logging
 from anthropic import AsyncAnthropic
 from app.config import settings
+from app.services.admission_control import admission_controller
 
 logger = logging.getLogger(__name__)
 
@@ -55,12 +56,13 @@ class AIService:
                 diff_stats,
             )
 
-            response = await self.client.messages.create(
-                model=self.model,
-                max_tokens=1500,
-                temperature=0.3,
-                messages=[{"role": "user", "content": prompt}],
-            )
+            async with admission_controller.track_llm_call():
+                response = await self.client.messages.create(
+                    model=self.model,
+                    max_tokens=1500,
+                    temperature=0.3,
+                    messages=[{"role": "user", "content": prompt}],
+                )
 
             analysis = self._parse_ai_response(response.content[0].text)
             logger.info(f"AI analysis completed for PR: {pr_title}")
@@ -72,6 +74,51 @@ class AIService:
                 pr_title, pr_description, file_changes, diff_stats
             )
 
+    async def analyze_pr_update(
+        self,
+        pr_title: str,
+        previous_analysis: dict,
+        file_changes: list[dict],
+        commit_messages: list[str],
+        diff_stats: dict,
+    ) -> dict:
+        """
+        Analyzes only the commits pushed since a previous analysis.
+
+        The prompt carries the previous analysis instead of the whole PR, so it
+        stays small however large the PR has grown.
+
+        Returns:
+            Dictionary containing:
+            - update_summary: What the new commits change
+            - functional_summary: The PR's summary, revised for the new commits
+            - key_changes: Key changes made by the new commits
+            - risk_assessment: The PR's risks, revised for the new commits
+            - review_focus_areas: What reviewers should look at in the new commits
+        """
+        try:
+            prompt = self._build_update_prompt(
+                pr_title, previous_analysis, file_changes, commit_messages, diff_stats
+            )
+
+            async with admission_controller.track_llm_call():
+                response = await self.client.messages.create(
+                    model=self.model,
+                    max_tokens=800,
+                    temperature=0.3,
+                    messages=[{"role": "user", "content": prompt}],
+                )
+
+            analysis = self._parse_ai_response(response.content[0].text)
+            logger.info(f"AI update analysis completed for PR: {pr_title}")
+            return analysis
+
+        except Exception as e:
+            logger.error(f"Error in AI update analysis: {e}", exc_info=True)
+            return self._fallback_update_analysis(
+                previous_analysis, file_changes, commit_messages, diff_stats
+            )
+
     def _build_analysis_prompt(
         self,
         pr_title: str,
@@ -134,6 +181,64 @@ Keep your response concise and technical. Focus on semantic meaning, not just fi
 
         return prompt
 
+    def _build_update_prompt(
+        self,
+        pr_title: str,
+        previous_analysis: dict,
+        file_changes: list[dict],
+        commit_messages: list[str],
+        diff_stats: dict,
+    ) -> str:
+        """Builds a prompt for the commits pushed since the previous analysis."""
+
+        files_summary = "\n".join(
+            [
+                f"- {f['filename']}: +{f['additions']} -{f['deletions']} lines ({f['status']})"
+                for f in file_changes[:15]
+            ]
+        )
+        commits_summary = "\n".join([f"- {msg}" for msg in commit_messages[:10]])
+        previous_changes = "\n".join(
+            [f"- {change}" for change in previous_analysis.get("key_changes", [])]
+        )
+
+        prompt = f"""You are a senior software engineer keeping a Pull Request review summary up to date. New commits were pushed since the previous analysis; analyze only what they change.
+
+**Pull Request Title:** {pr_title}
+
+**Previous Analysis:**
+Summary: {previous_analysis.get("functional_summary") or "Not available"}
+Key changes:
+{previous_changes or "- Not available"}
+Risks: {previous_analysis.get("risk_assessment") or "Not available"}
+
+**New Commits:**
+{commits_summary or "No commit messages available"}
+
+**Files Changed by the New Commits:** {diff_stats.get('total_files', 0)} files, +{diff_stats.get('total_additions', 0)} -{diff_stats.get('total_deletions', 0)} lines
+{files_summary}
+
+Please provide your analysis in the following format:
+
+UPDATE_SUMMARY:
+[1-2 sentences explaining what the new commits change]
+
+FUNCTIONAL_SUMMARY:
+[The previous summary, revised only if the new commits change what the PR does]
+
+KEY_CHANGES:
+[1-3 bullet points of the most important changes in the new commits]
+
+RISK_ASSESSMENT:
+[The PR's risks in light of the new commits. If unchanged, repeat the previous assessment]
+
+REVIEW_FOCUS:
+[1-2 specific areas in the new commits reviewers should pay attention to]
+
+Keep your response concise and technical."""
+
+        return prompt
+
     def _parse_ai_response(self, response_text: str) -> dict:
         """Parses the AI response into structured data."""
         sections = {
@@ -151,7 +256,11 @@ Keep your response concise and technical. Focus on semantic meaning, not just fi
             for line in lines:
                 line = line.strip()
 
-                if line.startswith("FUNCTIONAL_SUMMARY:"):
+                if line.startswith("UPDATE_SUMMARY:"):
+                    current_section = "update_summary"
+                    sections.setdefault(current_section, "")
+                    continue
+                elif line.startswith("FUNCTIONAL_SUMMARY:"):
                     current_section = "functional_summary"
                     continue
                 elif line.startswith("SCOPE_OF_CHANGE:"):
@@ -200,6 +309,8 @@ Keep your response concise and technical. Focus on semantic meaning, not just fi
 
         top_types = sorted(file_types.items(), key=lambda x: x[1], reverse=True)[:3]
         types_str = ", ".join([f"{count} {ext}" for ext, count in top_types])
+        if not types_str:
+            types_str = str(diff_stats.get("total_files", 0))
 
         return {
             "functional_summary": pr_description[:200] if pr_description else f"Changes in {types_str} files",
@@ -209,5 +320,36 @@ Keep your response concise and technical. Focus on semantic meaning, not just fi
             "review_focus_areas": ["Review all changes carefully"],
         }
 
+    def heuristic_analysis(
+        self,
+        pr_title: str,
+        pr_description: str,
+        file_changes: list[dict],
+        diff_stats: dict,
+    ) -> dict:
+        """Instant analysis without the LLM, used while load is shed; the AI one replaces it later."""
+        return self._fallback_analysis(pr_title, pr_description, file_changes, diff_stats) | {
+            "risk_assessment": "Not assessed yet - AI analysis pending",
+        }
+
+    def _fallback_update_analysis(
+        self,
+        previous_analysis: dict,
+        file_changes: list[dict],
+        commit_messages: list[str],
+        diff_stats: dict,
+    ) -> dict:
+        """Fallback update analysis if AI fails: the previous analysis plus the new commits."""
+        return {
+            "update_summary": (
+                f"{len(commit_messages)} new commit(s) touching "
+                f"{diff_stats.get('total_files', len(file_changes))} files"
+            ),
+            "functional_summary": previous_analysis.get("functional_summary", ""),
+            "key_changes": commit_messages[:3],
+            "risk_assessment": previous_analysis.get("risk_assessment", ""),
+            "review_focus_areas": [f["filename"] for f in file_changes[:2]],
+        }
+
 
 ai_service = AIService()
\ No newline at end of file
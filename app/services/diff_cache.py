@@ -0,0 +1,238 @@
+"""
+On-disk cache of PR diffs per head commit, patches stored content-addressed
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+from app.db_codec import compress_text, decompress_text
+
+logger = logging.getLogger(__name__)
+
+# Only names that are safe as path components are cached
+REPOSITORY_NAME = re.compile(r"^[A-Za-z0-9_.-]+/[A-Za-z0-9_.-]+$")
+COMMIT_SHA = re.compile(r"^[0-9a-f]{40}$|^[0-9a-f]{64}$")
+
+
+class DiffCache:
+    """
+    The diff viewer's files for a (repository, head SHA), kept on disk.
+
+    A commit never changes, so an entry is valid for as long as it exists:
+    a push gives the PR a new head SHA and a new entry, and the old one ages
+    out. Layout under `path`:
+
+        heads/{owner}/{repo}/{head_sha}.json  the files, each with the
+                                              SHA-256 of its patch
+        patches/{sha256[:2]}/{sha256}         a patch, zlib-compressed
+
+    Patches are stored once however many heads share them (a push usually
+    leaves most of a PR's files as they were). The whole cache is kept under
+    max_bytes by dropping the least recently viewed heads, then the patches
+    no head uses any more.
+
+    Settings left as None are read from app settings on first use;
+    max_bytes 0 disables the cache.
+    """
+
+    def __init__(self, max_bytes: int | None = None, path: str | Path | None = None):
+        self.max_bytes = max_bytes
+        self.path = Path(path) if path is not None else None
+        self.size = 0
+        # Manifest path -> (bytes, patch digests), least recently used first
+        self._heads: OrderedDict[Path, tuple[int, list[str]]] | None = None
+        # Patch digest -> [bytes, heads using it]
+        self._patches: dict[str, list[int]] = {}
+        # File I/O runs in worker threads
+        self._lock = threading.Lock()
+
+        # Monitoring counters
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        self._resolve()
+        return self.max_bytes > 0
+
+    async def get(self, repo_full_name: str, head_sha: str) -> list[dict] | None:
+        """The cached files of the PR diff at `head_sha`, or None."""
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self._get, repo_full_name, head_sha)
+
+    async def put(self, repo_full_name: str, head_sha: str, files: list[dict]):
+        """Cache the files ({filename, ..., patch}) of the PR diff at `head_sha`."""
+        if self.enabled:
+            await asyncio.to_thread(self._put, repo_full_name, head_sha, files)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._heads or ()),
+            "patches": len(self._patches),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _resolve(self):
+        if self.max_bytes is None or self.path is None:
+            # Imported lazily so the module can be used without app settings
+            from app.config import settings
+            if self.max_bytes is None:
+                self.max_bytes = settings.diff_cache_max_bytes
+            if self.path is None:
+                self.path = Path(settings.diff_cache_path)
+
+    def _manifest_path(self, repo_full_name: str, head_sha: str) -> Path | None:
+        if not REPOSITORY_NAME.match(repo_full_name) or not COMMIT_SHA.match(head_sha):
+            return None
+        return self.path / "heads" / repo_full_name / f"{head_sha}.json"
+
+    def _patch_path(self, digest: str) -> Path:
+        return self.path / "patches" / digest[:2] / digest
+
+    def _get(self, repo_full_name: str, head_sha: str) -> list[dict] | None:
+        manifest_path = self._manifest_path(repo_full_name, head_sha)
+        with self._lock:
+            self._load()
+            if manifest_path not in self._heads:
+                self.misses += 1
+                return None
+            try:
+                files = json.loads(manifest_path.read_bytes())["files"]
+                for file in files:
+                    digest = file.pop("patch_sha256")
+                    file["patch"] = (
+                        decompress_text(self._patch_path(digest).read_bytes()) if digest else None
+                    )
+                # The file times keep the LRU order across restarts
+                os.utime(manifest_path)
+            except (OSError, ValueError, KeyError, zlib.error) as e:
+                logger.warning(f"Dropping unreadable diff cache entry {manifest_path}: {e}")
+                self._drop(manifest_path)
+                self.misses += 1
+                return None
+            self._heads.move_to_end(manifest_path)
+            self.hits += 1
+            return files
+
+    def _put(self, repo_full_name: str, head_sha: str, files: list[dict]):
+        manifest_path = self._manifest_path(repo_full_name, head_sha)
+        if manifest_path is None:
+            return
+        with self._lock:
+            self._load()
+            self._drop(manifest_path)
+            digests = []
+            entries = []
+            try:
+                for file in files:
+                    digest = None
+                    if file.get("patch"):
+                        digest = hashlib.sha256(file["patch"].encode("utf-8")).hexdigest()
+                        if digest not in self._patches:
+                            blob = compress_text(file["patch"])
+                            _write(self._patch_path(digest), blob)
+                            self._patches[digest] = [len(blob), 0]
+                            self.size += len(blob)
+                        digests.append(digest)
+                    entries.append(
+                        {key: value for key, value in file.items() if key != "patch"}
+                        | {"patch_sha256": digest}
+                    )
+                manifest = json.dumps({"files": entries}).encode("utf-8")
+                _write(manifest_path, manifest)
+            except OSError as e:
+                logger.warning(f"Could not cache the diff of {repo_full_name}@{head_sha[:7]}: {e}")
+                for digest in digests:
+                    self._release_patch(digest, 0)
+                return
+            for digest in digests:
+                self._patches[digest][1] += 1
+            self._heads[manifest_path] = (len(manifest), digests)
+            self.size += len(manifest)
+            self._evict()
+
+    def _load(self):
+        """Index the cache on disk on first use; patches no head uses are deleted."""
+        if self._heads is not None:
+            return
+        self._heads = OrderedDict()
+        manifests = sorted(self.path.glob("heads/*/*/*.json"), key=_modified_at)
+        for patch_path in self.path.glob("patches/*/*"):
+            try:
+                self._patches[patch_path.name] = [patch_path.stat().st_size, 0]
+                self.size += self._patches[patch_path.name][0]
+            except OSError:
+                pass
+        for manifest_path in manifests:
+            try:
+                body = manifest_path.read_bytes()
+                digests = [
+                    file["patch_sha256"] for file in json.loads(body)["files"]
+                    if file["patch_sha256"]
+                ]
+            except (OSError, ValueError, KeyError, TypeError):
+                manifest_path.unlink(missing_ok=True)
+                continue
+            if any(digest not in self._patches for digest in digests):
+                manifest_path.unlink(missing_ok=True)
+                continue
+            for digest in digests:
+                self._patches[digest][1] += 1
+            self._heads[manifest_path] = (len(body), digests)
+            self.size += len(body)
+        for digest in [digest for digest, (_, refs) in self._patches.items() if not refs]:
+            self._release_patch(digest, 0)
+        self._evict()
+        if self._heads:
+            logger.info(f"Loaded {len(self._heads)} cached PR diffs from {self.path}")
+
+    def _evict(self):
+        while self.size > self.max_bytes and self._heads:
+            self._drop(next(iter(self._heads)))
+
+    def _drop(self, manifest_path: Path):
+        entry = self._heads.pop(manifest_path, None)
+        if entry is None:
+            return
+        size, digests = entry
+        manifest_path.unlink(missing_ok=True)
+        self.size -= size
+        for digest in digests:
+            self._release_patch(digest, 1)
+
+    def _release_patch(self, digest: str, refs: int):
+        """Drop `refs` uses of a patch; delete it once no head uses it."""
+        patch = self._patches.get(digest)
+        if patch is None:
+            return
+        patch[1] -= refs
+        if patch[1] <= 0:
+            del self._patches[digest]
+            self.size -= patch[0]
+            self._patch_path(digest).unlink(missing_ok=True)
+
+
+def _write(path: Path, data: bytes):
+    """Write a file atomically: readers see the old content or the new, never part."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as file:
+        file.write(data)
+    os.replace(file.name, path)
+
+
+def _modified_at(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0.0
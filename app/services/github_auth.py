@@ -0,0 +1,192 @@
+"""
+Credentials for GitHub API calls: personal access tokens and GitHub App
+installation tokens, pooled so each call uses the best budget for its owner
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+import httpx
+import jwt
+
+from app.services.github_cache import fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Installation tokens live an hour; a new one is minted this long before expiry
+TOKEN_REFRESH_SECONDS = 300.0
+# How often the App's installations are listed again, to pick up new organizations
+INSTALLATIONS_TTL_SECONDS = 600.0
+
+
+class PersonalAccessToken:
+    """A PAT: one user's rate limit, for any owner it can access."""
+
+    def __init__(self, name: str, token: str):
+        self.name = name
+        self.owner: str | None = None
+        # Identifies the token in cache keys whatever position it is configured in
+        self.fingerprint = fingerprint(token)
+        self._token = token
+        self.requests = 0
+
+    async def token(self, http: httpx.AsyncClient) -> str:
+        return self._token
+
+
+class GitHubApp:
+    """A GitHub App: signs JWTs to list its installations and mint their tokens."""
+
+    def __init__(self, app_id: str, private_key: str):
+        self.app_id = app_id
+        self.private_key = private_key
+
+    def jwt(self) -> str:
+        now = int(time.time())
+        # Backdated for clock drift; GitHub accepts at most 10 minutes
+        return jwt.encode(
+            {"iat": now - 60, "exp": now + 540, "iss": self.app_id}, self.private_key, "RS256"
+        )
+
+    def _headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.jwt()}"}
+
+    async def installations(self, http: httpx.AsyncClient) -> dict[str, int]:
+        """Installation id by account login (lowercased)."""
+        installations = {}
+        url, params = "/app/installations", {"per_page": 100}
+        while url:
+            response = await http.get(url, params=params, headers=self._headers())
+            response.raise_for_status()
+            for installation in response.json():
+                installations[installation["account"]["login"].lower()] = installation["id"]
+            url, params = response.links.get("next", {}).get("url"), None
+        return installations
+
+    async def mint(self, http: httpx.AsyncClient, installation_id: int) -> tuple[str, float]:
+        """A new installation token and when it expires (epoch seconds)."""
+        response = await http.post(
+            f"/app/installations/{installation_id}/access_tokens", headers=self._headers()
+        )
+        response.raise_for_status()
+        body = response.json()
+        expires_at = datetime.fromisoformat(body["expires_at"].replace("Z", "+00:00"))
+        return body["token"], expires_at.timestamp()
+
+
+class InstallationToken:
+    """An App installation's token: its own rate limit, for one owner's repositories."""
+
+    def __init__(self, app: GitHubApp, owner: str, installation_id: int):
+        self.name = f"installation:{owner}"
+        self.owner = owner
+        # Stable while the tokens rotate: every one sees the same repositories
+        self.fingerprint = f"app-{app.app_id}-installation-{installation_id}"
+        self.app = app
+        self.installation_id = installation_id
+        self.requests = 0
+        self._token = ""
+        self.expires_at = 0.0
+        self._minting = asyncio.Lock()
+
+    async def token(self, http: httpx.AsyncClient) -> str:
+        """The current token, minted again shortly before it expires."""
+        if time.time() < self.expires_at - TOKEN_REFRESH_SECONDS:
+            return self._token
+        async with self._minting:
+            if time.time() >= self.expires_at - TOKEN_REFRESH_SECONDS:
+                self._token, self.expires_at = await self.app.mint(http, self.installation_id)
+                logger.info(f"Minted a GitHub App token for {self.owner}")
+        return self._token
+
+
+Credential = PersonalAccessToken | InstallationToken
+
+
+class CredentialPool:
+    """
+    Chooses the credential for each call.
+
+    A repository whose owner has the GitHub App installed is called with that
+    installation's token (each installation has its own rate limit). Other
+    calls go to the personal access token with the largest share of its
+    budget left (least used first on ties), or, with no PATs, to the
+    installation with the most left.
+    """
+
+    def __init__(self, tokens: list[str], app: GitHubApp | None = None):
+        self.tokens = [
+            PersonalAccessToken(f"token-{n}", token) for n, token in enumerate(tokens, 1)
+        ]
+        self.app = app
+        self.installations: dict[str, InstallationToken] = {}
+        self._installations_read_at = float("-inf")
+        self._listing = asyncio.Lock()
+        if not self.tokens and app is None:
+            raise ValueError("GitHub credentials need a token or a GitHub App")
+
+    @property
+    def credentials(self) -> list[Credential]:
+        return [*self.tokens, *self.installations.values()]
+
+    async def select(
+        self,
+        http: httpx.AsyncClient,
+        owner: str | None,
+        share_left: Callable[[Credential], float],
+    ) -> Credential:
+        """The credential for a call to `owner`'s repositories (None: not repository-scoped)."""
+        if self.app is not None:
+            await self._refresh_installations(http)
+        if owner is not None and owner.lower() in self.installations:
+            return self.installations[owner.lower()]
+        candidates = self.tokens or list(self.installations.values())
+        if not candidates:
+            raise LookupError(f"No GitHub credential for {owner or 'this call'}")
+        return max(candidates, key=lambda candidate: (share_left(candidate), -candidate.requests))
+
+    async def _refresh_installations(self, http: httpx.AsyncClient):
+        if time.monotonic() - self._installations_read_at < INSTALLATIONS_TTL_SECONDS:
+            return
+        async with self._listing:
+            if time.monotonic() - self._installations_read_at < INSTALLATIONS_TTL_SECONDS:
+                return
+            try:
+                installations = await self.app.installations(http)
+            except httpx.HTTPError as e:
+                # Keep the known installations (and PATs) working
+                logger.error(f"Error listing GitHub App installations: {e}")
+                installations = {
+                    owner: token.installation_id for owner, token in self.installations.items()
+                }
+            self._installations_read_at = time.monotonic()
+            for owner, installation_id in installations.items():
+                known = self.installations.get(owner)
+                if known is None or known.installation_id != installation_id:
+                    self.installations[owner] = InstallationToken(self.app, owner, installation_id)
+            for owner in set(self.installations) - set(installations):
+                del self.installations[owner]
+
+    def stats(self) -> dict:
+        """Requests made per credential."""
+        return {credential.name: credential.requests for credential in self.credentials}
+
+
+def default_credentials() -> CredentialPool:
+    """The pool configured in app settings: GITHUB_TOKEN, GITHUB_TOKENS and the GitHub App."""
+    # Imported lazily so the module can be used without app settings
+    from app.config import settings
+
+    tokens = [settings.github_token, *settings.github_tokens.split(",")]
+    app = None
+    if settings.github_app_id:
+        # A key pasted into an env var usually has its newlines escaped
+        private_key = settings.github_app_private_key.replace("\\n", "\n")
+        if not private_key:
+            private_key = Path(settings.github_app_private_key_path).read_text()
+        app = GitHubApp(settings.github_app_id, private_key)
+    tokens = [token.strip() for token in tokens if token.strip()]
+    return CredentialPool(list(dict.fromkeys(tokens)), app)
@@ -0,0 +1,194 @@
+"""
+HTTP cache for GitHub REST reads: ETag/Last-Modified revalidation
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Response headers kept with a cached body (Link carries pagination)
+CACHED_HEADERS = ("content-type", "link", "etag", "last-modified")
+# Request extension naming the credential a request is sent with
+CREDENTIAL_EXTENSION = "github_credential"
+
+
+@dataclass
+class CacheEntry:
+    headers: dict[str, str]
+    body: bytes
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+
+class GitHubCache:
+    """
+    LRU store of GET responses that carry an ETag or Last-Modified header,
+    bounded by total body size (oldest entries are evicted first).
+
+    It lives in memory and is saved to `path` on shutdown (load() reads it
+    back on start), so conditional requests survive restarts.
+    """
+
+    def __init__(self, max_bytes: int, path: str | Path | None = None):
+        self.max_bytes = max_bytes
+        self.path = Path(path) if path else None
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.size = 0
+
+        # Monitoring counters
+        self.hits = 0  # 304s answered from the cache
+        self.misses = 0  # GETs that downloaded the body
+        self.rate_limit_remaining: int | None = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(request: httpx.Request) -> str:
+        # Accept picks the representation (JSON, diff, ...); the credential
+        # what may be seen (another token may not have access to the
+        # repository). Keys hold a fingerprint, never the token itself.
+        credential = request.extensions.get(CREDENTIAL_EXTENSION)
+        if credential is None:
+            credential = fingerprint(request.headers.get("authorization", ""))
+        return f"{credential} {request.headers.get('accept', '')} {request.url}"
+
+    def get(self, key: str) -> CacheEntry | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: CacheEntry):
+        self.discard(key)
+        if entry.size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.size += entry.size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+
+    def discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of cacheable GETs answered with a 304."""
+        if not self.hits + self.misses:
+            return 0.0
+        return self.hits / (self.hits + self.misses)
+
+    def stats(self) -> dict:
+        return {
+            "cache_entries": len(self._entries),
+            "cache_bytes": self.size,
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_hit_rate": round(self.hit_rate, 4),
+            # A 304 does not count against the rate limit
+            "rate_limit_saved": self.hits,
+            "rate_limit_remaining": self.rate_limit_remaining,
+        }
+
+    def load(self):
+        """Read the entries saved by save(); a missing or corrupt file starts empty."""
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            saved = json.loads(self.path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable GitHub cache {self.path}: {e}")
+            return
+        for key, (headers, body) in saved.items():
+            self.put(key, CacheEntry(headers, body.encode()))
+        logger.info(f"Loaded {len(self._entries)} cached GitHub responses from {self.path}")
+
+    def save(self):
+        """Write the entries to `path` (atomically, oldest first so load() keeps LRU order)."""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        saved = {
+            key: (entry.headers, entry.body.decode(errors="replace"))
+            for key, entry in self._entries.items()
+        }
+        with tempfile.NamedTemporaryFile("w", dir=self.path.parent, delete=False) as file:
+            json.dump(saved, file)
+        os.replace(file.name, self.path)
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """
+    Sends GETs for cached URLs with If-None-Match / If-Modified-Since and
+    answers a 304 with the cached body as a 200, so callers never see it.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, cache: GitHubCache):
+        self.transport = transport
+        self.cache = cache
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "GET":
+            return await self.transport.handle_async_request(request)
+
+        key = self.cache.key(request)
+        entry = self.cache.get(key)
+        if entry is not None:
+            if "etag" in entry.headers:
+                request.headers["If-None-Match"] = entry.headers["etag"]
+            if "last-modified" in entry.headers:
+                request.headers["If-Modified-Since"] = entry.headers["last-modified"]
+
+        response = await self.transport.handle_async_request(request)
+        remaining = response.headers.get("x-ratelimit-remaining")
+        if remaining is not None and remaining.isdigit():
+            self.cache.rate_limit_remaining = int(remaining)
+
+        if response.status_code == 304 and entry is not None:
+            await response.aclose()
+            self.cache.hits += 1
+            # The budget headers are the 304's, so the scheduler keeps up with them
+            headers = entry.headers | {
+                name: value for name, value in response.headers.items()
+                if name.startswith("x-ratelimit-")
+            }
+            return httpx.Response(
+                200, headers=headers, content=entry.body, request=request,
+                extensions={"github_cache": "hit"},
+            )
+
+        if response.status_code == 200 and (
+            "etag" in response.headers or "last-modified" in response.headers
+        ):
+            self.cache.misses += 1
+            # Decoded body, so Content-Encoding is not kept
+            body = await response.aread()
+            self.cache.put(key, CacheEntry(
+                {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers},
+                body,
+            ))
+        elif entry is not None and response.status_code < 500:
+            # Gone, or changed without validators: don't revalidate against it again
+            self.cache.discard(key)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def fingerprint(secret: str) -> str:
+    """A short, one-way digest of a credential ("" for none)."""
+    return hashlib.sha256(secret.encode()).hexdigest()[:16] if secret else ""
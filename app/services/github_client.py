@@ -0,0 +1,257 @@
+"""
+Async GitHub REST API client over one shared, pooled httpx.AsyncClient
+"""
+import asyncio
+import logging
+import re
+from contextvars import ContextVar
+
+import httpx
+
+from app.services.github_auth import CredentialPool, default_credentials
+from app.services.github_cache import CREDENTIAL_EXTENSION, CachingTransport, GitHubCache
+from app.services.github_scheduler import GitHubScheduler, Lane
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+API_VERSION = "2022-11-28"
+# GitHub's maximum page size for list endpoints
+PAGE_SIZE = 100
+# The owner of a repository-scoped path (GitHub Enterprise prefixes /api/v3)
+REPOSITORY_PATH = re.compile(r"^(?:/api/v3)?/repos/([^/]+)/")
+
+
+class GitHubGraphQLError(Exception):
+    """A GraphQL query came back with errors (GitHub still answers 200)."""
+
+
+# While set, every request the current task sends adds one to the tally
+request_tally: ContextVar[list[int] | None] = ContextVar("github_request_tally", default=None)
+
+
+class GitHubClient:
+    """
+    Keep-alive connection pool to the GitHub API, created on first use and
+    shared by every request, so round trips never block the event loop and
+    reuse warm TLS connections. HTTP/2 is used when the h2 package is
+    installed.
+
+    GETs go through an ETag cache of cache_max_bytes (0 disables it), saved
+    to cache_path ("" keeps it in memory) on close: unchanged resources are
+    revalidated with a 304, which is not counted against the rate limit,
+    instead of downloaded again. Entries are kept per credential.
+
+    Each request is authenticated with the credential `credentials` picks
+    for the repository's owner (see github_auth): a GitHub App installation
+    token for owners that installed the App, otherwise the personal access
+    token with the most budget left. `token` alone is a pool of one.
+
+    Every request goes through a GitHubScheduler (rate limit budgets per
+    credential and priority lanes, see github_scheduler). A request refused
+    by a rate limit is retried once GitHub allows it (or on another
+    credential), up to max_retries times, if that is within
+    max_retry_wait_seconds; a call whose budget is spent for longer than
+    that raises GitHubRateLimitError rather than waiting.
+
+    Settings left as None are read from app settings when the pool is
+    created; `transport` replaces the network (e.g. httpx.MockTransport).
+    """
+
+    def __init__(
+        self,
+        token: str | None = None,
+        credentials: CredentialPool | None = None,
+        base_url: str | None = None,
+        timeout_seconds: float | None = None,
+        max_connections: int | None = None,
+        cache_max_bytes: int | None = None,
+        cache_path: str | None = None,
+        scheduler: GitHubScheduler | None = None,
+        max_retries: int = 2,
+        max_retry_wait_seconds: float | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.credentials = credentials or (CredentialPool([token]) if token else None)
+        self.base_url = base_url
+        self.timeout_seconds = timeout_seconds
+        self.max_connections = max_connections
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_path = cache_path
+        self.scheduler = scheduler
+        self.max_retries = max_retries
+        self.max_retry_wait_seconds = max_retry_wait_seconds
+        self.transport = transport
+        self.cache: GitHubCache | None = None
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            if None in (self.credentials, self.base_url, self.timeout_seconds, self.max_connections,
+                        self.cache_max_bytes, self.cache_path, self.scheduler,
+                        self.max_retry_wait_seconds):
+                # Imported lazily so the module can be used without app settings
+                from app.config import settings
+                if self.credentials is None:
+                    self.credentials = default_credentials()
+                if self.base_url is None:
+                    self.base_url = settings.github_api_url
+                if self.timeout_seconds is None:
+                    self.timeout_seconds = settings.github_timeout_seconds
+                if self.max_connections is None:
+                    self.max_connections = settings.github_max_connections
+                if self.cache_max_bytes is None:
+                    self.cache_max_bytes = settings.github_cache_max_bytes
+                if self.cache_path is None:
+                    self.cache_path = settings.github_cache_path
+                if self.scheduler is None:
+                    self.scheduler = GitHubScheduler(
+                        {
+                            Lane.INTERACTIVE: 0.0,
+                            Lane.WEBHOOK: settings.github_webhook_reserve,
+                            Lane.BACKGROUND: settings.github_background_reserve,
+                        },
+                        settings.github_burst_ratio,
+                        self.max_connections,
+                    )
+                if self.max_retry_wait_seconds is None:
+                    self.max_retry_wait_seconds = settings.github_max_retry_wait_seconds
+            if self.cache_max_bytes > 0 and self.cache is None:
+                # Kept across pool restarts; read from disk once
+                self.cache = GitHubCache(self.cache_max_bytes, self.cache_path)
+                self.cache.load()
+
+            # The pool settings belong to the transport once one is passed
+            transport = self.transport or httpx.AsyncHTTPTransport(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            if self.cache is not None:
+                transport = CachingTransport(transport, self.cache)
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                # Authorization is set per request, by credential
+                headers={
+                    "Accept": "application/vnd.github+json",
+                    "X-GitHub-Api-Version": API_VERSION,
+                    "User-Agent": "reviewflow",
+                },
+                timeout=httpx.Timeout(self.timeout_seconds, connect=min(self.timeout_seconds, 10.0)),
+                transport=transport,
+            )
+        return self._client
+
+    async def request(
+        self, method: str, path: str, owner: str | None = None, **kwargs
+    ) -> httpx.Response:
+        """
+        Send a request on behalf of `owner`'s repositories (by default the
+        owner in a /repos/{owner}/... path); raises httpx.HTTPStatusError for
+        a 4xx/5xx response.
+        """
+        client = self.client
+        resource = "graphql" if path.endswith("/graphql") else "core"
+        if owner is None and (match := REPOSITORY_PATH.match(httpx.URL(path).path)):
+            owner = match.group(1)
+        headers = dict(kwargs.pop("headers", None) or {})
+        for attempt in range(self.max_retries + 1):
+            credential = await self.credentials.select(
+                client, owner, lambda candidate: self.scheduler.share_left(resource, candidate.name)
+            )
+            headers["Authorization"] = f"Bearer {await credential.token(client)}"
+            credential.requests += 1
+            tally = request_tally.get()
+            if tally is not None:
+                tally[0] += 1
+            async with self.scheduler.slot(
+                resource, credential=credential.name, max_wait=self.max_retry_wait_seconds
+            ):
+                response = await client.request(
+                    method, path, headers=headers,
+                    extensions={CREDENTIAL_EXTENSION: credential.fingerprint}, **kwargs
+                )
+            wait = self.scheduler.observe(resource, response, credential.name)
+            if wait is None or wait > self.max_retry_wait_seconds or attempt == self.max_retries:
+                break
+            # The scheduler holds the retry until the pause is over, unless
+            # another credential is picked for it
+        response.raise_for_status()
+        return response
+
+    async def graphql(
+        self, query: str, variables: dict | None = None, owner: str | None = None
+    ) -> dict:
+        """
+        Run a GraphQL query about `owner`'s repositories and return its data.
+        NOT_FOUND errors only null their field (e.g. a missing PR); any other
+        error raises GitHubGraphQLError.
+        """
+        # Creating the pool resolves base_url; https://HOST/api/v3 (GitHub
+        # Enterprise) serves GraphQL at /api/graphql
+        url = str(self.client.base_url).rstrip("/")
+        url = url[:-len("v3")] + "graphql" if url.endswith("/api/v3") else url + "/graphql"
+        body = (await self.request(
+            "POST", url, owner, json={"query": query, "variables": variables or {}}
+        )).json()
+        errors = [error for error in body.get("errors") or [] if error.get("type") != "NOT_FOUND"]
+        if errors or body.get("data") is None:
+            raise GitHubGraphQLError(
+                "; ".join(error.get("message", "") for error in errors) or "No data returned"
+            )
+        return body["data"]
+
+    async def get(self, path: str, params: dict | None = None):
+        """GET a path and decode the JSON body."""
+        return (await self.request("GET", path, params=params)).json()
+
+    async def paginate(self, path: str, params: dict | None = None, limit: int | None = None) -> list:
+        """
+        GET every page of a list endpoint, following the Link rel="next"
+        header, at most `limit` items.
+        """
+        items = []
+        url, params = path, {"per_page": PAGE_SIZE, **(params or {})}
+        # Next links may address the repository by id (/repositories/ID/...)
+        match = REPOSITORY_PATH.match(httpx.URL(path).path)
+        owner = match.group(1) if match else None
+        while url:
+            response = await self.request("GET", url, owner, params=params)
+            items.extend(response.json())
+            if limit is not None and len(items) >= limit:
+                return items[:limit]
+            url = response.links.get("next", {}).get("url")
+            # The next link already carries the query string
+            params = None
+        return items
+
+    def stats(self) -> dict:
+        """
+        ETag cache counters (zeros while the cache is off), the scheduler's
+        and the requests made per credential.
+        """
+        stats = (self.cache or GitHubCache(0)).stats()
+        if self.scheduler is not None:
+            stats |= self.scheduler.stats()
+        if self.credentials is not None:
+            stats["credentials"] = self.credentials.stats()
+        return stats
+
+    async def close(self):
+        """Close the pool and save the cache for the next start."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self.cache is not None:
+            try:
+                await asyncio.to_thread(self.cache.save)
+            except OSError as e:
+                logger.warning(f"Could not save the GitHub cache: {e}")
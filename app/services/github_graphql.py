@@ -0,0 +1,213 @@
+"""
+PR snapshots over GitHub GraphQL: metadata, changed files and commit
+headlines for one PR or a batch of PRs in a single query
+"""
+import logging
+from typing import TypeVar
+
+from app.services.github_client import GitHubClient
+
+logger = logging.getLogger(__name__)
+
+# GraphQL's largest page for a connection
+MAX_PAGE = 100
+# PRs per query, keeping each well under GitHub's node limit
+BATCH_SIZE = 25
+
+CHANGE_TYPES = {
+    "ADDED": "added",
+    "DELETED": "removed",
+    "MODIFIED": "modified",
+    "RENAMED": "renamed",
+    "COPIED": "copied",
+    "CHANGED": "changed",
+}
+
+METADATA = (
+    "number title body state merged url additions deletions changedFiles "
+    "author { login avatarUrl } headRefName headRefOid baseRefName baseRefOid"
+)
+CONNECTIONS = {
+    "files": "nodes { path additions deletions changeType }",
+    "commits": "nodes { commit { messageHeadline } }",
+}
+# Where each connection's items go in a snapshot
+SNAPSHOT_KEYS = {"files": "files", "commits": "commit_messages"}
+
+# (repo_full_name, number)
+PullRequestRef = tuple[str, int]
+T = TypeVar("T")
+
+
+async def fetch_pull_requests(
+    client: GitHubClient,
+    refs: list[PullRequestRef],
+    files: int | None = MAX_PAGE,
+    commits: int | None = MAX_PAGE,
+) -> dict[PullRequestRef, dict]:
+    """
+    Snapshots of the PRs in `refs`, BATCH_SIZE PRs per query.
+
+    A snapshot has the REST pull request fields the app reads (number,
+    title, body, state, merged, html_url, additions, deletions,
+    changed_files, user, head, base) plus `repository`, up to `files`
+    changed files ({filename, status, additions, deletions, changes}, no
+    patch) and up to `commits` commit headlines (None = all, 0 = none).
+    Pages past the first are fetched by cursor, one query per round for
+    every PR that still has some. PRs that don't exist are left out.
+
+    Each query covers a single owner's repositories, so it is sent with that
+    owner's credential (e.g. its GitHub App installation).
+    """
+    wanted = {"files": files, "commits": commits}
+    snapshots: dict[PullRequestRef, dict] = {}
+    # ref -> {connection: cursor} still to fetch
+    pending: dict[PullRequestRef, dict[str, str | None]] = {}
+
+    for owner, owner_refs in _by_owner(dict.fromkeys(refs)).items():
+        owner_refs = list(owner_refs)
+        for start in range(0, len(owner_refs), BATCH_SIZE):
+            selections = {
+                ref: {name: None for name, limit in wanted.items() if limit != 0}
+                for ref in owner_refs[start:start + BATCH_SIZE]
+            }
+            results = await _query(client, owner, selections, wanted, True)
+            for ref, (repository, node) in results.items():
+                if node is None:
+                    continue
+                snapshots[ref] = _snapshot(repository, node)
+                _collect(snapshots[ref], node, wanted, ref, pending)
+
+    while pending:
+        selections, pending = pending, {}
+        for owner, owner_selections in _by_owner(selections).items():
+            results = await _query(client, owner, owner_selections, wanted, False)
+            for ref, (_, node) in results.items():
+                _collect(snapshots[ref], node or {}, wanted, ref, pending)
+
+    return snapshots
+
+
+def _by_owner(items: dict[PullRequestRef, T]) -> dict[str, dict[PullRequestRef, T]]:
+    """`items` split by repository owner (case-insensitive, as GitHub logins are)."""
+    owners: dict[str, dict[PullRequestRef, T]] = {}
+    for ref, item in items.items():
+        owners.setdefault(ref[0].partition("/")[0].lower(), {})[ref] = item
+    return owners
+
+
+async def _query(
+    client: GitHubClient,
+    owner: str,
+    selections: dict[PullRequestRef, dict[str, str | None]],
+    wanted: dict[str, int | None],
+    metadata: bool,
+) -> dict[PullRequestRef, tuple[dict, dict | None]]:
+    """One query for `selections` (ref -> {connection: after cursor}); returns ref -> (repository, PR node)."""
+    variables: dict[str, str] = {}
+    repositories: dict[str, list[tuple[int, dict]]] = {}
+    for (full_name, number), connections in selections.items():
+        repositories.setdefault(full_name, []).append((number, connections))
+
+    fields = []
+    aliases = {}
+    for r, (full_name, pull_requests) in enumerate(repositories.items()):
+        variables[f"o{r}"], _, variables[f"n{r}"] = full_name.partition("/")
+        pull_request_fields = []
+        for p, (number, connections) in enumerate(pull_requests):
+            aliases[(full_name, number)] = (f"r{r}", f"p{r}_{p}")
+            selection = [METADATA] if metadata else []
+            for name, cursor in connections.items():
+                limit = wanted[name]
+                arguments = f"first: {MAX_PAGE if limit is None else min(limit, MAX_PAGE)}"
+                if cursor is not None:
+                    variables[f"c{r}_{p}_{name}"] = cursor
+                    arguments += f", after: $c{r}_{p}_{name}"
+                selection.append(
+                    f"{name}({arguments}) {{ totalCount pageInfo {{ hasNextPage endCursor }} "
+                    f"{CONNECTIONS[name]} }}"
+                )
+            pull_request_fields.append(
+                f"p{r}_{p}: pullRequest(number: {int(number)}) {{ {' '.join(selection)} }}"
+            )
+        fields.append(
+            f"r{r}: repository(owner: $o{r}, name: $n{r}) "
+            f"{{ name nameWithOwner url {' '.join(pull_request_fields)} }}"
+        )
+
+    declarations = ", ".join(f"${name}: String!" for name in variables)
+    data = await client.graphql(
+        f"query({declarations}) {{ {' '.join(fields)} rateLimit {{ cost remaining }} }}",
+        variables,
+        owner,
+    )
+    if data.get("rateLimit"):
+        logger.debug(
+            f"GraphQL query for {len(selections)} PR(s) cost {data['rateLimit']['cost']} point(s), "
+            f"{data['rateLimit']['remaining']} left"
+        )
+    results = {}
+    for ref, (repository_alias, pull_request_alias) in aliases.items():
+        repository = data.get(repository_alias) or {}
+        results[ref] = (repository, repository.get(pull_request_alias))
+    return results
+
+
+def _snapshot(repository: dict, node: dict) -> dict:
+    author = node.get("author") or {"login": "ghost", "avatarUrl": None}
+    return {
+        "number": node["number"],
+        "title": node["title"],
+        "body": node["body"],
+        "state": "open" if node["state"] == "OPEN" else "closed",
+        "merged": node["merged"],
+        "html_url": node["url"],
+        "additions": node["additions"],
+        "deletions": node["deletions"],
+        "changed_files": node["changedFiles"],
+        "user": {"login": author["login"], "avatar_url": author.get("avatarUrl")},
+        "head": {"ref": node["headRefName"], "sha": node["headRefOid"]},
+        "base": {"ref": node["baseRefName"], "sha": node["baseRefOid"]},
+        "repository": {
+            "name": repository["name"],
+            "full_name": repository["nameWithOwner"],
+            "html_url": repository["url"],
+        },
+        "files": [],
+        "commit_messages": [],
+    }
+
+
+def _collect(
+    snapshot: dict,
+    node: dict,
+    wanted: dict[str, int | None],
+    ref: PullRequestRef,
+    pending: dict[PullRequestRef, dict[str, str | None]],
+):
+    """Add a page of files/commits to the snapshot; note the cursor if more are wanted."""
+    if node.get("files"):
+        snapshot["files"].extend(
+            {
+                "filename": file["path"],
+                "status": CHANGE_TYPES.get(file["changeType"], file["changeType"].lower()),
+                "additions": file["additions"],
+                "deletions": file["deletions"],
+                "changes": file["additions"] + file["deletions"],
+            }
+            for file in node["files"]["nodes"]
+        )
+    if node.get("commits"):
+        snapshot["commit_messages"].extend(
+            commit["commit"]["messageHeadline"].strip()
+            for commit in node["commits"]["nodes"]
+            if commit["commit"]["messageHeadline"].strip()
+        )
+
+    for name, key in SNAPSHOT_KEYS.items():
+        connection = node.get(name)
+        limit = wanted[name]
+        if limit is not None and len(snapshot[key]) >= limit:
+            del snapshot[key][limit:]
+        elif connection and connection["pageInfo"]["hasNextPage"]:
+            pending.setdefault(ref, {})[name] = connection["pageInfo"]["endCursor"]
@@ -0,0 +1,283 @@
+"""
+Rate-limit-aware scheduling of GitHub API calls across priority lanes
+"""
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import IntEnum
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Longest a throttled call sleeps before checking the budget again
+RECHECK_SECONDS = 1.0
+
+
+class GitHubRateLimitError(httpx.HTTPError):
+    """A call would wait longer than allowed for the rate limit; retry after `retry_after` s."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Lane(IntEnum):
+    """Who a GitHub call is for; lower values go first."""
+    INTERACTIVE = 0  # A user waiting on the dashboard or in Slack
+    WEBHOOK = 1  # Webhook processing
+    BACKGROUND = 2  # Backfills, syncs and scripts
+
+
+# The lane of the calls made in the current context (see github_lane)
+current_lane: ContextVar[Lane] = ContextVar("github_lane", default=Lane.BACKGROUND)
+
+
+@contextlib.contextmanager
+def github_lane(lane: Lane):
+    """Make the GitHub calls inside the block (and tasks it starts) in `lane`."""
+    token = current_lane.set(lane)
+    try:
+        yield
+    finally:
+        current_lane.reset(token)
+
+
+async def interactive_github_lane():
+    """Router dependency: the request's GitHub calls are interactive."""
+    current_lane.set(Lane.INTERACTIVE)
+
+
+@dataclass
+class Budget:
+    """A rate limit window as GitHub last reported it."""
+    limit: int
+    remaining: int
+    reset_at: float  # Epoch seconds
+
+
+@dataclass
+class Bucket:
+    tokens: float
+    updated_at: float
+
+
+class GitHubScheduler:
+    """
+    Every GitHub call waits here for its turn.
+
+    Budgets are tracked per credential and rate limit resource ("core" REST,
+    "graphql") from the X-RateLimit-* headers of each response. A lane may only spend what
+    is left above its reserve (a share of the limit: reserves[lane]), so a
+    background sync stops well before a user's "Approve" would fail.
+
+    Non-interactive lanes draw from token buckets that refill at the pace
+    that spreads their spendable budget over the time left to the reset,
+    holding at most burst_ratio of it: bursts are free while the budget is
+    healthy, and calls slow down as it drains and speed up as the reset
+    approaches.
+
+    A secondary rate limit (403/429 with Retry-After) or an exhausted budget
+    pauses every lane on that credential until GitHub allows calls again. At most
+    `max_in_flight` calls run at once; waiting calls are admitted by lane.
+    A call that would wait longer than its slot's max_wait raises
+    GitHubRateLimitError instead.
+    """
+
+    def __init__(
+        self,
+        reserves: dict[Lane, float],
+        burst_ratio: float = 0.1,
+        max_in_flight: int = 20,
+    ):
+        self.reserves = reserves
+        self.burst_ratio = burst_ratio
+        self.max_in_flight = max_in_flight
+        self.budgets: dict[str, Budget] = {}
+        # Credential name -> epoch seconds
+        self.paused_until: dict[str, float] = {}
+        self._buckets: dict[tuple[Lane, str], Bucket] = {}
+        self._in_flight = 0
+        self._waiters: list[tuple[Lane, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+        # Monitoring counters
+        self.throttled = {lane: 0 for lane in Lane}
+        self.rate_limited = 0
+
+    @staticmethod
+    def key(resource: str, credential: str = "") -> str:
+        """The budget a call spends: `resource` of `credential` ("" for a single token)."""
+        return f"{credential}:{resource}" if credential else resource
+
+    @contextlib.asynccontextmanager
+    async def slot(
+        self,
+        resource: str,
+        lane: Lane | None = None,
+        credential: str = "",
+        max_wait: float | None = None,
+    ):
+        """
+        Wait for the budget and a free slot, then run the call in the block;
+        raises GitHubRateLimitError if the budget is further than `max_wait`
+        seconds away (None: wait however long it takes).
+        """
+        lane = current_lane.get() if lane is None else lane
+        await self._wait_for_budget(lane, resource, credential, max_wait)
+        await self._acquire(lane)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def observe(
+        self, resource: str, response: httpx.Response, credential: str = ""
+    ) -> float | None:
+        """
+        Record the rate limit headers of a response. For a rate-limited
+        response, pauses every lane on the credential and returns the
+        seconds until GitHub accepts calls again (None otherwise).
+        """
+        headers = response.headers
+        now = time.time()
+        if "x-ratelimit-remaining" in headers:
+            try:
+                self.budgets[self.key(resource, credential)] = Budget(
+                    limit=int(headers.get("x-ratelimit-limit", 0)),
+                    remaining=int(headers["x-ratelimit-remaining"]),
+                    reset_at=float(headers.get("x-ratelimit-reset", now)),
+                )
+            except ValueError:
+                pass
+
+        if response.status_code not in (403, 429):
+            return None
+        if "retry-after" in headers:
+            try:
+                wait = float(headers["retry-after"])
+            except ValueError:
+                wait = 60.0
+        elif headers.get("x-ratelimit-remaining") == "0":
+            wait = float(headers.get("x-ratelimit-reset", now)) - now
+        else:
+            # A plain permission error
+            return None
+
+        wait = max(wait, 0.0)
+        self.paused_until[credential] = max(self.paused_until.get(credential, 0.0), now + wait)
+        self.rate_limited += 1
+        logger.warning(
+            f"GitHub rate limited ({response.status_code}) {credential or 'token'}; "
+            f"pausing its calls for {wait:.0f}s"
+        )
+        return wait
+
+    def share_left(self, resource: str, credential: str = "") -> float:
+        """Share of the budget left (1.0 when unknown or reset); 0 while paused."""
+        now = time.time()
+        if self.paused_until.get(credential, 0.0) > now:
+            return 0.0
+        budget = self.budgets.get(self.key(resource, credential))
+        if budget is None or budget.reset_at <= now or budget.limit <= 0:
+            return 1.0
+        return budget.remaining / budget.limit
+
+    def stats(self) -> dict:
+        now = time.time()
+        # The longest pause of any credential
+        paused_until = max(self.paused_until.values(), default=0.0)
+        return {
+            "rate_limits": {
+                resource: {
+                    "limit": budget.limit,
+                    "remaining": budget.remaining,
+                    "reset_in_seconds": round(max(0.0, budget.reset_at - now), 1),
+                }
+                for resource, budget in self.budgets.items()
+            },
+            "paused_seconds": round(max(0.0, paused_until - now), 1),
+            "rate_limited": self.rate_limited,
+            "throttled": {lane.name.lower(): count for lane, count in self.throttled.items()},
+            "waiting": len(self._waiters),
+        }
+
+    async def _wait_for_budget(
+        self, lane: Lane, resource: str, credential: str, max_wait: float | None
+    ):
+        throttled = False
+        while (delay := self._admit(lane, resource, credential)) > 0:
+            if max_wait is not None and delay > max_wait:
+                raise GitHubRateLimitError(
+                    f"GitHub {resource} budget of {credential or 'token'} is spent for"
+                    f" {lane.name.lower()} calls; available again in {delay:.0f}s",
+                    delay,
+                )
+            if not throttled:
+                throttled = True
+                self.throttled[lane] += 1
+            await asyncio.sleep(min(delay, RECHECK_SECONDS))
+
+    def _admit(self, lane: Lane, resource: str, credential: str) -> float:
+        """Spend one call of the budget; otherwise return how long to wait."""
+        now = time.time()
+        paused_until = self.paused_until.get(credential, 0.0)
+        if paused_until > now:
+            return paused_until - now
+
+        key = self.key(resource, credential)
+        budget = self.budgets.get(key)
+        if budget is None or budget.reset_at <= now:
+            # Unknown, or the window has rolled over since the last response
+            return 0.0
+
+        spendable = budget.remaining - budget.limit * self.reserves.get(lane, 0.0)
+        if spendable < 1:
+            return budget.reset_at - now
+
+        if lane != Lane.INTERACTIVE:
+            capacity = max(1.0, spendable * self.burst_ratio)
+            rate = spendable / (budget.reset_at - now)
+            bucket = self._buckets.get((lane, key))
+            if bucket is None:
+                bucket = self._buckets[(lane, key)] = Bucket(capacity, now)
+            bucket.tokens = min(capacity, bucket.tokens + (now - bucket.updated_at) * rate)
+            bucket.updated_at = now
+            if bucket.tokens < 1:
+                return (1 - bucket.tokens) / rate
+            bucket.tokens -= 1
+
+        # Until the response reports the real count
+        budget.remaining -= 1
+        return 0.0
+
+    async def _acquire(self, lane: Lane):
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (lane, next(self._sequence), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over as we were cancelled
+                self._release()
+            else:
+                self._waiters = [entry for entry in self._waiters if entry[2] is not waiter]
+                heapq.heapify(self._waiters)
+            raise
+
+    def _release(self):
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                # The slot passes to the waiter; in-flight count is unchanged
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
@@ -1,86 +1,290 @@
+import asyncio
 import logging
-from github import Github, Auth
-from github.PullRequest import PullRequest
-from github.Repository import Repository
+from typing import Any, Awaitable, Callable
 
-from app.config import settings
+import httpx
+
+from app.services.diff_cache import DiffCache
+from app.services.github_client import PAGE_SIZE, GitHubClient, GitHubGraphQLError, request_tally
+from app.services.github_graphql import fetch_pull_requests
+from app.services.github_scheduler import GitHubRateLimitError
 
 logger = logging.getLogger(__name__)
 
 
+def file_stats(file: dict) -> dict:
+    return {
+        "filename": file["filename"],
+        "status": file["status"],
+        "additions": file["additions"],
+        "deletions": file["deletions"],
+        "changes": file["changes"],
+    }
+
+
+def summarize_files(files: list[dict], total_additions: int, total_deletions: int) -> dict:
+    """The diff summary of a PR's changed files."""
+    file_types = {}
+    for file in files:
+        ext = file["filename"].split(".")[-1] if "." in file["filename"] else "other"
+        if ext not in file_types:
+            file_types[ext] = {"count": 0, "additions": 0, "deletions": 0}
+        file_types[ext]["count"] += 1
+        file_types[ext]["additions"] += file["additions"]
+        file_types[ext]["deletions"] += file["deletions"]
+
+    return {
+        "total_files": len(files),
+        "total_additions": total_additions,
+        "total_deletions": total_deletions,
+        "file_types": file_types,
+        "files": files[:10],
+    }
+
+
+class PullRequestFetch:
+    """
+    The GitHub data of one PR for one pipeline run (a single-flight memo).
+
+    The repository, pull request, files and commits are each fetched at most
+    once, on first use; concurrent callers share the request in flight, and
+    a failed fetch fails every caller. `snapshot` (metadata, files and
+    commit headlines from one GraphQL query) may be passed in when it was
+    fetched in a batch. `requests` counts the API requests made (pages
+    included).
+    """
+
+    def __init__(
+        self,
+        client: GitHubClient,
+        repo_full_name: str,
+        pr_number: int,
+        snapshot: dict | None = None,
+    ):
+        self.client = client
+        self.repo_full_name = repo_full_name
+        self.pr_number = pr_number
+        self._snapshot = snapshot
+        self._tally = [0]
+        self._fetches: dict[str, asyncio.Future] = {}
+
+    @property
+    def requests(self) -> int:
+        return self._tally[0]
+
+    def _once(self, name: str, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        if name not in self._fetches:
+            self._fetches[name] = asyncio.ensure_future(self._counted(fetch))
+        return self._fetches[name]
+
+    async def _counted(self, fetch: Callable[[], Awaitable[Any]]):
+        # Runs in its own task, so the tally only sees this fetch's requests
+        request_tally.set(self._tally)
+        return await fetch()
+
+    async def repository(self) -> dict:
+        return await self._once(
+            "repository", lambda: self.client.get(f"/repos/{self.repo_full_name}")
+        )
+
+    async def pull_request(self) -> dict:
+        return await self._once(
+            "pull_request",
+            lambda: self.client.get(f"/repos/{self.repo_full_name}/pulls/{self.pr_number}"),
+        )
+
+    async def files(self) -> list[dict]:
+        """Changed files as the API returns them, patches included."""
+        return await self._once(
+            "files",
+            lambda: self.client.paginate(
+                f"/repos/{self.repo_full_name}/pulls/{self.pr_number}/files"
+            ),
+        )
+
+    async def commits(self) -> list[dict]:
+        return await self._once(
+            "commits",
+            lambda: self.client.paginate(
+                f"/repos/{self.repo_full_name}/pulls/{self.pr_number}/commits"
+            ),
+        )
+
+    async def snapshot(self) -> dict:
+        """Metadata, every changed file (no patches) and commit headline, over GraphQL."""
+        if self._snapshot is None:
+            self._snapshot = await self._once("snapshot", self._fetch_snapshot)
+        return self._snapshot
+
+    async def _fetch_snapshot(self) -> dict:
+        ref = (self.repo_full_name, self.pr_number)
+        snapshots = await fetch_pull_requests(self.client, [ref], files=None, commits=None)
+        if ref not in snapshots:
+            raise GitHubGraphQLError(f"PR #{self.pr_number} not found in {self.repo_full_name}")
+        return snapshots[ref]
+
+
 class GitHubService:
-    def __init__(self):
-        auth = Auth.Token(settings.github_token)
-        self.client = Github(auth=auth)
+    """
+    The PR read methods take an optional PullRequestFetch, so stages of one
+    pipeline run share its fetches; without one each call fetches afresh.
 
-    def get_repository(self, repo_full_name: str) -> Repository:
-        return self.client.get_repo(repo_full_name)
+    The diff summary and commit messages come from one GraphQL snapshot,
+    falling back to the REST endpoints if GraphQL fails.
 
-    def get_pull_request(self, repo_full_name: str, pr_number: int) -> PullRequest:
-        repo = self.get_repository(repo_full_name)
-        return repo.get_pull(pr_number)
+    get_pr_diff keeps the files it fetches in `diff_cache` (None: not
+    cached), per head commit.
+    """
 
-    def get_pr_files(self, repo_full_name: str, pr_number: int) -> list[dict]:
-        pr = self.get_pull_request(repo_full_name, pr_number)
-        files = []
-        for file in pr.get_files():
-            files.append(
-                {
-                    "filename": file.filename,
-                    "status": file.status,
-                    "additions": file.additions,
-                    "deletions": file.deletions,
-                    "changes": file.changes,
-                }
-            )
-        return files
+    def __init__(self, client: GitHubClient | None = None, diff_cache: DiffCache | None = None):
+        self.client = client or GitHubClient()
+        self.diff_cache = diff_cache
+
+    def fetch_context(
+        self, repo_full_name: str, pr_number: int, snapshot: dict | None = None
+    ) -> PullRequestFetch:
+        return PullRequestFetch(self.client, repo_full_name, pr_number, snapshot)
 
-    def get_pr_diff_summary(self, repo_full_name: str, pr_number: int) -> dict:
-        pr = self.get_pull_request(repo_full_name, pr_number)
-        files = self.get_pr_files(repo_full_name, pr_number)
+    async def get_pr_snapshots(
+        self,
+        repo_full_name: str,
+        pr_numbers: list[int],
+        files: int | None = 100,
+        commits: int | None = 100,
+    ) -> dict[int, dict]:
+        """
+        GraphQL snapshots of several PRs of a repository, batched into as few
+        queries as possible, by PR number (missing PRs are left out). See
+        github_graphql.fetch_pull_requests for the fields.
+        """
+        snapshots = await fetch_pull_requests(
+            self.client, [(repo_full_name, number) for number in pr_numbers], files, commits
+        )
+        return {number: snapshot for (_, number), snapshot in snapshots.items()}
 
-        file_types = {}
-        for file in files:
-            ext = file["filename"].split(".")[-1] if "." in file["filename"] else "other"
-            if ext not in file_types:
-                file_types[ext] = {"count": 0, "additions": 0, "deletions": 0}
-            file_types[ext]["count"] += 1
-            file_types[ext]["additions"] += file["additions"]
-            file_types[ext]["deletions"] += file["deletions"]
+    async def _snapshot(self, fetch: PullRequestFetch) -> dict | None:
+        """The PR's GraphQL snapshot, or None if GraphQL is unavailable."""
+        try:
+            return await fetch.snapshot()
+        except GitHubRateLimitError:
+            # REST would wait for the same credentials
+            raise
+        except (GitHubGraphQLError, httpx.HTTPError) as e:
+            logger.warning(f"GraphQL fetch of PR #{fetch.pr_number} failed; using REST: {e}")
+            return None
 
-        return {
-            "total_files": len(files),
-            "total_additions": pr.additions,
-            "total_deletions": pr.deletions,
-            "file_types": file_types,
-            "files": files[:10],
-        }
+    async def get_repository(self, repo_full_name: str) -> dict:
+        return await self.client.get(f"/repos/{repo_full_name}")
+
+    async def list_pull_requests(
+        self,
+        repo_full_name: str,
+        state: str = "open",
+        sort: str = "created",
+        direction: str = "desc",
+        limit: int | None = None,
+    ) -> list[dict]:
+        """PRs of a repository (list items lack additions/deletions/changed_files)."""
+        return await self.client.paginate(
+            f"/repos/{repo_full_name}/pulls",
+            {"state": state, "sort": sort, "direction": direction,
+             "per_page": min(limit or PAGE_SIZE, PAGE_SIZE)},
+            limit,
+        )
 
-    def get_pr_commits(self, repo_full_name: str, pr_number: int) -> list[str]:
+    async def get_pull_request(
+        self, repo_full_name: str, pr_number: int, fetch: PullRequestFetch | None = None
+    ) -> dict:
+        fetch = fetch or self.fetch_context(repo_full_name, pr_number)
+        return await fetch.pull_request()
+
+    async def get_pr_files(
+        self, repo_full_name: str, pr_number: int, fetch: PullRequestFetch | None = None
+    ) -> list[dict]:
+        fetch = fetch or self.fetch_context(repo_full_name, pr_number)
+        return [file_stats(file) for file in await fetch.files()]
+
+    async def get_pr_diff_summary(
+        self, repo_full_name: str, pr_number: int, fetch: PullRequestFetch | None = None
+    ) -> dict:
+        fetch = fetch or self.fetch_context(repo_full_name, pr_number)
+        snapshot = await self._snapshot(fetch)
+        if snapshot is not None:
+            return summarize_files(snapshot["files"], snapshot["additions"], snapshot["deletions"])
+
+        pr, files = await asyncio.gather(
+            fetch.pull_request(),
+            self.get_pr_files(repo_full_name, pr_number, fetch),
+        )
+        return summarize_files(files, pr["additions"], pr["deletions"])
+
+    async def get_pr_commits(
+        self, repo_full_name: str, pr_number: int, fetch: PullRequestFetch | None = None
+    ) -> list[str]:
         """Fetches commit messages from the PR for contextual analysis."""
+        fetch = fetch or self.fetch_context(repo_full_name, pr_number)
+        snapshot = await self._snapshot(fetch)
+        if snapshot is not None:
+            return snapshot["commit_messages"]
+
         try:
-            pr = self.get_pull_request(repo_full_name, pr_number)
-            commits = pr.get_commits()
+            commits = await fetch.commits()
             commit_messages = []
 
             for commit in commits:
-                if commit.commit.message:
+                if commit["commit"]["message"]:
                     # Get first line of commit message (summary)
-                    message = commit.commit.message.split("\n")[0].strip()
+                    message = commit["commit"]["message"].split("\n")[0].strip()
                     if message:
                         commit_messages.append(message)
 
             logger.info(f"Retrieved {len(commit_messages)} commit messages for PR #{pr_number}")
             return commit_messages
+        except GitHubRateLimitError:
+            raise
         except Exception as e:
             logger.error(f"Error fetching commits for PR #{pr_number}: {e}")
             return []
 
+    async def compare_commits(self, repo_full_name: str, base_sha: str, head_sha: str) -> dict:
+        """
+        What changed between two commits: one compare API call instead of
+        re-reading the whole PR.
+
+        `status` is "ahead" when head simply extends base; "diverged" or
+        "behind" mean history was rewritten (e.g. a force push).
+        """
+        comparison = await self.client.get(
+            f"/repos/{repo_full_name}/compare/{base_sha}...{head_sha}"
+        )
+        commit_messages = [
+            commit["commit"]["message"].split("\n")[0].strip()
+            for commit in comparison.get("commits", [])
+            if commit["commit"]["message"]
+        ]
+        files = [file_stats(file) for file in comparison.get("files", [])]
+
+        logger.info(
+            f"Compared {base_sha[:7]}...{head_sha[:7]} in {repo_full_name}: "
+            f"{len(commit_messages)} commits, {len(files)} files"
+        )
+        return {
+            "status": comparison["status"],
+            "commit_messages": commit_messages,
+            "files": files,
+            "total_files": len(files),
+            "total_additions": sum(file["additions"] for file in files),
+            "total_deletions": sum(file["deletions"] for file in files),
+        }
+
     async def add_review_comment(
         self, repo_full_name: str, pr_number: int, comment: str, event: str = "COMMENT"
     ):
-        pr = self.get_pull_request(repo_full_name, pr_number)
-        pr.create_review(body=comment, event=event)
+        await self.client.request(
+            "POST",
+            f"/repos/{repo_full_name}/pulls/{pr_number}/reviews",
+            json={"body": comment, "event": event},
+        )
         logger.info(f"Added {event} review to PR #{pr_number} in {repo_full_name}")
 
     async def approve_pr(self, repo_full_name: str, pr_number: int, comment: str = ""):
@@ -95,29 +299,64 @@ class GitHubService:
 
     async def close_pr(self, repo_full_name: str, pr_number: int):
         """Close a pull request on GitHub."""
-        pr = self.get_pull_request(repo_full_name, pr_number)
-        pr.edit(state="closed")
+        await self.client.request(
+            "PATCH", f"/repos/{repo_full_name}/pulls/{pr_number}", json={"state": "closed"}
+        )
         logger.info(f"Closed PR #{pr_number} in {repo_full_name}")
 
-    def get_pr_diff(self, repo_full_name: str, pr_number: int) -> list[dict]:
-        """Get detailed file diffs for a pull request."""
-        pr = self.get_pull_request(repo_full_name, pr_number)
+    async def get_pr_diff(
+        self,
+        repo_full_name: str,
+        pr_number: int,
+        fetch: PullRequestFetch | None = None,
+        head_sha: str | None = None,
+    ) -> list[dict]:
+        """
+        Get detailed file diffs for a pull request.
+
+        With the diff cache on, the diff of `head_sha` (by default the PR's
+        current head) is served from the cache when it is there; otherwise
+        it is fetched and cached under the head the PR has now.
+        """
+        fetch = fetch or self.fetch_context(repo_full_name, pr_number)
+        cached = self.diff_cache is not None and self.diff_cache.enabled
+        if cached:
+            if head_sha is None:
+                head_sha = (await fetch.pull_request())["head"]["sha"]
+            files = await self.diff_cache.get(repo_full_name, head_sha)
+            if files is not None:
+                logger.info(f"Diff of PR #{pr_number} at {head_sha[:7]} served from the cache")
+                return files
+            # The head is read with the files, in case the PR moved on since head_sha
+            pull_request, pr_files = await asyncio.gather(fetch.pull_request(), fetch.files())
+        else:
+            pr_files = await fetch.files()
         files = []
 
-        for file in pr.get_files():
-            file_data = {
-                "filename": file.filename,
-                "status": file.status,  # added, modified, removed, renamed
-                "additions": file.additions,
-                "deletions": file.deletions,
-                "changes": file.changes,
-                "patch": file.patch if hasattr(file, 'patch') and file.patch else None,
-                "previous_filename": file.previous_filename if hasattr(file, 'previous_filename') else None
+        for file in pr_files:
+            file_data = file_stats(file) | {
+                # status: added, modified, removed, renamed
+                "patch": file.get("patch") or None,
+                "previous_filename": file.get("previous_filename"),
             }
             files.append(file_data)
 
+        if cached:
+            await self.diff_cache.put(repo_full_name, pull_request["head"]["sha"], files)
         logger.info(f"Retrieved diff for {len(files)} files in PR #{pr_number}")
         return files
 
+    async def prefetch_pr_diff(self, repo_full_name: str, pr_number: int, head_sha: str):
+        """Cache the diff of a PR head before anyone opens it; errors are only logged."""
+        if self.diff_cache is None or not self.diff_cache.enabled:
+            return
+        try:
+            await self.get_pr_diff(repo_full_name, pr_number, head_sha=head_sha)
+        except (httpx.HTTPError, OSError) as e:
+            logger.warning(f"Could not prefetch the diff of {repo_full_name}#{pr_number}: {e}")
+
+    async def close(self):
+        await self.client.close()
+
 
-github_service = GitHubService()
+github_service = GitHubService(diff_cache=DiffCache())
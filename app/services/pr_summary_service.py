@@ -1,24 +1,47 @@
+import asyncio
 import logging
-from app.models.github import PullRequestEvent
-from app.services.github_service import github_service
+from app import database
+from app.models.github import Branch, PullRequest, PullRequestEvent, Repository, User
+from app.services.admission_control import admission_controller
+from app.services.github_scheduler import GitHubRateLimitError
+from app.services.github_service import PullRequestFetch, github_service
 from app.services.ai_service import ai_service
 
 logger = logging.getLogger(__name__)
 
+# Key changes kept in an incrementally updated analysis, newest first
+MAX_KEY_CHANGES = 8
 
-async def generate_pr_summary(event: PullRequestEvent) -> dict:
+
+async def generate_pr_summary(
+    event: PullRequestEvent, fetch: PullRequestFetch | None = None
+) -> dict:
     """
     Generates an intelligent PR summary using AI-powered NLP analysis.
     Analyzes code diffs, commit history, and contextual information to provide
     comprehensive insights for code reviewers.
+
+    The GitHub data is fetched once through `fetch` (a new PullRequestFetch
+    by default) and shared by every stage; its `requests` is the number of
+    GitHub API requests this PR cost.
+
+    While the admission controller sheds load, returns a heuristic summary
+    built from the event alone, flagged `analysis_pending` for the backfill.
     """
     pr = event.pull_request
     repo = event.repository
 
+    if await admission_controller.is_overloaded():
+        return _shed_pr_summary(event)
+
+    fetch = fetch or github_service.fetch_context(repo.full_name, pr.number)
     try:
-        diff_summary = github_service.get_pr_diff_summary(
-            repo.full_name, pr.number
+        diff_summary = await github_service.get_pr_diff_summary(
+            repo.full_name, pr.number, fetch
         )
+    except GitHubRateLimitError:
+        # Not worth a degraded summary: the caller retries once the budget resets
+        raise
     except Exception as e:
         logger.error(f"Error getting PR diff summary: {e}")
         diff_summary = {
@@ -31,10 +54,13 @@ async def generate_pr_summary(event: PullRequestEvent) -> dict:
 
     # Fetch commit messages for contextual analysis
     try:
-        commit_messages = github_service.get_pr_commits(repo.full_name, pr.number)
+        commit_messages = await github_service.get_pr_commits(repo.full_name, pr.number, fetch)
+    except GitHubRateLimitError:
+        raise
     except Exception as e:
         logger.error(f"Error getting commit messages: {e}")
         commit_messages = []
+    logger.info(f"Fetched PR #{pr.number} in {repo.full_name} with {fetch.requests} GitHub requests")
 
     complexity = _calculate_complexity(
         diff_summary["total_additions"] + diff_summary["total_deletions"]
@@ -73,6 +99,184 @@ async def generate_pr_summary(event: PullRequestEvent) -> dict:
     }
 
 
+async def generate_incremental_pr_summary(event: PullRequestEvent, previous: dict) -> dict | None:
+    """
+    Brings a PR summary up to date after a push by analyzing only the new commits.
+
+    `previous` is the analysis the notification shows ({"head_sha",
+    "ai_analysis"}). The commits between its head_sha and the pushed head are
+    fetched with one compare call, analyzed with a delta prompt and merged
+    into it; the PR totals come from the event. The result carries the delta
+    as `analysis_changes`. Returns None if `previous` already covers the head.
+
+    Falls back to generate_pr_summary when there is no usable previous
+    analysis, history was rewritten (force push) or the compare fails.
+    """
+    pr = event.pull_request
+    repo = event.repository
+    head_sha = event.after or pr.head.sha
+    base_sha = previous.get("head_sha")
+
+    if base_sha == head_sha:
+        return None
+    if not base_sha or not previous.get("ai_analysis"):
+        return await generate_pr_summary(event)
+    if await admission_controller.is_overloaded():
+        # Keep showing the previous analysis until the backfill redoes it
+        return _shed_pr_summary(event, previous["ai_analysis"])
+
+    try:
+        new_changes = await github_service.compare_commits(repo.full_name, base_sha, head_sha)
+    except GitHubRateLimitError:
+        raise
+    except Exception as e:
+        logger.warning(f"Error comparing {base_sha}...{head_sha}; re-analyzing the whole PR: {e}")
+        return await generate_pr_summary(event)
+
+    if new_changes["status"] == "identical":
+        return None
+    if new_changes["status"] != "ahead":
+        logger.info(
+            f"PR #{pr.number} history was rewritten ({new_changes['status']}); "
+            f"re-analyzing the whole PR"
+        )
+        return await generate_pr_summary(event)
+
+    update = await ai_service.analyze_pr_update(
+        pr_title=pr.title,
+        previous_analysis=previous["ai_analysis"],
+        file_changes=new_changes["files"],
+        commit_messages=new_changes["commit_messages"],
+        diff_stats=new_changes,
+    )
+    ai_analysis = merge_incremental_analysis(previous["ai_analysis"], update, head_sha)
+
+    return {
+        "summary_text": ai_analysis.get("functional_summary") or _generate_summary_text(pr, {}),
+        "files_changed": pr.changed_files,
+        "additions": pr.additions,
+        "deletions": pr.deletions,
+        "complexity": _calculate_complexity(pr.additions + pr.deletions),
+        "key_files": [f["filename"] for f in new_changes["files"][:5]],
+        "ai_analysis": ai_analysis,
+        "analysis_changes": update | {
+            "base_sha": base_sha,
+            "commits": len(new_changes["commit_messages"]),
+            "files": [f["filename"] for f in new_changes["files"]],
+        },
+    }
+
+
+def merge_incremental_analysis(previous: dict, update: dict, head_sha: str) -> dict:
+    """
+    Folds the analysis of newly pushed commits into the PR's analysis.
+
+    Revised summary and risks replace the old ones, the new key changes go
+    first, review focus moves to the new commits, and `latest_update` says
+    what the last push changed.
+    """
+    key_changes = list(dict.fromkeys(
+        [*update.get("key_changes", []), *previous.get("key_changes", [])]
+    ))
+    return previous | {
+        "functional_summary": update.get("functional_summary") or previous.get("functional_summary", ""),
+        "key_changes": key_changes[:MAX_KEY_CHANGES],
+        "risk_assessment": update.get("risk_assessment") or previous.get("risk_assessment", ""),
+        "review_focus_areas": update.get("review_focus_areas") or previous.get("review_focus_areas", []),
+        "latest_update": {"summary": update.get("update_summary", ""), "head_sha": head_sha},
+    }
+
+
+def _shed_pr_summary(event: PullRequestEvent, ai_analysis: dict | None = None) -> dict:
+    """A summary from the event alone (no GitHub or LLM calls), flagged for the backfill."""
+    pr = event.pull_request
+    diff_stats = {
+        "total_files": pr.changed_files,
+        "total_additions": pr.additions,
+        "total_deletions": pr.deletions,
+    }
+    if ai_analysis is None:
+        ai_analysis = ai_service.heuristic_analysis(pr.title, pr.body or "", [], diff_stats)
+    admission_controller.summaries_shed += 1
+    logger.info(f"PR #{pr.number} in {event.repository.full_name}: AI analysis deferred (load shedding)")
+
+    return {
+        "summary_text": ai_analysis.get("functional_summary") or _generate_summary_text(pr, {}),
+        "files_changed": pr.changed_files,
+        "additions": pr.additions,
+        "deletions": pr.deletions,
+        "complexity": _calculate_complexity(pr.additions + pr.deletions),
+        "key_files": [],
+        "file_types": {},
+        "ai_analysis": ai_analysis,
+        "analysis_pending": True,
+    }
+
+
+async def backfill_pending_analyses(limit: int) -> int:
+    """
+    Replace deferred (analysis_pending) analyses with AI ones, oldest first,
+    while the load allows. Returns how many were backfilled.
+    """
+    backfilled = 0
+    for notification in await database.get_notifications_pending_analysis(limit):
+        if await admission_controller.is_overloaded():
+            break
+        event = await _event_for_notification(notification)
+        pr_summary = await generate_pr_summary(event)
+        if pr_summary.get("analysis_pending"):
+            break
+        await database.save_notification(event, pr_summary | {"backfill": True})
+        admission_controller.analyses_backfilled += 1
+        backfilled += 1
+
+    if backfilled:
+        logger.info(f"Backfilled {backfilled} deferred AI analyses")
+    return backfilled
+
+
+async def backfill_pending_analyses_forever(interval_seconds: int, batch_size: int):
+    """Background job: periodically backfill deferred AI analyses."""
+    while True:
+        try:
+            await backfill_pending_analyses(batch_size)
+        except Exception as e:
+            logger.error(f"Error backfilling AI analyses: {e}", exc_info=True)
+        await asyncio.sleep(interval_seconds)
+
+
+async def _event_for_notification(notification: dict) -> PullRequestEvent:
+    """Rebuild the PR event generate_pr_summary needs from a stored notification."""
+    details = await database.get_notification_by_id(notification["id"], include_details=True)
+    versions = await database.get_analysis_versions(notification["id"], limit=1)
+    head_sha = (versions[0]["head_sha"] if versions else None) or ""
+    repository = notification["repository"]
+    author = User(login=notification["author"], avatar_url=notification["author_avatar"])
+
+    return PullRequestEvent(
+        action="opened",
+        pull_request=PullRequest(
+            number=notification["pr_number"],
+            title=notification["pr_title"],
+            html_url=notification["pr_url"],
+            state="open",
+            body=details["pr_body"] if details else None,
+            user=author,
+            head=Branch(ref=notification["branch_from"] or "", sha=head_sha),
+            base=Branch(ref=notification["branch_to"] or "", sha=""),
+            additions=notification["additions"] or 0,
+            deletions=notification["deletions"] or 0,
+            changed_files=notification["files_changed"] or 0,
+        ),
+        repository=Repository(
+            name=repository.split("/")[-1],
+            full_name=repository,
+            html_url=f"https://github.com/{repository}",
+        ),
+        sender=author,
+    )
+
+
 def _calculate_complexity(total_changes: int) -> str:
     if total_changes < 50:
         return "Small (< 5 min review)"
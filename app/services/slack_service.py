@@ -44,7 +44,7 @@ class SlackService:
                     {"type": "mrkdwn", "text": f"*PR Number:*\n#{pr.number}"},
                     {
                         "type": "mrkdwn",
-                        "text": f"*Branch:*\n{pr.head['ref']} → {pr.base['ref']}",
+                        "text": f"*Branch:*\n{pr.head.ref} → {pr.base.ref}",
                     },
                 ],
             },
@@ -73,7 +73,7 @@ class SlackWebhookService:
                     },
                     {
                         "type": "mrkdwn",
-                        "text": f"*Branch:*\n`{pr.head['ref']}` → `{pr.base['ref']}`"
+                        "text": f"*Branch:*\n`{pr.head.ref}` → `{pr.base.ref}`"
                     },
                     {
                         "type": "mrkdwn",
@@ -0,0 +1,304 @@
+"""
+Background processing of queued GitHub webhook events
+"""
+import asyncio
+import contextlib
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from app import database
+from app.db_backend import PayloadMerge
+from app.services.github_scheduler import GitHubRateLimitError
+
+logger = logging.getLogger(__name__)
+
+# Processes one webhook: (event_type, raw JSON payload)
+JobHandler = Callable[[str, str], Awaitable[None]]
+
+
+def parse_repository_weights(text: str) -> dict[str, float]:
+    """Parse "org/repo=weight, ..." into a dict; malformed or non-positive entries are skipped."""
+    weights = {}
+    for entry in filter(None, (part.strip() for part in text.split(","))):
+        repository, _, weight = entry.rpartition("=")
+        try:
+            value = float(weight)
+        except ValueError:
+            value = 0.0
+        if not repository.strip() or value <= 0:
+            logger.warning(f"Ignoring invalid repository weight: {entry!r}")
+            continue
+        weights[repository.strip()] = value
+    return weights
+
+
+class RecentDeliveries:
+    """Bounded LRU set of delivery ids, so repeats skip the database round trip."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._ids: OrderedDict[str, None] = OrderedDict()
+
+    def __contains__(self, delivery_id: str) -> bool:
+        if delivery_id in self._ids:
+            self._ids.move_to_end(delivery_id)
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, delivery_id: str):
+        self._ids[delivery_id] = None
+        self._ids.move_to_end(delivery_id)
+        while len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+
+
+class WebhookQueue:
+    """
+    A pool of async workers draining the durable webhook job table.
+
+    The webhook endpoint only enqueues; workers claim jobs with a lease, run
+    the handler and delete the job. A failed job is retried with exponential
+    backoff (retry_base_seconds, doubling, capped at retry_max_seconds) and
+    dead-lettered after max_attempts. A job stopped by the GitHub rate limit
+    is not failing: it is requeued for when the budget resets, never
+    dead-lettered. Jobs interrupted by a crash are requeued when the pool
+    starts (or when their lease expires).
+
+    Deliveries are deduplicated by GitHub's delivery id: recent ids are
+    answered from an in-memory LRU, older ones by the database, which
+    remembers them for the TTL the prune job enforces.
+
+    Events enqueued with a coalesce key are debounced for coalesce_seconds
+    (at most coalesce_max_seconds in total), so a burst for one PR runs the
+    handler once.
+
+    `workers` bounds the jobs running at once; jobs are claimed weighted
+    round-robin across repositories (repo_weights, default 1 each), with at
+    most repo_concurrency running per repository (0 = no cap), so a busy
+    repository neither starves the others nor uses every worker.
+
+    Settings left as None are read from app settings when the pool starts.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        max_attempts: int | None = None,
+        retry_base_seconds: float | None = None,
+        retry_max_seconds: float | None = None,
+        lease_seconds: float | None = None,
+        poll_interval: float = 1.0,
+        delivery_cache_size: int | None = None,
+        coalesce_seconds: float | None = None,
+        coalesce_max_seconds: float | None = None,
+        repo_concurrency: int | None = None,
+        repo_weights: dict[str, float] | None = None,
+    ):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.delivery_cache_size = delivery_cache_size
+        self.coalesce_seconds = coalesce_seconds
+        self.coalesce_max_seconds = coalesce_max_seconds
+        self.repo_concurrency = repo_concurrency
+        self.repo_weights = repo_weights
+        # Resized from settings when the pool starts
+        self.recent_deliveries = RecentDeliveries(delivery_cache_size or 10_000)
+        self.handler: JobHandler | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._wake = asyncio.Event()
+
+        # Monitoring counters
+        self.jobs_processed = 0
+        self.jobs_retried = 0
+        self.jobs_dead = 0
+        self.deliveries_received = 0
+        self.duplicate_deliveries = 0
+        self.events_coalesced = 0
+
+    @property
+    def is_running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    async def start(self, handler: JobHandler):
+        """Requeue interrupted jobs and start the workers (no-op if already running)."""
+        if self.is_running:
+            return
+
+        if None in (self.workers, self.max_attempts, self.retry_base_seconds,
+                    self.retry_max_seconds, self.lease_seconds, self.delivery_cache_size,
+                    self.coalesce_seconds, self.coalesce_max_seconds,
+                    self.repo_concurrency, self.repo_weights):
+            # Imported lazily so the module can be used without app settings
+            from app.config import settings
+            if self.workers is None:
+                self.workers = settings.webhook_workers
+            if self.max_attempts is None:
+                self.max_attempts = settings.webhook_max_attempts
+            if self.retry_base_seconds is None:
+                self.retry_base_seconds = settings.webhook_retry_base_seconds
+            if self.retry_max_seconds is None:
+                self.retry_max_seconds = settings.webhook_retry_max_seconds
+            if self.lease_seconds is None:
+                self.lease_seconds = settings.webhook_job_lease_seconds
+            if self.delivery_cache_size is None:
+                self.delivery_cache_size = settings.webhook_delivery_cache_size
+            if self.coalesce_seconds is None:
+                self.coalesce_seconds = settings.webhook_coalesce_seconds
+            if self.coalesce_max_seconds is None:
+                self.coalesce_max_seconds = settings.webhook_coalesce_max_seconds
+            if self.repo_concurrency is None:
+                self.repo_concurrency = settings.webhook_repo_concurrency
+            if self.repo_weights is None:
+                self.repo_weights = parse_repository_weights(settings.webhook_repo_weights)
+        self.recent_deliveries.max_size = max(1, self.delivery_cache_size)
+
+        self.handler = handler
+        recovered = await database.recover_jobs()
+        if recovered:
+            logger.warning(f"Requeued {recovered} webhook job(s) interrupted by a restart")
+
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(max(1, self.workers))]
+
+    async def stop(self):
+        """
+        Stop the workers. A job cut off mid-run stays claimed and is picked up
+        again after a restart.
+        """
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+
+    async def enqueue(
+        self,
+        event_type: str,
+        payload: str,
+        delivery_id: str | None = None,
+        coalesce_key: str | None = None,
+        merge: PayloadMerge | None = None,
+        repository: str | None = None,
+    ) -> int | None:
+        """
+        Persist a raw webhook body for processing; returns the job id once it
+        is durable, or None for a delivery that was already received. With a
+        coalesce_key the event may join an already queued job (see
+        StorageBackend.enqueue_job for `merge`). `repository` is the
+        fair-scheduling key.
+        """
+        self.deliveries_received += 1
+        if delivery_id is not None and delivery_id in self.recent_deliveries:
+            self.duplicate_deliveries += 1
+            return None
+
+        window = max_wait = 0.0
+        if coalesce_key is not None:
+            window = self.coalesce_seconds or 0.0
+            max_wait = max(window, self.coalesce_max_seconds or 0.0)
+        job_id = await database.enqueue_job(
+            event_type, payload, delivery_id, coalesce_key, window, max_wait, merge, repository
+        )
+        if delivery_id is not None:
+            self.recent_deliveries.add(delivery_id)
+        if job_id is None:
+            self.duplicate_deliveries += 1
+            return None
+
+        self._wake.set()
+        return job_id
+
+    @property
+    def dedupe_hit_rate(self) -> float:
+        """Share of received deliveries that were duplicates."""
+        if not self.deliveries_received:
+            return 0.0
+        return self.duplicate_deliveries / self.deliveries_received
+
+    async def stats(self) -> dict:
+        """Queue depth and lag from the database, plus this process's counters."""
+        return await database.get_job_queue_stats() | {
+            "workers": len([task for task in self._tasks if not task.done()]),
+            "processed": self.jobs_processed,
+            "retried": self.jobs_retried,
+            "dead_lettered": self.jobs_dead,
+            "deliveries": self.deliveries_received,
+            "duplicate_deliveries": self.duplicate_deliveries,
+            "dedupe_hit_rate": round(self.dedupe_hit_rate, 4),
+            "events_coalesced": self.events_coalesced,
+        }
+
+    def retry_delay(self, attempts: int) -> float:
+        """Backoff before the next attempt, after `attempts` failed ones."""
+        return min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1))
+
+    async def _work(self):
+        while True:
+            try:
+                jobs = await database.claim_jobs(
+                    1, self.lease_seconds, self.repo_concurrency, self.repo_weights
+                )
+            except Exception as e:
+                logger.error(f"Error claiming webhook jobs: {e}", exc_info=True)
+                jobs = []
+
+            if not jobs:
+                # Woken by a local enqueue; polling finds retries and other processes' jobs
+                self._wake.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                continue
+
+            try:
+                await self._run(jobs[0])
+            except Exception as e:
+                # The lease expires and the job is retried
+                logger.error(f"Error recording webhook job #{jobs[0]['id']}: {e}", exc_info=True)
+            # A job held back by its repository's cap may be claimable now
+            self._wake.set()
+
+    async def _run(self, job: dict):
+        job_id = job["id"]
+        try:
+            await self.handler(job["event_type"], job["payload"])
+        except GitHubRateLimitError as e:
+            logger.warning(
+                f"Webhook job #{job_id} is rate limited; retrying in {e.retry_after:.0f}s"
+            )
+            await database.fail_job(job_id, f"{type(e).__name__}: {e}", e.retry_after)
+            self.jobs_retried += 1
+            return
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job["attempts"] >= self.max_attempts:
+                logger.error(
+                    f"Webhook job #{job_id} failed {job['attempts']} times; dead-lettered: {error}",
+                    exc_info=True,
+                )
+                await database.fail_job(job_id, error, None)
+                self.jobs_dead += 1
+            else:
+                delay = self.retry_delay(job["attempts"])
+                logger.warning(
+                    f"Webhook job #{job_id} failed (attempt {job['attempts']}); "
+                    f"retrying in {delay:.0f}s: {error}"
+                )
+                await database.fail_job(job_id, error, delay)
+                self.jobs_retried += 1
+            return
+
+        await database.complete_job(job_id)
+        self.jobs_processed += 1
+        self.events_coalesced += job["events"] - 1
+
+
+webhook_queue = WebhookQueue()
@@ -0,0 +1,23 @@
+"""
+JSON decoding and encoding, using orjson when it is installed
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # Falls back to the (several times slower) standard library
+    orjson = None
+
+
+def loads(data: bytes | str):
+    """Decode JSON text. Raises ValueError if it is malformed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value) -> str:
+    """Encode a value as compact JSON text."""
+    if orjson is not None:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value, separators=(",", ":"))
@@ -6,19 +6,41 @@ from app.config import settings
 
 
 async def verify_github_signature(request: Request) -> bytes:
+    """
+    Read the request body once, checking GitHub's HMAC-SHA256 signature as it
+    streams in, and return the verified bytes.
+
+    Bodies over settings.webhook_max_body_bytes are rejected with 413 --
+    up front when Content-Length says so, otherwise as soon as the stream
+    passes the limit -- so an oversized or forged request never gets buffered
+    whole.
+    """
     signature_header = request.headers.get("X-Hub-Signature-256")
     if not signature_header:
         raise HTTPException(status_code=403, detail="Missing X-Hub-Signature-256 header")
+    if not signature_header.startswith("sha256="):
+        raise HTTPException(status_code=403, detail="Invalid signature")
+
+    max_bytes = settings.webhook_max_body_bytes
+    too_large = HTTPException(status_code=413, detail=f"Payload exceeds {max_bytes} bytes")
+    try:
+        declared_length = int(request.headers.get("Content-Length", 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+    if declared_length > max_bytes:
+        raise too_large
 
-    body = await request.body()
-    expected_signature = (
-        "sha256="
-        + hmac.new(
-            settings.github_webhook_secret.encode(), body, hashlib.sha256
-        ).hexdigest()
-    )
+    digest = hmac.new(settings.github_webhook_secret.encode(), digestmod=hashlib.sha256)
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise too_large
+        digest.update(chunk)
+        chunks.append(chunk)
 
-    if not hmac.compare_digest(signature_header, expected_signature):
+    if not hmac.compare_digest(signature_header, "sha256=" + digest.hexdigest()):
         raise HTTPException(status_code=403, detail="Invalid signature")
 
-    return body
+    return b"".join(chunks)
@@ -0,0 +1,14 @@
+import pytest
+
+from app import database
+from app.db_sqlite import SQLiteBackend
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    """A SQLite backend in a temporary directory, installed as the app's database."""
+    backend = SQLiteBackend(
+        tmp_path / "notifications.db", readers=2, write_batch=16, write_delay=0.001
+    )
+    monkeypatch.setattr(database, "backend", backend)
+    return backend
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database
+from app.main import app
+from app.routes import dashboard
+from app.services.diff_cache import DiffCache
+from tests.test_database import SUMMARY, make_event
+from tests.test_github_client import HEAD, fake_github, make_file
+
+
+@pytest.fixture
+def client(backend, monkeypatch):
+    monkeypatch.setitem(dashboard.active_sessions, "test-session", {"username": "admin"})
+
+    with TestClient(app) as client:
+        client.cookies.set("session_token", "test-session")
+        yield client
+
+
+def test_notifications_list_pages_with_cursor_header(client):
+    for n in range(1, 6):
+        client.portal.call(database.save_notification, make_event(n), SUMMARY)
+
+    first = client.get("/dashboard/api/notifications?limit=2")
+    cursor = first.headers["X-Next-Cursor"]
+    second = client.get(f"/dashboard/api/notifications?limit=3&cursor={cursor}")
+
+    assert [n["pr_number"] for n in first.json()] == [5, 4]
+    assert [n["pr_number"] for n in second.json()] == [3, 2, 1]
+    assert "X-Next-Cursor" not in second.headers
+
+
+def test_malformed_cursor_returns_400(client):
+    response = client.get("/dashboard/api/notifications?cursor=garbage")
+
+    assert response.status_code == 400
+
+
+def test_search_returns_escaped_snippets(client):
+    event = make_event(1)
+    event.pull_request.body = "Replaces <script> tags in the sanitizer"
+    client.portal.call(database.save_notification, event, SUMMARY)
+
+    results = client.get("/dashboard/api/search?q=sanitizer").json()
+
+    assert [r["pr_number"] for r in results] == [1]
+    assert "&lt;script&gt;" in results[0]["snippet"]
+    assert "<mark>sanitizer</mark>" in results[0]["snippet"]
+
+
+def test_pr_diff_is_served_for_the_current_head_not_the_last_analyzed_one(
+    client, tmp_path, monkeypatch
+):
+    # Analyzed at an older head; a push since has not been analyzed yet
+    stale_head = "b" * 40
+    event = make_event(7, repository="org/app")
+    event.pull_request.head.sha = stale_head
+    notification_id = client.portal.call(database.save_notification, event, SUMMARY)
+
+    diff_cache = DiffCache(1_000_000, tmp_path / "diffs")
+    asyncio.run(diff_cache.put("org/app", stale_head, [make_file(0)]))
+    requests = []
+    service = fake_github(requests, [make_file(1), make_file(2)], diff_cache=diff_cache)
+    monkeypatch.setattr(dashboard, "github_service", service)
+
+    first = client.get(f"/dashboard/api/notifications/{notification_id}/diff")
+    sent = len(requests)
+    again = client.get(f"/dashboard/api/notifications/{notification_id}/diff")
+    client.portal.call(service.close)
+
+    assert [file["filename"] for file in first.json()["files"]] == [
+        "src/file1.py", "src/file2.py"
+    ]
+    assert again.json() == first.json()
+    # The second view only asked GitHub for the head
+    assert [request.url.path for request in requests[sent:]] == ["/repos/org/app/pulls/7"]
+    assert asyncio.run(diff_cache.get("org/app", HEAD)) is not None
@@ -0,0 +1,525 @@
+import asyncio
+from types import SimpleNamespace
+
+import aiosqlite
+import pytest
+
+from app import database
+from app.db_migrations import MIGRATIONS, SCHEMA_VERSION, apply_migrations
+from app.db_sqlite import SQLiteBackend
+from app.db_writer import WriteQueue
+
+
+def make_event(number: int, repository: str = "test-org/awesome-app", action: str = "opened"):
+    """Build the minimal PR event shape that save_notification reads."""
+    return SimpleNamespace(
+        action=action,
+        pull_request=SimpleNamespace(
+            number=number,
+            title=f"PR {number}",
+            html_url=f"https://github.com/{repository}/pull/{number}",
+            body="Body text",
+            user=SimpleNamespace(login="developer-alice", avatar_url=None),
+            head=SimpleNamespace(ref="feature", sha="abc123"),
+            base=SimpleNamespace(ref="main", sha="def456"),
+        ),
+        repository=SimpleNamespace(full_name=repository),
+    )
+
+
+SUMMARY = {
+    "summary_text": "Adds a feature",
+    "files_changed": 2,
+    "additions": 10,
+    "deletions": 3,
+    "complexity": "Small (< 5 min review)",
+    "ai_analysis": {
+        "functional_summary": "Adds a feature",
+        "key_changes": ["One", "Two", "Three", "Four"],
+        "risk_assessment": "Low",
+    },
+}
+
+
+@pytest.fixture
+def db_pool(backend):
+    return backend.pool
+
+
+def test_pool_uses_wal_and_reuses_connections(db_pool):
+    async def scenario():
+        await database.init_db()
+        try:
+            async with db_pool.reader() as db:
+                cursor = await db.execute("PRAGMA journal_mode")
+                journal_mode = (await cursor.fetchone())[0]
+
+            borrowed = set()
+            for _ in range(6):
+                async with db_pool.reader() as db:
+                    borrowed.add(id(db))
+            return journal_mode, borrowed
+        finally:
+            await database.close_db()
+
+    journal_mode, borrowed = asyncio.run(scenario())
+
+    assert journal_mode == "wal"
+    assert len(borrowed) == 2
+
+
+def test_save_update_and_stats_round_trip(db_pool):
+    async def scenario():
+        await database.init_db()
+        try:
+            ids = await asyncio.gather(*(database.save_notification(make_event(n), SUMMARY)
+                                         for n in range(1, 6)))
+            await database.update_notification_status(ids[0], "approved")
+            await database.save_user_action(ids[0], "approve", "LGTM")
+            notification = await database.get_notification_by_id(ids[0])
+            stats = await database.get_notification_stats()
+            return ids, notification, stats
+        finally:
+            await database.close_db()
+
+    ids, notification, stats = asyncio.run(scenario())
+
+    assert len(set(ids)) == 5
+    assert notification["status"] == "approved"
+    assert stats["approved"] == 1
+    assert stats["pending"] == 4
+    assert stats["total"] == 5
+
+
+def test_failed_write_rolls_back(db_pool):
+    async def scenario():
+        await database.init_db()
+        try:
+            with pytest.raises(RuntimeError):
+                async with db_pool.writer() as db:
+                    await db.execute(
+                        "INSERT INTO user_actions (notification_id, action) VALUES (1, 'x')"
+                    )
+                    raise RuntimeError("boom")
+            async with db_pool.reader() as db:
+                cursor = await db.execute("SELECT COUNT(*) FROM user_actions")
+                return (await cursor.fetchone())[0]
+        finally:
+            await database.close_db()
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_migrations_create_indexes_once(db_pool):
+    async def scenario():
+        await database.init_db()
+        await database.init_db()  # Re-running must be a no-op
+        try:
+            async with db_pool.reader() as db:
+                cursor = await db.execute("PRAGMA user_version")
+                version = (await cursor.fetchone())[0]
+                cursor = await db.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'"
+                )
+                indexes = {row[0] for row in await cursor.fetchall()}
+            return version, indexes
+        finally:
+            await database.close_db()
+
+    version, indexes = asyncio.run(scenario())
+
+    assert version == SCHEMA_VERSION
+    assert {
+        "idx_notifications_status_created",
+        "idx_notifications_repo_pr",
+        "idx_user_actions_notification_created",
+    } <= indexes
+
+
+def test_keyset_pagination_walks_every_row_once(db_pool):
+    async def scenario():
+        await database.init_db()
+        try:
+            for n in range(1, 8):
+                await database.save_notification(make_event(n), SUMMARY)
+
+            seen = []
+            rows, cursor = await database.get_notifications_page(limit=3)
+            seen.extend(rows)
+            # Rows that arrive mid-walk must not shift the following pages
+            await database.save_notification(make_event(99), SUMMARY)
+            while cursor:
+                rows, cursor = await database.get_notifications_page(limit=3, cursor=cursor)
+                seen.extend(rows)
+            return seen
+        finally:
+            await database.close_db()
+
+    seen = asyncio.run(scenario())
+
+    assert [row["pr_number"] for row in seen] == [7, 6, 5, 4, 3, 2, 1]
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        database.decode_cursor("not-a-cursor")
+
+    cursor = database.encode_cursor("2025-01-01 00:00:00", 42)
+    assert database.decode_cursor(cursor) == ("2025-01-01 00:00:00", 42)
+
+
+def test_list_rows_are_lean_and_details_load_on_demand(db_pool):
+    async def scenario():
+        await database.init_db()
+        try:
+            notification_id = await database.save_notification(make_event(1), SUMMARY)
+            rows, _ = await database.get_notifications_page()
+            lean = await database.get_notification_by_id(notification_id)
+            full = await database.get_notification_by_id(notification_id, include_details=True)
+            return rows[0], lean, full
+        finally:
+            await database.close_db()
+
+    card, lean, full = asyncio.run(scenario())
+
+    assert "pr_body" not in card
+    assert card["ai_analysis"] == {
+        "functional_summary": "Adds a feature", "key_changes": ["One", "Two", "Three"]
+    }
+    assert lean["ai_analysis"] == card["ai_analysis"]
+    assert full["pr_body"] == "Body text"
+    assert full["ai_analysis"] == SUMMARY["ai_analysis"]
+
+
+def test_migration_moves_inline_columns_to_details(db_pool):
+    async def scenario():
+        async with db_pool.writer() as db:
+            await apply_migrations(db, up_to=2)
+            await db.execute("""
+                INSERT INTO notifications (pr_number, pr_title, pr_url, pr_body, repository,
+                                           author, summary, ai_analysis)
+                VALUES (7, 'Old PR', 'url', 'Old body', 'org/repo', 'dev', 'Old summary', ?)
+            """, ('{"functional_summary": "Old summary", "key_changes": ["A"]}',))
+        await database.init_db()
+        try:
+            async with db_pool.reader() as db:
+                cursor = await db.execute("PRAGMA table_info(notifications)")
+                columns = {row["name"] for row in await cursor.fetchall()}
+            return columns, await database.get_notification_by_id(1, include_details=True)
+        finally:
+            await database.close_db()
+
+    columns, notification = asyncio.run(scenario())
+
+    assert not {"pr_body", "ai_analysis"} & columns
+    assert notification["pr_body"] == "Old body"
+    assert notification["ai_analysis"]["key_changes"] == ["A"]
+
+
+def test_migration_folds_duplicate_pr_rows_into_the_newest(db_pool):
+    async def scenario():
+        async with db_pool.writer() as db:
+            await apply_migrations(db, up_to=4)
+            for title in ("First", "Second", "Third"):
+                await db.execute("""
+                    INSERT INTO notifications (pr_number, pr_title, pr_url, repository, author)
+                    VALUES (7, ?, 'url', 'org/repo', 'dev')
+                """, (title,))
+            await db.execute(
+                "INSERT INTO user_actions (notification_id, action) VALUES (1, 'comment')"
+            )
+        await database.init_db()
+        try:
+            async with db_pool.reader() as db:
+                cursor = await db.execute("SELECT id, pr_title, event_count FROM notifications")
+                rows = [tuple(row) for row in await cursor.fetchall()]
+                cursor = await db.execute("SELECT notification_id FROM user_actions")
+                actions = [row[0] for row in await cursor.fetchall()]
+            return rows, actions, await database.get_notification_stats()
+        finally:
+            await database.close_db()
+
+    rows, actions, stats = asyncio.run(scenario())
+
+    assert rows == [(3, "Third", 3)]
+    assert actions == [3]
+    assert stats["total"] == 1
+
+
+def test_failed_migration_rolls_back_to_the_previous_version(db_pool, monkeypatch):
+    broken = (
+        SCHEMA_VERSION + 1,
+        "Add a column, then fail",
+        (
+            "ALTER TABLE notifications ADD COLUMN reviewer TEXT",
+            "UPDATE notifications SET reviewer = missing_column",
+        ),
+    )
+    fixed = (broken[0], broken[1], broken[2][:1])
+
+    async def columns_and_version(db):
+        cursor = await db.execute("PRAGMA table_info(notifications)")
+        columns = {row["name"] for row in await cursor.fetchall()}
+        cursor = await db.execute("PRAGMA user_version")
+        return columns, (await cursor.fetchone())[0]
+
+    async def scenario():
+        async with db_pool.writer() as db:
+            await apply_migrations(db)
+            monkeypatch.setattr("app.db_migrations.MIGRATIONS", [*MIGRATIONS, broken])
+            with pytest.raises(aiosqlite.OperationalError):
+                await apply_migrations(db, up_to=broken[0])
+            after_failure = await columns_and_version(db)
+            # Once fixed, the migration applies from the start
+            monkeypatch.setattr("app.db_migrations.MIGRATIONS", [*MIGRATIONS, fixed])
+            version = await apply_migrations(db, up_to=fixed[0])
+            return after_failure, version, await columns_and_version(db)
+
+    (columns, failed_version), version, (fixed_columns, _) = asyncio.run(scenario())
+    asyncio.run(db_pool.close())
+
+    assert "reviewer" not in columns and failed_version == SCHEMA_VERSION
+    assert version == SCHEMA_VERSION + 1 and "reviewer" in fixed_columns
+
+
+def test_search_ranks_matches_and_applies_filters(db_pool):
+    async def scenario():
+        await database.init_db()
+        try:
+            ids = [await database.save_notification(make_event(n), SUMMARY) for n in range(1, 4)]
+            event = make_event(4, repository="other/repo")
+            event.pull_request.title = "Fix rate limiting in webhook"
+            await database.save_notification(event, SUMMARY)
+            await database.update_notification_status(ids[0], "approved")
+
+            by_title = await database.search_notifications("rate limit")
+            by_risk = await database.search_notifications("low", status_filter="approved")
+            by_repo = await database.search_notifications("feature", repository="other/repo")
+            operators = await database.search_notifications('NOT "OR')
+            return by_title, by_risk, by_repo, operators
+        finally:
+            await database.close_db()
+
+    by_title, by_risk, by_repo, operators = asyncio.run(scenario())
+
+    assert [r["pr_number"] for r in by_title] == [4]
+    assert database.SNIPPET_START in by_title[0]["snippet"]
+    assert [r["pr_number"] for r in by_risk] == [1]
+    assert [r["pr_number"] for r in by_repo] == [4]
+    assert operators == []
+
+
+def test_stats_counters_track_writes_and_rebuild(db_pool):
+    async def scenario():
+        await database.init_db()
+        try:
+            ids = [await database.save_notification(make_event(n), SUMMARY) for n in range(4)]
+            await database.update_notification_status(ids[0], "approved")
+            await database.update_notification_status(ids[0], "approved")
+            await database.update_notification_status(ids[1], "commented")
+            live = await database.get_notification_stats()
+
+            # Corrupt the counters, then let reconciliation repair them
+            async with db_pool.writer() as db:
+                await db.execute("UPDATE notification_stats SET count = 100")
+            rebuilt = await database.rebuild_notification_stats()
+            return live, rebuilt
+        finally:
+            await database.close_db()
+
+    live, rebuilt = asyncio.run(scenario())
+
+    expected = {"pending": 2, "approved": 1, "changes_requested": 0, "commented": 1, "total": 4}
+    assert live == expected
+    assert rebuilt == expected
+
+
+def test_archiving_returns_pages_to_the_filesystem(tmp_path):
+    path = tmp_path / "legacy.db"
+
+    async def scenario():
+        # A database created before incremental auto_vacuum was configured
+        async with aiosqlite.connect(path) as db:
+            await db.execute("PRAGMA auto_vacuum = NONE")
+            await apply_migrations(db)
+            await db.commit()
+
+        backend = SQLiteBackend(path, readers=1, write_batch=16, write_delay=0.001)
+        await backend.init()
+        try:
+            # Converting is a maintenance step, never part of startup
+            async with backend.pool.reader() as db:
+                cursor = await db.execute("PRAGMA auto_vacuum")
+                auto_vacuum_at_start = (await cursor.fetchone())[0]
+            assert await backend.enable_incremental_vacuum()
+            assert not await backend.enable_incremental_vacuum()
+
+            for n in range(200):
+                event = make_event(n)
+                event.pull_request.body = "x" * 20000
+                notification_id = await backend.save_notification(event, SUMMARY)
+                await backend.update_notification_status(notification_id, "merged")
+
+            async with backend.pool.writer() as db:
+                cursor = await db.execute("PRAGMA auto_vacuum")
+                auto_vacuum = (await cursor.fetchone())[0]
+                cursor = await db.execute("PRAGMA page_count")
+                pages_before = (await cursor.fetchone())[0]
+
+            archived = await backend.archive_notifications(0, ["merged"], batch_size=50)
+
+            async with backend.pool.reader() as db:
+                cursor = await db.execute("PRAGMA page_count")
+                pages_after = (await cursor.fetchone())[0]
+                cursor = await db.execute("PRAGMA freelist_count")
+                free_after = (await cursor.fetchone())[0]
+            return (
+                auto_vacuum_at_start, auto_vacuum, archived, pages_before, pages_after, free_after
+            )
+        finally:
+            await backend.close()
+
+    (
+        auto_vacuum_at_start, auto_vacuum, archived, pages_before, pages_after, free_after
+    ) = asyncio.run(scenario())
+
+    assert auto_vacuum_at_start == 0  # NONE
+    assert auto_vacuum == 2  # INCREMENTAL
+    assert archived == 200
+    assert pages_after < pages_before / 2
+    assert free_after == 0
+    assert (tmp_path / "legacy_archive.db").exists()
+
+
+def test_archiving_finishes_a_move_interrupted_after_the_archive_commit(db_pool):
+    async def scenario():
+        await database.init_db()
+        try:
+            ids = [await database.save_notification(make_event(n), SUMMARY) for n in range(3)]
+            for notification_id in ids:
+                await database.update_notification_status(notification_id, "merged")
+            # A crash after the archive's commit left a copy in both databases
+            async with db_pool.writer() as db:
+                await db.execute(
+                    "INSERT INTO archive.notifications"
+                    " SELECT * FROM main.notifications WHERE id = ?", (ids[0],)
+                )
+            archived = await database.archive_old_notifications(0, ["merged"], batch_size=2)
+            async with db_pool.reader() as db:
+                counts = []
+                for schema in ("main", "archive"):
+                    cursor = await db.execute(f"SELECT COUNT(*) FROM {schema}.notifications")
+                    counts.append((await cursor.fetchone())[0])
+            return archived, counts
+        finally:
+            await database.close_db()
+
+    archived, counts = asyncio.run(scenario())
+
+    assert archived == 3
+    assert counts == [0, 3]
+
+
+def _insert_action(action: str):
+    async def mutation(db):
+        cursor = await db.execute(
+            "INSERT INTO user_actions (notification_id, action) VALUES (1, ?)", (action,)
+        )
+        return cursor.lastrowid
+    return mutation
+
+
+async def _count_actions(pool) -> int:
+    async with pool.reader() as db:
+        cursor = await db.execute("SELECT COUNT(*) FROM user_actions")
+        return (await cursor.fetchone())[0]
+
+
+def test_write_queue_batches_and_returns_lastrowid(db_pool):
+    queue = WriteQueue(lambda: db_pool, max_batch=10, max_delay=0.01)
+
+    async def scenario():
+        await database.init_db()
+        try:
+            ids = await asyncio.gather(*(queue.submit(_insert_action(f"a{i}")) for i in range(25)))
+            await queue.stop()
+            return ids, queue.batches_committed
+        finally:
+            await db_pool.close()
+
+    ids, batches = asyncio.run(scenario())
+
+    assert sorted(ids) == list(range(1, 26))
+    assert batches == 3
+
+
+def test_write_queue_rolls_back_only_the_failing_operation(db_pool):
+    queue = WriteQueue(lambda: db_pool, max_batch=10, max_delay=0.01)
+
+    async def failing(db):
+        await db.execute("INSERT INTO user_actions (notification_id, action) VALUES (1, 'bad')")
+        raise ValueError("boom")
+
+    async def scenario():
+        await database.init_db()
+        try:
+            results = await asyncio.gather(
+                queue.submit(_insert_action("ok-1")),
+                queue.submit(failing),
+                queue.submit(_insert_action("ok-2")),
+                return_exceptions=True,
+            )
+            await queue.stop()
+            return results, await _count_actions(db_pool), queue.batches_committed
+        finally:
+            await db_pool.close()
+
+    results, count, batches = asyncio.run(scenario())
+
+    assert isinstance(results[1], ValueError)
+    assert results[0] != results[2]
+    assert count == 2
+    assert batches == 1
+
+
+def test_write_queue_flushes_on_stop(db_pool):
+    queue = WriteQueue(lambda: db_pool, max_batch=4, max_delay=0.05)
+
+    async def scenario():
+        await database.init_db()
+        try:
+            pending = [asyncio.ensure_future(queue.submit(_insert_action(f"a{i}")))
+                       for i in range(10)]
+            await asyncio.sleep(0)
+            await queue.stop()
+            return all(f.done() for f in pending), await _count_actions(db_pool)
+        finally:
+            await db_pool.close()
+
+    all_done, count = asyncio.run(scenario())
+
+    assert all_done
+    assert count == 10
+
+
+def test_write_queue_cancellation_fails_pending_callers(db_pool):
+    queue = WriteQueue(lambda: db_pool, max_batch=10, max_delay=0.05)
+
+    async def scenario():
+        await database.init_db()
+        try:
+            pending = [asyncio.ensure_future(queue.submit(_insert_action(f"a{i}")))
+                       for i in range(6)]
+            await asyncio.sleep(0.01)  # Writer is now waiting inside its batch window
+            queue._task.cancel()
+            results = await asyncio.wait_for(
+                asyncio.gather(*pending, return_exceptions=True), timeout=5
+            )
+            return results, await _count_actions(db_pool)
+        finally:
+            await db_pool.close()
+
+    results, count = asyncio.run(scenario())
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert count == 0
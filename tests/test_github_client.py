@@ -0,0 +1,560 @@
+"""
+Tests for the async GitHub client, against a mock transport
+"""
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.models.github import PullRequestEvent
+from app.services import pr_summary_service
+from app.services.admission_control import admission_controller
+from app.services.ai_service import ai_service
+from app.services.diff_cache import DiffCache
+from app.services.github_auth import CredentialPool, GitHubApp
+from app.services.github_client import GitHubClient
+from app.services.github_graphql import fetch_pull_requests
+from app.services.github_scheduler import GitHubRateLimitError, GitHubScheduler, Lane, github_lane
+from app.services.github_service import GitHubService
+
+
+HEAD = "a" * 40
+
+
+def make_file(n: int) -> dict:
+    return {"filename": f"src/file{n}.py", "status": "modified", "additions": 2,
+            "deletions": 1, "changes": 3, "patch": "@@ -1 +1 @@"}
+
+
+def graphql_pull_request(files: list[dict], start: int) -> dict:
+    """PR org/app#7 as GraphQL returns it: metadata on the first page only."""
+    node = {"files": {
+        "totalCount": len(files),
+        "pageInfo": {"hasNextPage": start + 100 < len(files), "endCursor": str(start + 100)},
+        "nodes": [{"path": file["filename"], "additions": file["additions"],
+                   "deletions": file["deletions"], "changeType": "MODIFIED"}
+                  for file in files[start:start + 100]],
+    }}
+    if start == 0:
+        node |= {
+            "number": 7, "title": "Add login", "body": None, "state": "OPEN", "merged": False,
+            "url": "https://github.com/org/app/pull/7", "additions": 300, "deletions": 150,
+            "changedFiles": len(files), "author": {"login": "alice", "avatarUrl": None},
+            "headRefName": "login", "headRefOid": "sha1", "baseRefName": "main",
+            "baseRefOid": "base0",
+            "commits": {"totalCount": 1, "pageInfo": {"hasNextPage": False, "endCursor": "1"},
+                        "nodes": [{"commit": {"messageHeadline": "Add login"}}]},
+        }
+    return node
+
+
+def fake_github(
+    requests: list, files: list[dict], graphql: bool = True, diff_cache: DiffCache | None = None
+) -> GitHubService:
+    """A GitHubService over a mock transport serving PR org/app#7 (REST, and GraphQL unless off)."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        path = request.url.path
+        if path == "/graphql" and graphql:
+            variables = json.loads(request.content)["variables"]
+            start = int(variables.get("c0_0_files", 0))
+            return httpx.Response(200, json={"data": {
+                "r0": {"name": "app", "nameWithOwner": "org/app",
+                       "url": "https://github.com/org/app",
+                       "p0_0": graphql_pull_request(files, start)},
+                "rateLimit": {"cost": 1, "remaining": 4999},
+            }})
+        if path == "/repos/org/app/pulls/7":
+            return httpx.Response(200, json={"number": 7, "additions": 300, "deletions": 150,
+                                             "head": {"sha": HEAD}})
+        if path == "/repos/org/app/pulls/7/files":
+            page = int(request.url.params.get("page", 1))
+            headers = {}
+            if page == 1:
+                headers["Link"] = ('<https://api.test/repos/org/app/pulls/7/files'
+                                   '?per_page=100&page=2>; rel="next"')
+            return httpx.Response(200, json=files[(page - 1) * 100:page * 100], headers=headers)
+        if path == "/repos/org/app/pulls/7/commits":
+            return httpx.Response(200, json=[{"commit": {"message": "Add login\n\nDetails"}}])
+        if path == "/repos/org/app/pulls/7/reviews":
+            return httpx.Response(200, json={"id": 1})
+        return httpx.Response(404, json={"message": "Not Found"})
+
+    return GitHubService(GitHubClient(
+        token="t0ken", base_url="https://api.test", timeout_seconds=5, max_connections=4,
+        cache_max_bytes=0, cache_path="", transport=httpx.MockTransport(handler),
+    ), diff_cache)
+
+
+def test_paginates_and_maps_pull_request_endpoints():
+    requests = []
+    # Without GraphQL the REST endpoints are used
+    service = fake_github(requests, [make_file(n) for n in range(150)], graphql=False)
+
+    async def scenario():
+        try:
+            summary = await service.get_pr_diff_summary("org/app", 7)
+            commits = await service.get_pr_commits("org/app", 7)
+            diff = await service.get_pr_diff("org/app", 7)
+            await service.approve_pr("org/app", 7, "LGTM")
+            with pytest.raises(httpx.HTTPStatusError):
+                await service.get_pull_request("org/app", 8)
+        finally:
+            await service.close()
+        return summary, commits, diff
+
+    summary, commits, diff = asyncio.run(scenario())
+
+    assert summary["total_files"] == 150
+    assert summary["total_additions"] == 300
+    assert summary["file_types"] == {"py": {"count": 150, "additions": 300, "deletions": 150}}
+    assert len(summary["files"]) == 10
+    assert commits == ["Add login"]
+    assert len(diff) == 150 and diff[0]["patch"] == "@@ -1 +1 @@"
+    assert diff[0]["previous_filename"] is None
+
+    assert all(request.headers["Authorization"] == "Bearer t0ken" for request in requests)
+    assert requests[0].headers["X-GitHub-Api-Version"]
+    review = next(request for request in requests if request.url.path.endswith("/reviews"))
+    assert json.loads(review.content) == {"body": "LGTM", "event": "APPROVE"}
+    file_pages = [r for r in requests if r.url.path.endswith("/files")]
+    assert [r.url.params.get("per_page") for r in file_pages] == ["100", "100"] * 2
+
+
+def test_pr_summary_fetches_each_resource_once(monkeypatch):
+    requests = []
+    service = fake_github(requests, [make_file(n) for n in range(150)])
+
+    async def is_overloaded():
+        return False
+
+    async def analyze_pr_changes(**kwargs):
+        return {"functional_summary": "Adds login", "key_changes": []}
+
+    monkeypatch.setattr(pr_summary_service, "github_service", service)
+    monkeypatch.setattr(admission_controller, "is_overloaded", is_overloaded)
+    monkeypatch.setattr(ai_service, "analyze_pr_changes", analyze_pr_changes)
+    event = PullRequestEvent.model_validate({
+        "action": "opened",
+        "pull_request": {
+            "number": 7, "title": "Add login", "state": "open", "body": None,
+            "html_url": "https://github.com/org/app/pull/7", "user": {"login": "alice"},
+            "head": {"ref": "login", "sha": "sha1"}, "base": {"ref": "main", "sha": "base0"},
+        },
+        "repository": {"name": "app", "full_name": "org/app", "html_url": "https://github.com/org/app"},
+        "sender": {"login": "alice"},
+    })
+
+    async def scenario():
+        fetch = service.fetch_context("org/app", 7)
+        try:
+            summary = await pr_summary_service.generate_pr_summary(event, fetch)
+            # Later stages reuse the run's fetches
+            diff = await service.get_pr_diff("org/app", 7, fetch)
+        finally:
+            await service.close()
+        return fetch, summary, diff
+
+    fetch, summary, diff = asyncio.run(scenario())
+
+    assert summary["files_changed"] == 150 and len(diff) == 150
+    assert summary["additions"] == 300 and summary["key_files"][0] == "src/file0.py"
+    # Two GraphQL queries (files past 100 by cursor), then two pages of REST files with patches
+    assert fetch.requests == len(requests) == 4
+    paths = [request.url.path for request in requests]
+    assert paths == ["/graphql", "/graphql", "/repos/org/app/pulls/7/files",
+                     "/repos/org/app/pulls/7/files"]
+
+
+def test_graphql_batch_fetches_several_prs_in_one_query():
+    queries = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        queries.append(body)
+        node = graphql_pull_request([make_file(0)], 0)
+        return httpx.Response(200, json={
+            "data": {
+                "r0": {"name": "app", "nameWithOwner": "org/app", "url": "https://github.com/org/app",
+                       "p0_0": node | {"number": 7}, "p0_1": node | {"number": 8}, "p0_2": None},
+                "r1": {"name": "lib", "nameWithOwner": "org/lib", "url": "https://github.com/org/lib",
+                       "p1_0": node | {"number": 1, "state": "MERGED", "merged": True}},
+                "rateLimit": {"cost": 1, "remaining": 4998},
+            },
+            "errors": [{"type": "NOT_FOUND", "path": ["r0", "p0_2"],
+                        "message": "Could not resolve to a PullRequest with the number of 9."}],
+        })
+
+    client = GitHubClient(
+        token="t0ken", base_url="https://api.test", timeout_seconds=5, max_connections=4,
+        cache_max_bytes=0, cache_path="", transport=httpx.MockTransport(handler),
+    )
+
+    async def scenario():
+        try:
+            return await fetch_pull_requests(
+                client, [("org/app", 7), ("org/app", 8), ("org/app", 9), ("org/lib", 1)]
+            )
+        finally:
+            await client.close()
+
+    snapshots = asyncio.run(scenario())
+
+    assert len(queries) == 1
+    assert queries[0]["variables"] == {"o0": "org", "n0": "app", "o1": "org", "n1": "lib"}
+    assert set(snapshots) == {("org/app", 7), ("org/app", 8), ("org/lib", 1)}
+    merged = snapshots[("org/lib", 1)]
+    assert merged["state"] == "closed" and merged["merged"]
+    assert merged["repository"]["full_name"] == "org/lib"
+    assert merged["files"][0] == {"filename": "src/file0.py", "status": "modified",
+                                  "additions": 2, "deletions": 1, "changes": 3}
+    assert merged["commit_messages"] == ["Add login"]
+    # The snapshot validates as a webhook pull request
+    PullRequestEvent.model_validate({"action": "opened", "pull_request": merged,
+                                     "repository": merged["repository"], "sender": merged["user"]})
+
+
+def test_etag_cache_revalidates_and_persists(tmp_path):
+    revisions = {"/repos/org/app/pulls/1": 1, "/repos/org/app/pulls/2": 1}
+    conditional = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        etag = f'"{path}@{revisions[path]}"'
+        conditional.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={"ETag": etag, "X-RateLimit-Remaining": "4990"})
+        body = {"path": path, "revision": revisions[path], "padding": "x" * 100}
+        return httpx.Response(200, json=body, headers={"ETag": etag})
+
+    def make_client(max_bytes: int) -> GitHubClient:
+        return GitHubClient(
+            token="t0ken", base_url="https://api.test", timeout_seconds=5, max_connections=4,
+            cache_max_bytes=max_bytes, cache_path=str(tmp_path / "cache.json"),
+            transport=httpx.MockTransport(handler),
+        )
+
+    async def scenario():
+        client = make_client(10_000)
+        first = await client.get("/repos/org/app/pulls/1")
+        again = await client.get("/repos/org/app/pulls/1")
+        revisions["/repos/org/app/pulls/1"] = 2
+        changed = await client.get("/repos/org/app/pulls/1")
+        stats = client.stats()
+        await client.close()
+
+        # A restart revalidates against the saved ETags
+        restarted = make_client(10_000)
+        after_restart = await restarted.get("/repos/org/app/pulls/1")
+        restarted_stats = restarted.stats()
+        await restarted.close()
+
+        # Bounded: room for one body, so the least recently used one is evicted
+        small = make_client(200)
+        await small.get("/repos/org/app/pulls/1")
+        await small.get("/repos/org/app/pulls/2")
+        small_stats = small.stats()
+        await small.close()
+        return first, again, changed, after_restart, stats, restarted_stats, small_stats
+
+    first, again, changed, after_restart, stats, restarted_stats, small_stats = asyncio.run(
+        scenario()
+    )
+
+    assert again == first and first["revision"] == 1
+    assert changed["revision"] == 2 and after_restart == changed
+    assert conditional[:4] == [None, '"/repos/org/app/pulls/1@1"', '"/repos/org/app/pulls/1@1"',
+                               '"/repos/org/app/pulls/1@2"']
+    assert stats["cache_hits"] == 1 and stats["cache_misses"] == 2
+    assert stats["rate_limit_saved"] == 1 and stats["rate_limit_remaining"] == 4990
+    assert restarted_stats["cache_hits"] == 1 and restarted_stats["cache_misses"] == 0
+    assert small_stats["cache_entries"] == 1 and small_stats["cache_bytes"] <= 200
+
+
+def test_etag_cache_is_kept_per_credential_and_304s_carry_the_budget():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        token = request.headers["Authorization"].removeprefix("Bearer ")
+        seen.append((token, request.headers.get("If-None-Match")))
+        # The same ETag for both tokens: only the key keeps their bodies apart
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304, headers={
+                "ETag": '"v1"', "X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "4321",
+                "X-RateLimit-Reset": str(int(time.time()) + 3600),
+            })
+        return httpx.Response(200, json={"seen_by": token}, headers={"ETag": '"v1"'})
+
+    client = GitHubClient(
+        credentials=CredentialPool(["alice", "bob"]), base_url="https://api.test",
+        timeout_seconds=5, max_connections=4, cache_max_bytes=10_000, cache_path="",
+        scheduler=GitHubScheduler({}), transport=httpx.MockTransport(handler),
+    )
+
+    async def scenario():
+        bodies = [await client.get("/repos/org/private") for _ in range(2)]
+        revalidated = await client.request("GET", "/repos/org/private")
+        await client.close()
+        return bodies, revalidated
+
+    bodies, revalidated = asyncio.run(scenario())
+
+    assert bodies == [{"seen_by": "alice"}, {"seen_by": "bob"}]
+    assert seen == [("alice", None), ("bob", None), ("alice", '"v1"')]
+    assert revalidated.json() == {"seen_by": "alice"}
+    assert revalidated.headers["x-ratelimit-remaining"] == "4321"
+    assert client.scheduler.stats()["rate_limits"]["token-1:core"]["remaining"] == 4321
+    assert all("alice" not in key and "bob" not in key for key in client.cache._entries)
+
+
+def test_scheduler_keeps_the_last_of_the_budget_for_higher_lanes():
+    scheduler = GitHubScheduler({Lane.WEBHOOK: 0.1, Lane.BACKGROUND: 0.3}, burst_ratio=0.1)
+    scheduler.observe("core", httpx.Response(200, headers={
+        "X-RateLimit-Limit": "100", "X-RateLimit-Remaining": "20",
+        "X-RateLimit-Reset": str(int(time.time()) + 60), "X-RateLimit-Resource": "core",
+    }))
+
+    async def call(lane: Lane) -> bool:
+        """Whether a call in `lane` is let through right away."""
+        async def enter():
+            with github_lane(lane):
+                async with scheduler.slot("core"):
+                    pass
+        try:
+            await asyncio.wait_for(enter(), 0.2)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def scenario():
+        return [await call(Lane.INTERACTIVE), await call(Lane.WEBHOOK),
+                await call(Lane.WEBHOOK), await call(Lane.BACKGROUND),
+                await call(Lane.INTERACTIVE)]
+
+    # Webhooks may burst 10% of what is above their reserve (one call), then
+    # are paced; background calls are below their reserve and wait for the reset
+    assert asyncio.run(scenario()) == [True, True, False, False, True]
+    stats = scheduler.stats()
+    assert stats["throttled"] == {"interactive": 0, "webhook": 1, "background": 1}
+    assert stats["rate_limits"]["core"]["remaining"] == 17
+
+
+def test_rate_limited_calls_pause_and_retry():
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0.1"}, json={"message": "secondary rate limit"}),
+        httpx.Response(200, json={"number": 7}),
+        httpx.Response(403, json={"message": "Resource not accessible by integration"}),
+    ]
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(time.monotonic())
+        return responses.pop(0)
+
+    client = GitHubClient(
+        token="t0ken", base_url="https://api.test", timeout_seconds=5, max_connections=4,
+        cache_max_bytes=0, cache_path="", max_retry_wait_seconds=5,
+        scheduler=GitHubScheduler({}), transport=httpx.MockTransport(handler),
+    )
+
+    async def scenario():
+        try:
+            pull_request = await client.get("/repos/org/app/pulls/7")
+            # A permission error is not a rate limit: no retry
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.request("POST", "/repos/org/app/pulls/7/reviews", json={})
+        finally:
+            await client.close()
+        return pull_request
+
+    assert asyncio.run(scenario()) == {"number": 7}
+    assert len(sent) == 3 and sent[1] - sent[0] >= 0.09
+    assert client.scheduler.rate_limited == 1
+
+
+def test_calls_fail_fast_when_the_budget_is_spent_for_longer_than_the_retry_wait():
+    reset_at = int(time.time()) + 3600
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request.url.path)
+        return httpx.Response(200, json={"number": 7}, headers={
+            "X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "0",
+            "X-RateLimit-Reset": str(reset_at),
+        })
+
+    client = GitHubClient(
+        token="t0ken", base_url="https://api.test", timeout_seconds=5, max_connections=4,
+        cache_max_bytes=0, cache_path="", max_retry_wait_seconds=5,
+        scheduler=GitHubScheduler({}), transport=httpx.MockTransport(handler),
+    )
+
+    async def scenario():
+        try:
+            await client.get("/repos/org/app/pulls/7")
+            started = time.monotonic()
+            with pytest.raises(GitHubRateLimitError) as refused:
+                await client.get("/repos/org/app/pulls/7")
+            return refused.value, time.monotonic() - started
+        finally:
+            await client.close()
+
+    error, waited = asyncio.run(scenario())
+
+    # The budget only comes back at the reset, an hour away: no sleeping until then
+    assert len(sent) == 1 and waited < 1
+    assert reset_at - time.time() - 5 < error.retry_after <= reset_at - time.time() + 1
+
+
+def test_owners_with_the_app_installed_use_installation_tokens():
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    expiries = [time.time() + 200, time.time() + 3600]
+    minted = []
+    used = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        authorization = request.headers["Authorization"].removeprefix("Bearer ")
+        if path.startswith("/app/"):
+            claims = jwt.decode(authorization, private_key.public_key(), algorithms=["RS256"])
+            assert claims["iss"] == "42"
+        if path == "/app/installations":
+            return httpx.Response(200, json=[{"id": 11, "account": {"login": "Org"}}])
+        if path == "/app/installations/11/access_tokens":
+            minted.append(f"installation-{len(minted) + 1}")
+            expires_at = datetime.fromtimestamp(expiries.pop(0), timezone.utc)
+            return httpx.Response(201, json={
+                "token": minted[-1], "expires_at": expires_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            })
+        used.setdefault(path, []).append(authorization)
+        return httpx.Response(200, json={})
+
+    client = GitHubClient(
+        credentials=CredentialPool(["p4t"], GitHubApp("42", pem)),
+        base_url="https://api.test", timeout_seconds=5, max_connections=4,
+        cache_max_bytes=0, cache_path="", scheduler=GitHubScheduler({}),
+        transport=httpx.MockTransport(handler),
+    )
+
+    async def scenario():
+        try:
+            for _ in range(3):
+                await client.get("/repos/org/app/pulls/7")
+            await client.get("/repos/someone/lib/pulls/1")
+            await client.get("/rate_limit")
+        finally:
+            await client.close()
+
+    asyncio.run(scenario())
+    # The first token expires within the refresh margin, so the next call mints another
+    assert used["/repos/org/app/pulls/7"] == ["installation-1", "installation-2", "installation-2"]
+    assert used["/repos/someone/lib/pulls/1"] == ["p4t"] and used["/rate_limit"] == ["p4t"]
+    assert client.stats()["credentials"] == {"token-1": 2, "installation:org": 3}
+
+
+def test_calls_go_to_the_token_with_the_most_budget_left():
+    remaining = {"first": "100", "second": "4000"}
+    used = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        token = request.headers["Authorization"].removeprefix("Bearer ")
+        used.append(token)
+        if token == "second" and used.count("second") == 2:
+            return httpx.Response(429, headers={"Retry-After": "30"}, json={})
+        return httpx.Response(200, json={}, headers={
+            "X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": remaining[token],
+            "X-RateLimit-Reset": str(int(time.time()) + 3600),
+        })
+
+    client = GitHubClient(
+        credentials=CredentialPool(["first", "second"]),
+        base_url="https://api.test", timeout_seconds=5, max_connections=4,
+        cache_max_bytes=0, cache_path="", max_retry_wait_seconds=60,
+        scheduler=GitHubScheduler({}), transport=httpx.MockTransport(handler),
+    )
+
+    async def scenario():
+        try:
+            for n in range(3):
+                await asyncio.wait_for(client.get(f"/repos/org/app/pulls/{n}"), 5)
+        finally:
+            await client.close()
+
+    asyncio.run(scenario())
+    # Unknown budgets count as full; the paused token's retry moves to the other one
+    assert used == ["first", "second", "second", "first"]
+    stats = client.stats()
+    assert stats["rate_limits"]["token-1:core"]["remaining"] == 100
+    # Less the refused call, which reported no budget
+    assert stats["rate_limits"]["token-2:core"]["remaining"] == 3999
+    assert stats["paused_seconds"] > 0
+
+
+def test_pr_diffs_are_cached_on_disk_per_head(tmp_path):
+    requests = []
+    files = [make_file(n) for n in range(150)]
+
+    async def view(head_sha: str | None):
+        service = fake_github(requests, files, diff_cache=DiffCache(1_000_000, tmp_path))
+        try:
+            return await service.get_pr_diff("org/app", 7, head_sha=head_sha)
+        finally:
+            await service.close()
+
+    fetched = asyncio.run(view(None))
+    sent = len(requests)
+    # After a restart, a view of the known head is answered from disk
+    cached = asyncio.run(view(HEAD))
+    # A head never fetched (e.g. after a push) is a miss
+    asyncio.run(view("b" * 40))
+
+    # The PR's head, then two pages of files
+    assert sent == 3 and len(requests) == 6
+    assert cached == fetched and cached[0]["patch"] == "@@ -1 +1 @@"
+
+
+def test_diff_cache_shares_patches_and_evicts_least_recently_viewed_heads(tmp_path):
+    def diff(*versions: str) -> list[dict]:
+        # Patches that don't compress much, ~370 bytes each on disk
+        return [
+            make_file(n) | {"patch": "".join(
+                hashlib.sha256(f"{version}{line}".encode()).hexdigest() for line in range(10)
+            )}
+            for n, version in enumerate(versions)
+        ]
+
+    heads = ["1" * 40, "2" * 40, "3" * 40]
+    cache = DiffCache(2_000, tmp_path)
+
+    async def scenario():
+        await cache.put("org/app", heads[0], diff("a", "b"))
+        # The second head changes one file: the other patch is stored once
+        await cache.put("org/app", heads[1], diff("a", "c"))
+        shared = cache.stats()
+        await cache.get("org/app", heads[0])
+        # Over the limit: the head viewed least recently goes, then its own patches
+        await cache.put("org/app", heads[2], diff("d"))
+        return shared, [await cache.get("org/app", head) is not None for head in heads]
+
+    shared, present = asyncio.run(scenario())
+    assert shared["entries"] == 2 and shared["patches"] == 3
+    assert present == [True, False, True]
+    stats = cache.stats()
+    assert stats["patches"] == 3 and stats["bytes"] <= 2_000
+    assert len(list(tmp_path.glob("patches/*/*"))) == 3
+    # Indexed again from disk after a restart
+    restarted = DiffCache(2_000, tmp_path)
+    assert asyncio.run(restarted.get("org/app", heads[2])) == diff("d")
+    assert restarted.stats() == stats | {"hits": 1, "misses": 0}
@@ -3,6 +3,7 @@ Test script to send notifications/actions to GitHub.
 This simulates what happens when a user clicks action buttons in Slack.
 """
 import asyncio
+import httpx
 from app.services.github_service import github_service
 from github import GithubException
 
@@ -91,9 +92,10 @@ async def test_github_interactions():
                     print("   Skipping approval test to avoid unintended side effects.")
                     print()
 
-                except GithubException as e:
-                    print(f"   ❌ Failed to add comment: {e.status} - {e.data.get('message', 'Unknown error')}")
-                    if e.status == 422:
+                except httpx.HTTPStatusError as e:
+                    status = e.response.status_code
+                    print(f"   ❌ Failed to add comment: {status} - {e.response.json().get('message', 'Unknown error')}")
+                    if status == 422:
                         print("   Note: You might not have permission to review this PR")
                     print()
 
@@ -0,0 +1,57 @@
+import hashlib
+import hmac
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.utils.github_signature import verify_github_signature
+
+app = FastAPI()
+
+
+@app.post("/hook")
+async def hook(request: Request):
+    body = await verify_github_signature(request)
+    return {"size": len(body)}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "webhook_max_body_bytes", 1000)
+    return TestClient(app)
+
+
+def sign(body: bytes) -> str:
+    return "sha256=" + hmac.new(
+        settings.github_webhook_secret.encode(), body, hashlib.sha256
+    ).hexdigest()
+
+
+def chunked(body: bytes, size: int = 100):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def test_streamed_body_is_verified_and_returned(client):
+    body = b"x" * 1000
+
+    signed = client.post("/hook", content=chunked(body), headers={"X-Hub-Signature-256": sign(body)})
+    forged = client.post("/hook", content=body, headers={"X-Hub-Signature-256": sign(b"other")})
+    unsigned = client.post("/hook", content=body)
+
+    assert signed.status_code == 200
+    assert signed.json() == {"size": 1000}
+    assert forged.status_code == unsigned.status_code == 403
+
+
+def test_oversized_bodies_are_rejected_with_413(client):
+    body = b"x" * 1001
+    headers = {"X-Hub-Signature-256": sign(body)}
+
+    declared = client.post("/hook", content=body, headers=headers)
+    # No Content-Length: rejected once the stream passes the limit
+    streamed = client.post("/hook", content=chunked(body), headers=headers)
+
+    assert declared.status_code == streamed.status_code == 413
@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+from app import database
+from app.models.github import PullRequestEvent
+from app.routes import github
+from app.services import pr_summary_service
+from app.services.ai_service import ai_service
+from app.services.github_service import github_service
+
+ANALYSIS = {
+    "functional_summary": "Adds login",
+    "scope_of_change": "Backend",
+    "key_changes": ["Login endpoint", "Session table"],
+    "risk_assessment": "Low risk",
+    "review_focus_areas": ["Session expiry"],
+}
+
+
+def pr_payload(action: str, head_sha: str, number: int = 7, **extra) -> str:
+    return json.dumps({
+        "action": action,
+        "pull_request": {
+            "number": number, "title": "Add login", "state": "open", "body": "Login",
+            "html_url": f"https://github.com/org/app/pull/{number}",
+            "user": {"login": "alice"},
+            "head": {"ref": "login", "sha": head_sha}, "base": {"ref": "main", "sha": "base0"},
+            "additions": 120, "deletions": 10, "changed_files": 6,
+        },
+        "repository": {"name": "app", "full_name": "org/app", "html_url": "https://github.com/org/app"},
+        "sender": {"login": "alice"},
+        **extra,
+    })
+
+
+def test_pushes_are_analyzed_incrementally_and_versioned(backend, monkeypatch):
+    compared, full_runs, prefetched = [], [], []
+
+    async def compare_commits(repository, base_sha, head_sha):
+        compared.append((base_sha, head_sha))
+        status = "diverged" if head_sha == "sha4" else "ahead"
+        files = [{"filename": "tests/test_login.py", "status": "added",
+                  "additions": 40, "deletions": 0, "changes": 40}]
+        return {"status": status, "commit_messages": ["Test login"], "files": files,
+                "total_files": 1, "total_additions": 40, "total_deletions": 0}
+
+    async def analyze_pr_update(pr_title, previous_analysis, file_changes, commit_messages, diff_stats):
+        return {"update_summary": "Adds login tests", "functional_summary": "",
+                "key_changes": ["Login tests"], "risk_assessment": "",
+                "review_focus_areas": ["Test fixtures"]}
+
+    async def generate_pr_summary(event):
+        full_runs.append(event.pull_request.head.sha)
+        return {"summary_text": "Adds login", "files_changed": 6, "additions": 120,
+                "deletions": 10, "complexity": "Medium", "ai_analysis": ANALYSIS}
+
+    async def prefetch_pr_diff(repository, number, head_sha):
+        prefetched.append(head_sha)
+
+    monkeypatch.setattr(github_service, "compare_commits", compare_commits)
+    monkeypatch.setattr(github_service, "prefetch_pr_diff", prefetch_pr_diff)
+    monkeypatch.setattr(ai_service, "analyze_pr_update", analyze_pr_update)
+    monkeypatch.setattr(pr_summary_service, "generate_pr_summary", generate_pr_summary)
+    monkeypatch.setattr(github, "generate_pr_summary", generate_pr_summary)
+
+    async def scenario():
+        await database.init_db()
+        try:
+            await github.handle_pull_request_event(pr_payload("opened", "sha1"))
+            pushed = pr_payload("synchronize", "sha2", before="sha1", after="sha2")
+            await github.handle_pull_request_event(pushed)
+            # A redelivered push finds its head already analyzed
+            await github.handle_pull_request_event(pushed)
+            await github.handle_pull_request_event(
+                pr_payload("synchronize", "sha4", before="sha3", after="sha4")
+            )
+            # Pushes to PRs without a notification are not analyzed
+            await github.handle_pull_request_event(
+                pr_payload("synchronize", "sha9", number=8, before="sha8", after="sha9")
+            )
+            notification = await database.get_notification_by_pr("org/app", 7)
+            return await database.get_analysis_versions(notification["id"])
+        finally:
+            await database.close_db()
+
+    versions = asyncio.run(scenario())
+
+    # sha2 extends the analyzed sha1; sha4 was force-pushed over it
+    assert compared == [("sha1", "sha2"), ("sha2", "sha4")]
+    assert full_runs == ["sha1", "sha4"]
+    # Each head's diff is cached for the viewer; PR #8 has no notification to view
+    assert prefetched == ["sha1", "sha2", "sha2", "sha4"]
+    assert [(v["version"], v["head_sha"]) for v in versions] == [(3, "sha4"), (2, "sha2"), (1, "sha1")]
+
+    incremental = versions[1]
+    assert incremental["changes"]["update_summary"] == "Adds login tests"
+    assert (incremental["changes"]["base_sha"], incremental["changes"]["commits"]) == ("sha1", 1)
+    merged = incremental["ai_analysis"]
+    assert merged["functional_summary"] == "Adds login"
+    assert merged["key_changes"] == ["Login tests", "Login endpoint", "Session table"]
+    assert merged["risk_assessment"] == "Low risk"
+    assert merged["review_focus_areas"] == ["Test fixtures"]
+    assert merged["latest_update"] == {"summary": "Adds login tests", "head_sha": "sha2"}
+    assert versions[0]["changes"] is None
+
+
+def test_coalesced_pushes_keep_the_first_base():
+    merged = github.merge_pull_request_events(
+        pr_payload("synchronize", "sha2", before="sha1", after="sha2"),
+        pr_payload("synchronize", "sha3", before="sha2", after="sha3"),
+    )
+    event = PullRequestEvent.model_validate_json(merged)
+
+    assert (event.action, event.before, event.after) == ("synchronize", "sha1", "sha3")
+
+
+def test_closed_prs_are_marked_merged_or_closed(backend, monkeypatch):
+    async def generate_pr_summary(event):
+        return {"summary_text": "Adds login", "files_changed": 6, "additions": 120,
+                "deletions": 10, "complexity": "Medium", "ai_analysis": ANALYSIS}
+
+    async def prefetch_pr_diff(repository, number, head_sha):
+        pass
+
+    monkeypatch.setattr(github, "generate_pr_summary", generate_pr_summary)
+    monkeypatch.setattr(github_service, "prefetch_pr_diff", prefetch_pr_diff)
+
+    def closed(number: int, merged: bool, action: str = "closed") -> str:
+        payload = json.loads(pr_payload(action, "sha1", number=number))
+        payload["pull_request"] |= {"state": "closed", "merged": merged}
+        return json.dumps(payload)
+
+    async def scenario():
+        await database.init_db()
+        try:
+            for number in (7, 8):
+                await github.handle_pull_request_event(pr_payload("opened", "sha1", number=number))
+            await github.handle_pull_request_event(closed(7, merged=True))
+            await github.handle_pull_request_event(closed(8, merged=False))
+            # Opened and closed within one coalesced burst: analyzed, then closed
+            await github.handle_pull_request_event(closed(9, merged=False, action="opened"))
+            # No notification to update
+            await github.handle_pull_request_event(closed(10, merged=True))
+            return [
+                (await database.get_notification_by_pr("org/app", number) or {}).get("status")
+                for number in (7, 8, 9, 10)
+            ]
+        finally:
+            await database.close_db()
+
+    assert asyncio.run(scenario()) == ["merged", "closed", "closed", None]
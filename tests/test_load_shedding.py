@@ -0,0 +1,101 @@
+import asyncio
+
+from app import database
+from app.models.github import PullRequestEvent
+from app.services import pr_summary_service
+from app.services.admission_control import AdmissionController, admission_controller
+from app.services.ai_service import ai_service
+from app.services.github_service import github_service
+
+
+def make_event() -> PullRequestEvent:
+    return PullRequestEvent.model_validate({
+        "action": "opened",
+        "pull_request": {
+            "number": 3, "title": "Add billing", "state": "open", "body": None,
+            "html_url": "https://github.com/org/app/pull/3", "user": {"login": "alice"},
+            "head": {"ref": "billing", "sha": "sha1"}, "base": {"ref": "main", "sha": "base0"},
+            "additions": 30, "deletions": 5, "changed_files": 4,
+        },
+        "repository": {"name": "app", "full_name": "org/app", "html_url": "https://github.com/org/app"},
+        "sender": {"login": "alice"},
+    })
+
+
+def test_shedding_starts_past_a_limit_and_stops_under_the_recovery_level():
+    controller = AdmissionController(
+        max_queue_depth=0, max_llm_in_flight=4, max_llm_p95_seconds=0.05, recover_ratio=0.5
+    )
+
+    async def scenario():
+        states = []
+        for in_flight in (3, 4, 3, 2, 1):
+            controller.llm_in_flight = in_flight
+            states.append(await controller.is_overloaded())
+        controller.llm_in_flight = 0
+        async with controller.track_llm_call():
+            await asyncio.sleep(0.06)
+        states.append(await controller.is_overloaded())
+        return states
+
+    assert asyncio.run(scenario()) == [False, True, True, True, False, True]
+    assert controller.llm_in_flight == 0
+
+
+def test_saturated_pipeline_saves_heuristic_summaries_and_backfills_them(backend, monkeypatch):
+    overloaded = True
+    calls = []
+
+    async def is_overloaded():
+        return overloaded
+
+    async def get_pr_diff_summary(repository, number, fetch=None):
+        calls.append("github")
+        return {"total_files": 4, "total_additions": 30, "total_deletions": 5,
+                "file_types": {}, "files": []}
+
+    async def get_pr_commits(repository, number, fetch=None):
+        return []
+
+    async def analyze_pr_changes(**kwargs):
+        calls.append("llm")
+        return {"functional_summary": "Adds billing", "key_changes": ["Invoices"]}
+
+    monkeypatch.setattr(admission_controller, "is_overloaded", is_overloaded)
+    monkeypatch.setattr(admission_controller, "summaries_shed", 0)
+    monkeypatch.setattr(admission_controller, "analyses_backfilled", 0)
+    monkeypatch.setattr(github_service, "get_pr_diff_summary", get_pr_diff_summary)
+    monkeypatch.setattr(github_service, "get_pr_commits", get_pr_commits)
+    monkeypatch.setattr(ai_service, "analyze_pr_changes", analyze_pr_changes)
+
+    async def scenario():
+        nonlocal overloaded
+        await database.init_db()
+        try:
+            shed = await pr_summary_service.generate_pr_summary(make_event())
+            notification_id = await database.save_notification(make_event(), shed)
+            saved = await database.get_notification_by_id(notification_id, include_details=True)
+            held_back = await pr_summary_service.backfill_pending_analyses(10)
+            overloaded = False
+            backfilled = await pr_summary_service.backfill_pending_analyses(10)
+            return (shed, saved, held_back, backfilled,
+                    await database.get_notification_by_id(notification_id, include_details=True),
+                    await database.get_analysis_versions(notification_id))
+        finally:
+            await database.close_db()
+
+    shed, saved, held_back, backfilled, final, versions = asyncio.run(scenario())
+
+    assert shed["analysis_pending"] is True
+    assert saved["analysis_pending"] is True
+    assert saved["summary"] == "Changes in 4 files"
+    assert "pending" in saved["ai_analysis"]["risk_assessment"]
+    assert held_back == 0
+    # Nothing slow ran until the load dropped
+    assert calls == ["github", "llm"]
+    assert backfilled == 1
+    assert final["analysis_pending"] is False
+    assert final["ai_analysis"]["functional_summary"] == "Adds billing"
+    assert final["event_count"] == 1
+    assert [v["head_sha"] for v in versions] == ["sha1", "sha1"]
+    assert admission_controller.summaries_shed == 1
@@ -116,14 +116,14 @@ def test_webhook():
         print(f"Response: {response.text}")
         print()
 
-        if response.status_code == 200:
-            print("✅ Webhook processed successfully!")
+        if response.status_code == 202:
+            print("✅ Webhook queued successfully!")
             print()
             print("📝 What happened:")
             print("   1. ✅ Server received the webhook")
             print("   2. ✅ Signature validation passed")
-            print("   3. ✅ PR event was parsed")
-            print("   4. ✅ AI analysis was triggered (via Nerd-Completion)")
+            print("   3. ✅ Event was queued (see /health/queue)")
+            print("   4. ✅ A worker parses it and runs the AI analysis (via Nerd-Completion)")
             print("   5. ⚠️  Slack notification attempted (will fail without real Slack token)")
             print()
             print("💡 To see full Slack integration:")
@@ -0,0 +1,296 @@
+import asyncio
+import hashlib
+import hmac
+import json
+
+from fastapi.testclient import TestClient
+
+from app import database
+from app.config import settings
+from app.main import app
+from app.routes import github
+from app.services.github_scheduler import GitHubRateLimitError
+from app.services.webhook_queue import (
+    RecentDeliveries,
+    WebhookQueue,
+    parse_repository_weights,
+    webhook_queue as queue,
+)
+
+
+def make_queue(**overrides):
+    options = dict(
+        workers=2, max_attempts=3, retry_base_seconds=0, retry_max_seconds=0,
+        lease_seconds=60, poll_interval=0.01, delivery_cache_size=100,
+        coalesce_seconds=0, coalesce_max_seconds=0, repo_concurrency=0, repo_weights={},
+    )
+    return WebhookQueue(**options | overrides)
+
+
+async def wait_until(condition, timeout=5.0):
+    for _ in range(int(timeout / 0.01)):
+        if await condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+def test_workers_retry_failures_and_dead_letter_poison_jobs(backend):
+    calls = []
+
+    async def handler(event_type, payload):
+        n = json.loads(payload)["n"]
+        calls.append(n)
+        if n == 2 and calls.count(2) == 1:
+            raise RuntimeError("flaky")
+        if n == 3:
+            raise RuntimeError("poison")
+
+    async def scenario():
+        await database.init_db()
+        queue = make_queue()
+        try:
+            await queue.start(handler)
+            for n in (1, 2, 3):
+                await queue.enqueue("pull_request", json.dumps({"n": n}))
+
+            async def drained():
+                stats = await queue.stats()
+                return stats["queued"] == stats["running"] == 0
+            await wait_until(drained)
+            return await queue.stats()
+        finally:
+            await queue.stop()
+            await database.close_db()
+
+    stats = asyncio.run(scenario())
+
+    assert sorted(calls) == [1, 2, 2, 3, 3, 3]
+    assert stats["dead"] == 1
+    assert (stats["processed"], stats["retried"], stats["dead_lettered"]) == (2, 3, 1)
+
+
+def test_rate_limited_jobs_wait_for_the_budget_reset_instead_of_failing(backend):
+    calls = []
+
+    async def handler(event_type, payload):
+        calls.append(payload)
+        raise GitHubRateLimitError("budget spent", 3600)
+
+    async def scenario():
+        await database.init_db()
+        # One attempt allowed: a real failure would be dead-lettered
+        queue = make_queue(max_attempts=1)
+        try:
+            await queue.start(handler)
+            job_id = await queue.enqueue("pull_request", "{}")
+
+            async def requeued():
+                return queue.jobs_retried == 1
+            await wait_until(requeued)
+            async with backend.pool.reader() as db:
+                cursor = await db.execute(
+                    "SELECT status, (julianday(run_after) - julianday('now')) * 86400 AS wait"
+                    " FROM webhook_jobs WHERE id = ?", (job_id,)
+                )
+                job = await cursor.fetchone()
+            return queue.jobs_dead, job["status"], job["wait"]
+        finally:
+            await queue.stop()
+            await database.close_db()
+
+    dead, status, wait = asyncio.run(scenario())
+
+    assert calls == ["{}"] and dead == 0
+    assert status == "queued" and 3590 < wait <= 3600
+
+
+def test_jobs_interrupted_by_a_crash_run_after_restart(backend):
+    handled = []
+
+    async def handler(event_type, payload):
+        handled.append(json.loads(payload))
+
+    async def scenario():
+        await database.init_db()
+        try:
+            await database.enqueue_job("pull_request", '{"n": 1}')
+            # A worker claimed it and then the process died
+            await database.claim_jobs(1, lease_seconds=900)
+
+            queue = make_queue()
+            await queue.start(handler)
+            try:
+                async def done():
+                    return (await queue.stats())["processed"] == 1
+                await wait_until(done)
+            finally:
+                await queue.stop()
+        finally:
+            await database.close_db()
+
+    asyncio.run(scenario())
+
+    assert handled == [{"n": 1}]
+
+
+def test_burst_for_one_pr_runs_the_handler_once_with_the_latest_state(backend):
+    handled = []
+
+    async def handler(event_type, payload):
+        handled.append(json.loads(payload))
+
+    def event(action, title):
+        return json.dumps({
+            "action": action,
+            "repository": {"full_name": "org/repo"},
+            "pull_request": {"number": 7, "title": title},
+        })
+
+    async def scenario():
+        await database.init_db()
+        queue = make_queue(coalesce_seconds=2, coalesce_max_seconds=5)
+        try:
+            await queue.start(handler)
+            for action, title in [("opened", "v1"), ("review_requested", "v1"),
+                                  ("synchronize", "v2")]:
+                await queue.enqueue(
+                    "pull_request", event(action, title), None, "org/repo#7",
+                    github.merge_pull_request_events,
+                )
+
+            async def done():
+                return (await queue.stats())["processed"] == 1
+            await wait_until(done)
+            return await queue.stats()
+        finally:
+            await queue.stop()
+            await database.close_db()
+
+    stats = asyncio.run(scenario())
+
+    assert len(handled) == 1
+    assert handled[0]["pull_request"]["title"] == "v2"
+    assert handled[0]["action"] == "review_requested"
+    assert handled[0]["coalesced_actions"] == ["opened", "review_requested", "synchronize"]
+    assert stats["events_coalesced"] == 2
+
+
+def test_busy_repository_neither_starves_others_nor_takes_every_worker(backend):
+    running, peak, finished = {}, {}, []
+
+    async def handler(event_type, payload):
+        repository = json.loads(payload)["repository"]
+        running[repository] = running.get(repository, 0) + 1
+        peak[repository] = max(peak.get(repository, 0), running[repository])
+        await asyncio.sleep(0.02)
+        running[repository] -= 1
+        finished.append(repository)
+
+    async def scenario():
+        await database.init_db()
+        queue = make_queue(workers=4, repo_concurrency=2, repo_weights={})
+        try:
+            # The backlog is queued before the workers start, so claims see all of it
+            for repository in ["org/mono"] * 20 + ["org/small-a", "org/small-b"]:
+                await queue.enqueue(
+                    "pull_request", json.dumps({"repository": repository}), repository=repository
+                )
+            await queue.start(handler)
+
+            async def done():
+                return len(finished) == 22
+            await wait_until(done)
+        finally:
+            await queue.stop()
+            await database.close_db()
+
+    asyncio.run(scenario())
+
+    assert peak["org/mono"] == 2
+    # The small repositories' jobs ran in the first wave, not after the backlog
+    assert finished.index("org/small-a") < 4 and finished.index("org/small-b") < 4
+
+
+def test_repository_weights_parse_from_settings_text():
+    assert parse_repository_weights(" org/a=2, org/b=0.5 ,,org/c=0, bad, org/d=x") == {
+        "org/a": 2.0, "org/b": 0.5,
+    }
+
+
+def test_recent_deliveries_evict_least_recently_seen():
+    recent = RecentDeliveries(2)
+    recent.add("a")
+    recent.add("b")
+    assert "a" in recent  # Refreshes "a"
+    recent.add("c")
+
+    assert ("a" in recent, "b" in recent, "c" in recent) == (True, False, True)
+    assert len(recent) == 2
+
+
+def test_webhook_endpoint_queues_and_acknowledges(backend, monkeypatch):
+    handled = asyncio.Queue()
+
+    async def process(event_type, payload):
+        handled.put_nowait((event_type, json.loads(payload)))
+
+    monkeypatch.setattr(github, "process_webhook_event", process)
+    monkeypatch.setattr(queue, "coalesce_seconds", 0)
+    duplicates_before = queue.duplicate_deliveries
+    event = {
+        "action": "opened",
+        "pull_request": {"number": 1},
+        "repository": {"full_name": "org/repo"},
+    }
+    body = json.dumps(event).encode()
+
+    def post(event_type, delivery_id, body=body, signature=None):
+        signature = signature or "sha256=" + hmac.new(
+            settings.github_webhook_secret.encode(), body, hashlib.sha256
+        ).hexdigest()
+        return client.post("/webhooks/github", content=body, headers={
+            "X-GitHub-Event": event_type,
+            "X-GitHub-Delivery": delivery_id,
+            "X-Hub-Signature-256": signature,
+        })
+
+    with TestClient(app) as client:
+        queued = post("pull_request", "delivery-1")
+        redelivered = post("pull_request", "delivery-1")
+        ignored = post("star", "delivery-2")
+        rejected = post("pull_request", "delivery-3", signature="sha256=0")
+        labeled = post("pull_request", "delivery-4", json.dumps(event | {"action": "labeled"}).encode())
+        malformed = post("pull_request", "delivery-5", b'{"action": "opened"}')
+        delivered = client.portal.call(asyncio.wait_for, handled.get(), 5)
+        # Another process (or a restart) only has the database to go by
+        monkeypatch.setattr(queue, "recent_deliveries", RecentDeliveries(10))
+        redelivered_later = post("pull_request", "delivery-1")
+        depth = client.get("/health/queue").json()
+
+    assert queued.status_code == 202
+    assert queued.json()["status"] == "queued"
+    assert redelivered.status_code == redelivered_later.status_code == 200
+    assert redelivered.json()["status"] == redelivered_later.json()["status"] == "duplicate"
+    assert ignored.status_code == labeled.status_code == 200
+    assert labeled.json()["status"] == "ignored"
+    assert rejected.status_code == 403
+    assert malformed.status_code == 400
+    assert delivered == ("pull_request", event)
+    assert handled.empty()
+    assert depth["workers"] >= 1
+    assert depth["duplicate_deliveries"] - duplicates_before == 2
+
+
+def test_pull_request_event_decodes_only_the_fields_it_declares():
+    from tests.test_webhook_endpoint import webhook_payload
+    body = json.dumps(webhook_payload | {"coalesced_actions": ["opened", "synchronize"]})
+
+    event = github.PullRequestEvent.model_validate_json(body)
+
+    assert github.peek_action(body.encode()) == "opened"
+    assert github.peek_action(b'{"zen": "Keep it simple", "action": "opened"}') is None
+    assert (event.pull_request.head.ref, event.pull_request.base.sha) == (
+        "feature/websocket-notifications", "abc123xyz789"
+    )
+    assert event.coalesced_actions == ["opened", "synchronize"]
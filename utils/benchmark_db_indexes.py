@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Benchmark dashboard queries before and after the index migrations.
+
+Builds a throwaway database per size, times each hot query on the base schema,
+applies the migrations and times them again, printing the SQLite query plans.
+
+Usage: python3 utils/benchmark_db_indexes.py [--sizes 10000 100000 1000000] [--runs 20]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import aiosqlite
+
+from app.db_migrations import apply_migrations
+
+STATUSES = (
+    ["pending"] * 5 + ["approved"] * 40 + ["commented"] * 15
+    + ["changes_requested"] * 10 + ["merged"] * 20 + ["closed"] * 10
+)
+REPOSITORIES = [f"org-{i % 5}/repo-{i}" for i in range(50)]
+
+# Later migrations reshape the schema; stop after the index migration so the
+# before/after comparison only measures the indexes
+INDEX_MIGRATION = 1
+
+QUERIES = {
+    "list_pending": (
+        "SELECT * FROM notifications WHERE status = ? ORDER BY created_at DESC LIMIT 20",
+        ("pending",),
+    ),
+    "list_all": (
+        "SELECT * FROM notifications ORDER BY created_at DESC LIMIT 20",
+        (),
+    ),
+    "stats": (
+        "SELECT status, COUNT(*) AS count FROM notifications GROUP BY status",
+        (),
+    ),
+    "pr_lookup": (
+        "SELECT * FROM notifications WHERE repository = ? AND pr_number = ?"
+        " ORDER BY id DESC LIMIT 1",
+        (REPOSITORIES[7], 1234),
+    ),
+    "actions": (
+        "SELECT * FROM user_actions WHERE notification_id = ? ORDER BY created_at",
+        (4321,),
+    ),
+}
+
+
+def notification_rows(count: int):
+    rng = random.Random(42)
+    base = time.time() - count * 60
+    for i in range(count):
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(base + i * 60))
+        yield (
+            i,
+            f"PR title {i}",
+            f"https://github.com/example/pull/{i}",
+            "Body " * 20,
+            rng.choice(REPOSITORIES),
+            "developer",
+            "Summary text",
+            "{}",
+            rng.choice(STATUSES),
+            created,
+            created,
+        )
+
+
+async def populate(db, count: int):
+    await db.executemany(
+        """
+        INSERT INTO notifications (
+            pr_number, pr_title, pr_url, pr_body, repository, author,
+            summary, ai_analysis, status, created_at, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        notification_rows(count),
+    )
+    await db.executemany(
+        "INSERT INTO user_actions (notification_id, action, comment) VALUES (?, ?, ?)",
+        ((i, "approve", None) for i in range(1, count + 1, 2)),
+    )
+    await db.commit()
+
+
+async def time_queries(db, runs: int) -> dict:
+    results = {}
+    for name, (sql, params) in QUERIES.items():
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            cursor = await db.execute(sql, params)
+            await cursor.fetchall()
+            samples.append((time.perf_counter() - start) * 1000)
+
+        cursor = await db.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        plan = "; ".join(row[3] for row in await cursor.fetchall())
+        results[name] = (statistics.median(samples), plan)
+    return results
+
+
+async def benchmark_size(count: int, runs: int, workdir: Path):
+    path = workdir / f"bench_{count}.db"
+    async with aiosqlite.connect(path) as db:
+        await db.execute("PRAGMA journal_mode = WAL")
+        await db.execute("PRAGMA synchronous = OFF")
+        await apply_migrations(db, up_to=0)
+
+        start = time.perf_counter()
+        await populate(db, count)
+        print(f"   Loaded {count:,} rows in {time.perf_counter() - start:.1f}s")
+
+        before = await time_queries(db, runs)
+        await apply_migrations(db, up_to=INDEX_MIGRATION)
+        await db.commit()
+        await db.execute("ANALYZE")
+        after = await time_queries(db, runs)
+
+    print()
+    print(f"   {'query':<14}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for name in QUERIES:
+        before_ms, before_plan = before[name]
+        after_ms, after_plan = after[name]
+        speedup = before_ms / after_ms if after_ms else float("inf")
+        print(f"   {name:<14}{before_ms:>14.3f}{after_ms:>14.3f}{speedup:>9.1f}x")
+        print(f"      before: {before_plan}")
+        print(f"      after:  {after_plan}")
+    print()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("NOTIFICATIONS DATABASE INDEX BENCHMARK")
+    print("=" * 80)
+    print()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for count in args.sizes:
+            print(f"📦 {count:,} notifications")
+            await benchmark_size(count, args.runs, Path(workdir))
+
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Simulate skewed webhook load to show how jobs are shared between repositories.
+
+One monorepo fires a burst of PR events while a few small repositories send
+a trickle. Jobs go through the real WebhookQueue and SQLite job table; the
+handler stands in for the PR pipeline (GitHub calls + AI summary) by
+sleeping for a random service time. Each scheduling mode reports per-group
+latency (enqueue to finish) and the peak number of jobs one repository had
+running at once.
+
+Modes: FIFO (jobs carry no repository, the old behaviour), round-robin
+without a cap, round-robin with a per-repository cap, and the cap plus a
+lower weight for the monorepo.
+
+Usage: python3 utils/benchmark_fair_scheduling.py [--workers 8] [--mono-events 400] [--small-repos 5] [--small-events 6]
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from app import database
+from app.db_sqlite import SQLiteBackend
+from app.services.webhook_queue import WebhookQueue
+
+MONOREPO = "org/monorepo"
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def simulate(path: Path, args, fair: bool, cap: int, weights: dict) -> tuple[dict, dict, float]:
+    database.backend = SQLiteBackend(path, readers=2)
+    await database.init_db()
+    rng = random.Random(args.seed)
+    latencies: dict[str, list[float]] = {}
+    running: dict[str, int] = {}
+    peak: dict[str, int] = {}
+    total = args.mono_events + args.small_repos * args.small_events
+    finished = asyncio.Event()
+
+    async def handler(event_type, payload):
+        event = json.loads(payload)
+        repository = event["repository"]
+        running[repository] = running.get(repository, 0) + 1
+        peak[repository] = max(peak.get(repository, 0), running[repository])
+        await asyncio.sleep(rng.uniform(args.service_ms / 2, args.service_ms * 1.5) / 1000)
+        running[repository] -= 1
+        latencies.setdefault(repository, []).append(time.perf_counter() - event["sent"])
+        if sum(map(len, latencies.values())) == total:
+            finished.set()
+
+    queue = WebhookQueue(
+        workers=args.workers, max_attempts=1, retry_base_seconds=0, retry_max_seconds=0,
+        lease_seconds=600, poll_interval=0.01, delivery_cache_size=100,
+        coalesce_seconds=0, coalesce_max_seconds=0, repo_concurrency=cap, repo_weights=weights,
+    )
+
+    async def send(repository: str):
+        payload = json.dumps({"repository": repository, "sent": time.perf_counter()})
+        await queue.enqueue("pull_request", payload, repository=repository if fair else None)
+
+    async def trickle(repository: str):
+        for _ in range(args.small_events):
+            await asyncio.sleep(args.spread_seconds / args.small_events)
+            await send(repository)
+
+    start = time.perf_counter()
+    await queue.start(handler)
+    try:
+        for _ in range(args.mono_events):
+            await send(MONOREPO)
+        await asyncio.gather(*(trickle(f"org/service-{n}") for n in range(args.small_repos)))
+        await finished.wait()
+    finally:
+        await queue.stop()
+        await database.close_db()
+    return latencies, peak, time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--cap", type=int, default=4, help="Per-repository concurrency cap")
+    parser.add_argument("--mono-events", type=int, default=400)
+    parser.add_argument("--small-repos", type=int, default=5)
+    parser.add_argument("--small-events", type=int, default=6)
+    parser.add_argument("--spread-seconds", type=float, default=2.0,
+                        help="Time over which each small repository sends its events")
+    parser.add_argument("--service-ms", type=float, default=60.0, help="Mean handler time")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    modes = [
+        ("FIFO (no repository key)", False, 0, {}),
+        ("round-robin, no cap", True, 0, {}),
+        (f"round-robin, cap {args.cap}", True, args.cap, {}),
+        (f"cap {args.cap}, monorepo weight 0.5", True, args.cap, {MONOREPO: 0.5}),
+    ]
+
+    print("=" * 80)
+    print("FAIR WEBHOOK SCHEDULING SIMULATION")
+    print("=" * 80)
+    print()
+    print(f"📦 {args.workers} workers; {args.mono_events} events from {MONOREPO} at once, "
+          f"{args.small_events} from each of {args.small_repos} small repos over "
+          f"{args.spread_seconds:g}s; ~{args.service_ms:g} ms per job")
+    print()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for n, (name, fair, cap, weights) in enumerate(modes):
+            latencies, peak, elapsed = await simulate(
+                Path(workdir) / f"mode_{n}.db", args, fair, cap, weights
+            )
+            small = [value for repo, values in latencies.items() if repo != MONOREPO for value in values]
+            small_peak = max(value for repo, value in peak.items() if repo != MONOREPO)
+            print(f"⚖️  {name}: all done in {elapsed:.2f}s")
+            print(f"   {'group':<14}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'peak running':>15}")
+            for group, values, group_peak in [
+                ("monorepo", latencies[MONOREPO], peak[MONOREPO]),
+                ("small repos", small, small_peak),
+            ]:
+                print(f"   {group:<14}{statistics.median(values) * 1000:>10.0f}"
+                      f"{percentile(values, 0.95) * 1000:>10.0f}{max(values) * 1000:>10.0f}"
+                      f"{group_peak:>15}")
+            print()
+
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent GitHub API calls: blocking PyGithub vs the async client.
+
+A local HTTP server stands in for api.github.com, answering the pull request
+and files endpoints after a fixed latency. N concurrent "summaries" (pull +
+files, as get_pr_diff_summary does) run on one event loop while a heartbeat
+task ticks every 10 ms; its worst delay is how long everything else on the
+loop (WebSockets, webhooks, dashboard requests) was frozen.
+
+Before: PyGithub called from the coroutines, as GitHubService used to.
+After: GitHubService on the shared httpx.AsyncClient.
+
+Usage: python3 utils/benchmark_github_client.py [--prs 20] [--latency-ms 50]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from github import Auth, Github
+
+from app.services.github_client import HTTP2_AVAILABLE, GitHubClient
+from app.services.github_service import GitHubService
+
+HEARTBEAT_SECONDS = 0.01
+
+
+def fake_github(latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+            host = f"http://{self.headers['Host']}"
+            parts = self.path.split("?")[0].strip("/").split("/")
+            # repos/{owner}/{repo}[/pulls/{n}[/files]]
+            full_name = f"{parts[1]}/{parts[2]}"
+            if len(parts) == 3:
+                body = {"id": 1, "name": parts[2], "full_name": full_name,
+                        "url": f"{host}/repos/{full_name}"}
+            elif len(parts) == 5:
+                body = {"id": int(parts[4]), "number": int(parts[4]), "state": "open",
+                        "additions": 40, "deletions": 8,
+                        "url": f"{host}/repos/{full_name}/pulls/{parts[4]}"}
+            else:
+                body = [{"filename": f"src/module{n}.py", "status": "modified",
+                         "additions": 10, "deletions": 2, "changes": 12} for n in range(4)]
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        # The default backlog of 5 drops concurrent connects into 1 s SYN retries
+        request_queue_size = 256
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def pygithub_summary(client: Github, number: int) -> int:
+    pull = client.get_repo("org/app").get_pull(number)
+    return len(list(pull.get_files())) + pull.additions
+
+
+async def run(summary, prs: int) -> dict:
+    lags = []
+    stop = asyncio.Event()
+
+    async def heartbeat():
+        while not stop.is_set():
+            expected = time.perf_counter() + HEARTBEAT_SECONDS
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    async def timed(number: int) -> float:
+        # From when all requests arrived, so time spent waiting behind a blocked loop counts
+        await summary(number)
+        return time.perf_counter() - start
+
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.sleep(HEARTBEAT_SECONDS * 2)
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(number) for number in range(1, prs + 1)))
+    wall = time.perf_counter() - start
+    stop.set()
+    await beat
+    return {
+        "wall": wall,
+        "p50": statistics.median(latencies),
+        "max": max(latencies),
+        "stall": max(lags, default=0.0),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--prs", type=int, default=20, help="Concurrent PR summaries")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Simulated API latency")
+    args = parser.parse_args()
+
+    server = fake_github(args.latency_ms / 1000)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # No client-side throttling, so only the blocking itself is measured
+    pygithub = Github(auth=Auth.Token("x"), base_url=base_url, seconds_between_requests=0)
+
+    async def blocking_summary(number: int):
+        # What the old GitHubService did: blocking calls inside a coroutine
+        return pygithub_summary(pygithub, number)
+
+    service = GitHubService(GitHubClient(
+        token="x", base_url=base_url, timeout_seconds=30, max_connections=args.prs * 2,
+        cache_max_bytes=0, cache_path="",
+    ))
+
+    async def async_summary(number: int):
+        return await service.get_pr_diff_summary("org/app", number)
+
+    print("=" * 80)
+    print("GITHUB CLIENT BENCHMARK")
+    print("=" * 80)
+    print()
+    print(f"📦 {args.prs} concurrent PR summaries, {args.latency_ms:.0f} ms simulated API latency;"
+          f" HTTP/2 {'available' if HTTP2_AVAILABLE else 'NOT installed (h2)'}, HTTP/1.1 here")
+    print()
+    print(f"   {'client':<22}{'wall':>10}{'p50':>10}{'max':>10}{'loop stall':>12}")
+    for name, summary in (("blocking PyGithub", blocking_summary),
+                          ("async httpx client", async_summary)):
+        result = await run(summary, args.prs)
+        print(f"   {name:<22}" + "".join(
+            f"{result[key] * 1000:>{width}.0f}ms"
+            for key, width in (("wall", 8), ("p50", 8), ("max", 8), ("stall", 10))
+        ))
+
+    await service.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-event cost of decoding GitHub webhook payloads.
+
+Compares the old path (json.loads of the whole body, then validating the dict
+into the models with head/base kept as dicts) with the endpoint's fast path
+(leading-action peek, envelope validated straight from bytes) and the
+worker's (PullRequestEvent.model_validate_json), plus orjson vs json for a
+full decode.
+
+Payloads are GitHub-shaped bodies built here (full repository objects under
+head, base and repository, like the real ones, ~30 KB), or recorded ones
+passed with --payload (raw webhook bodies saved to files).
+
+Usage: python3 utils/benchmark_webhook_decode.py [--iterations 2000] [--payload body.json ...]
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from app.models.github import PullRequestEnvelope, PullRequestEvent, Repository, User
+from app.routes.github import peek_action
+from app.utils import fast_json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class DictBranchPullRequest(BaseModel):
+    """PullRequest as it was before the lean models: head/base validated as whole dicts."""
+    number: int
+    title: str
+    html_url: str
+    state: str
+    body: str | None = None
+    user: User
+    head: dict
+    base: dict
+    additions: int = 0
+    deletions: int = 0
+    changed_files: int = 0
+
+
+class DictBranchPullRequestEvent(BaseModel):
+    action: str
+    pull_request: DictBranchPullRequest
+    repository: Repository
+    sender: User
+
+
+def github_user(login: str) -> dict:
+    base = f"https://api.github.com/users/{login}"
+    return {
+        "login": login, "id": 583231, "node_id": "MDQ6VXNlcjU4MzIzMQ==",
+        "avatar_url": "https://avatars.githubusercontent.com/u/583231?v=4", "gravatar_id": "",
+        "url": base, "html_url": f"https://github.com/{login}",
+        "followers_url": f"{base}/followers", "following_url": f"{base}/following{{/other_user}}",
+        "gists_url": f"{base}/gists{{/gist_id}}", "starred_url": f"{base}/starred{{/owner}}{{/repo}}",
+        "subscriptions_url": f"{base}/subscriptions", "organizations_url": f"{base}/orgs",
+        "repos_url": f"{base}/repos", "events_url": f"{base}/events{{/privacy}}",
+        "received_events_url": f"{base}/received_events", "type": "User", "site_admin": False,
+    }
+
+
+def github_repository(full_name: str) -> dict:
+    owner, name = full_name.split("/")
+    api = f"https://api.github.com/repos/{full_name}"
+    repository = {
+        "id": 1296269, "node_id": "MDEwOlJlcG9zaXRvcnkxMjk2MjY5", "name": name,
+        "full_name": full_name, "private": False, "owner": github_user(owner),
+        "html_url": f"https://github.com/{full_name}", "description": "A sample repository " * 4,
+        "fork": False, "url": api, "homepage": "https://example.com", "size": 108,
+        "stargazers_count": 80, "watchers_count": 80, "language": "Python",
+        "has_issues": True, "has_projects": True, "has_downloads": True, "has_wiki": True,
+        "has_pages": False, "has_discussions": False, "forks_count": 9, "archived": False,
+        "disabled": False, "open_issues_count": 3, "license": {"key": "mit", "name": "MIT License"},
+        "topics": ["octocat", "atom", "electron", "api"], "visibility": "public", "forks": 9,
+        "open_issues": 3, "watchers": 80, "default_branch": "main",
+        "created_at": "2011-01-26T19:01:12Z", "updated_at": "2011-01-26T19:14:43Z",
+        "pushed_at": "2011-01-26T19:06:43Z", "allow_squash_merge": True,
+        "allow_merge_commit": True, "allow_rebase_merge": True, "delete_branch_on_merge": False,
+    }
+    for rel in ("forks", "keys", "collaborators", "teams", "hooks", "issue_events", "events",
+                "assignees", "branches", "tags", "blobs", "git_tags", "git_refs", "trees",
+                "statuses", "languages", "stargazers", "contributors", "subscribers",
+                "subscription", "commits", "git_commits", "comments", "issue_comment",
+                "contents", "compare", "merges", "archive", "downloads", "issues", "pulls",
+                "milestones", "notifications", "labels", "releases", "deployments"):
+        repository[f"{rel}_url"] = f"{api}/{rel}{{/id}}"
+    for clone in ("git", "ssh", "clone", "svn"):
+        repository[f"{clone}_url"] = f"git://github.com/{full_name}.git"
+    return repository
+
+
+def pull_request_payload(action: str, number: int) -> bytes:
+    full_name = "test-org/awesome-app"
+    repository = github_repository(full_name)
+    api = f"https://api.github.com/repos/{full_name}"
+    payload = {
+        "action": action,
+        "number": number,
+        "pull_request": {
+            "url": f"{api}/pulls/{number}", "id": 1000 + number, "number": number,
+            "state": "open", "locked": False, "title": f"Add feature {number}",
+            "user": github_user("developer-alice"), "body": "Description of the change. " * 40,
+            "html_url": f"https://github.com/{full_name}/pull/{number}",
+            "created_at": "2024-01-01T00:00:00Z", "updated_at": "2024-01-01T00:00:00Z",
+            "requested_reviewers": [github_user("senior-dev-bob"), github_user("carol")],
+            "labels": [{"id": n, "name": f"label-{n}", "color": "f29513"} for n in range(3)],
+            "head": {"label": "alice:feature", "ref": "feature", "sha": "6dcb09b5b5",
+                     "user": github_user("developer-alice"), "repo": repository},
+            "base": {"label": "org:main", "ref": "main", "sha": "9c1d0b6f0e",
+                     "user": github_user("test-org"), "repo": repository},
+            "_links": {rel: {"href": f"{api}/pulls/{number}/{rel}"}
+                       for rel in ("self", "html", "issue", "comments", "review_comments",
+                                   "review_comment", "commits", "statuses")},
+            "merged": False, "mergeable": True, "comments": 10, "review_comments": 0,
+            "commits": 3, "additions": 100, "deletions": 3, "changed_files": 5,
+        },
+        "repository": repository,
+        "sender": github_user("developer-alice"),
+    }
+    return json.dumps(payload).encode()
+
+
+def per_event_us(decode, bodies: list[bytes], iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        decode(bodies[i % len(bodies)])
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--payload", type=Path, nargs="*", default=[],
+                        help="Recorded pull_request webhook bodies")
+    args = parser.parse_args()
+
+    bodies = [path.read_bytes() for path in args.payload] or [
+        pull_request_payload(action, number)
+        for number, action in enumerate(("opened", "synchronize", "review_requested"), 1)
+    ]
+    ignored = [body.replace(b'"action": "opened"', b'"action": "labeled"', 1) for body in bodies]
+
+    paths = [
+        ("old: json.loads + dict models", lambda body: DictBranchPullRequestEvent(**json.loads(body))),
+        ("json.loads only", json.loads),
+        ("fast_json.loads only", fast_json.loads),
+        ("endpoint: envelope from bytes", PullRequestEnvelope.model_validate_json),
+        ("worker: lean model from bytes", PullRequestEvent.model_validate_json),
+        ("ignored action: peek only", peek_action),
+    ]
+
+    print("=" * 80)
+    print("WEBHOOK DECODE BENCHMARK")
+    print("=" * 80)
+    print()
+    print(f"📦 {len(bodies)} payload(s), {sum(map(len, bodies)) // len(bodies):,} bytes on average;"
+          f" {args.iterations:,} decodes per path; orjson {'on' if orjson else 'NOT installed'}")
+    print()
+    print(f"   {'path':<34}{'µs/event':>10}{'vs old':>10}")
+
+    baseline = None
+    for name, decode in paths:
+        sample = ignored if name.startswith("ignored") else bodies
+        cost = per_event_us(decode, sample, args.iterations)
+        baseline = baseline or cost
+        print(f"   {name:<34}{cost:>10.1f}{baseline / cost:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
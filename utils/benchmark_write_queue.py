@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark write throughput of the group-commit queue against per-write commits.
+
+Runs a burst of concurrent user-action inserts through WriteQueue at several
+batch sizes, plus the old one-transaction-per-write path, under both
+synchronous=FULL (an fsync per commit) and the pool's default NORMAL.
+
+Usage: python3 utils/benchmark_write_queue.py [--writes 2000] [--batch-sizes 1 8 32 128] [--dir .]
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from app.db_migrations import apply_migrations
+from app.db_pool import DatabasePool
+from app.db_writer import WriteQueue
+
+
+async def insert_action(db):
+    cursor = await db.execute(
+        "INSERT INTO user_actions (notification_id, action, comment) VALUES (1, 'approve', 'LGTM')"
+    )
+    return cursor.lastrowid
+
+
+async def open_pool(path: Path, synchronous: str) -> DatabasePool:
+    pool = DatabasePool(path, readers=1)
+    async with pool.writer() as db:
+        await apply_migrations(db)
+    async with pool.writer() as db:
+        await db.execute(f"PRAGMA synchronous = {synchronous}")
+    return pool
+
+
+async def run_direct(pool: DatabasePool, writes: int) -> float:
+    """One transaction and commit per write (the pre-queue behaviour)."""
+    async def one():
+        async with pool.writer() as db:
+            return await insert_action(db)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(writes)))
+    return time.perf_counter() - start
+
+
+async def run_queued(pool: DatabasePool, writes: int, batch_size: int) -> tuple[float, int]:
+    queue = WriteQueue(lambda: pool, max_batch=batch_size, max_delay=0.002)
+    start = time.perf_counter()
+    await asyncio.gather(*(queue.submit(insert_action) for _ in range(writes)))
+    elapsed = time.perf_counter() - start
+    await queue.stop()
+    return elapsed, queue.batches_committed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--dir", default=".", help="Where to create the scratch databases "
+                        "(use a real disk; tmpfs hides fsync cost)")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("GROUP-COMMIT WRITE QUEUE BENCHMARK")
+    print("=" * 80)
+    print()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as workdir:
+        for synchronous in ("FULL", "NORMAL"):
+            print(f"💾 synchronous={synchronous}, {args.writes:,} concurrent writes")
+            print(f"   {'mode':<18}{'batches':>10}{'seconds':>10}{'writes/s':>12}")
+
+            pool = await open_pool(Path(workdir) / f"direct_{synchronous}.db", synchronous)
+            elapsed = await run_direct(pool, args.writes)
+            await pool.close()
+            print(f"   {'per-write commit':<18}{args.writes:>10}{elapsed:>10.2f}"
+                  f"{args.writes / elapsed:>12,.0f}")
+
+            for batch_size in args.batch_sizes:
+                path = Path(workdir) / f"queued_{synchronous}_{batch_size}.db"
+                pool = await open_pool(path, synchronous)
+                elapsed, batches = await run_queued(pool, args.writes, batch_size)
+                await pool.close()
+                print(f"   {f'queue batch={batch_size}':<18}{batches:>10}{elapsed:>10.2f}"
+                      f"{args.writes / elapsed:>12,.0f}")
+            print()
+
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
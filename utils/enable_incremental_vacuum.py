@@ -0,0 +1,32 @@
+"""
+Script to switch an existing SQLite database to incremental auto_vacuum
+
+Databases created before auto_vacuum was configured keep the pages freed by
+archiving in their free list instead of returning them to the filesystem.
+Converting one rebuilds the whole file (a full VACUUM): run it while the
+app is stopped, with free disk space about the size of the database.
+"""
+from app import database
+from app.db_sqlite import SQLiteBackend
+import asyncio
+
+
+async def enable_incremental_vacuum():
+    """Convert the database once; a no-op if it already uses incremental auto_vacuum"""
+
+    await database.init_db()
+    backend = database.get_backend()
+    try:
+        if not isinstance(backend, SQLiteBackend):
+            print("Only SQLite databases need converting")
+            return
+        if await backend.enable_incremental_vacuum():
+            print("✅ Incremental auto_vacuum enabled")
+        else:
+            print("Incremental auto_vacuum was already enabled")
+    finally:
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(enable_incremental_vacuum())
@@ -1,13 +1,18 @@
 """
 Fetch the latest PR from GitHub and add it to the database
+
+GitHub reads go through the app's ETag cache, so polling runs that find
+nothing new are answered with 304s that don't count against the rate limit.
+New PRs are fetched together in one GraphQL query (metadata, files and
+commits), which their summaries then reuse.
 """
-from github import Github, Auth
-from app.config import settings
 from app.models.github import PullRequestEvent
+from app.services.github_service import github_service
 from app.services.pr_summary_service import generate_pr_summary
 from app import database
 import asyncio
-from datetime import datetime
+
+REPOSITORY = "shubhamgupta-dev/10X_Dev_Workshop"
 
 async def fetch_and_add_pr():
     """Fetch latest PR from GitHub and add to database"""
@@ -20,102 +25,79 @@ async def fetch_and_add_pr():
     # Initialize database
     await database.init_db()
 
-    # Authenticate with GitHub
-    auth = Auth.Token(settings.github_token)
-    client = Github(auth=auth)
-
-    # Get repository
-    repo = client.get_repo("shubhamgupta-dev/10X_Dev_Workshop")
-
-    print(f"📦 Repository: {repo.full_name}")
+    print(f"📦 Repository: {REPOSITORY}")
     print()
 
     # Get the latest PRs (both open and closed)
     print("🔍 Fetching latest PRs (open and recently closed)...")
-    prs = list(repo.get_pulls(state='all', sort='created', direction='desc'))[:10]  # Last 10 PRs
+    prs = await github_service.list_pull_requests(
+        REPOSITORY, state='all', sort='created', direction='desc', limit=10
+    )  # Last 10 PRs
 
     if not prs:
         print("❌ No PRs found")
         return
 
-    # Get PRs already in database
-    existing_notifs = await database.get_all_notifications(limit=100)
-    existing_pr_numbers = {n['pr_number'] for n in existing_notifs if n['repository'] == repo.full_name}
-
     print(f"📊 Found {len(prs)} open PR(s)")
-    print(f"💾 Already in database: {existing_pr_numbers}")
     print()
 
-    for gh_pr in prs:
-        if gh_pr.number in existing_pr_numbers:
-            print(f"   ⏭️  PR #{gh_pr.number}: Already in database")
+    new_numbers = []
+    for listed_pr in prs:
+        # Only PRs without a notification need an AI summary
+        if await database.get_notification_by_pr(REPOSITORY, listed_pr["number"]):
+            print(f"   ⏭️  PR #{listed_pr['number']}: Already in database")
+        else:
+            new_numbers.append(listed_pr["number"])
+
+    # List items lack the diff stats; one query fetches everything the summaries need
+    snapshots = await github_service.get_pr_snapshots(
+        REPOSITORY, new_numbers, files=None, commits=None
+    ) if new_numbers else {}
+
+    new_prs = []
+    for number in new_numbers:
+        if number not in snapshots:
+            print(f"   ⚠️  PR #{number}: Not found in GitHub")
             continue
-
-        print(f"   🆕 PR #{gh_pr.number}: {gh_pr.title}")
-        print(f"       Author: {gh_pr.user.login}")
-        print(f"       {gh_pr.head.ref} → {gh_pr.base.ref}")
-        print(f"       Files: {gh_pr.changed_files}, +{gh_pr.additions}/-{gh_pr.deletions}")
+        gh_pr = snapshots[number]
+        print(f"   🆕 PR #{gh_pr['number']}: {gh_pr['title']}")
+        print(f"       Author: {gh_pr['user']['login']}")
+        print(f"       {gh_pr['head']['ref']} → {gh_pr['base']['ref']}")
+        print(f"       Files: {gh_pr['changed_files']}, +{gh_pr['additions']}/-{gh_pr['deletions']}")
         print()
 
-        # Create a PullRequestEvent object
-        event_dict = {
+        # Create a PullRequestEvent object (the snapshot has the webhook's fields)
+        event = PullRequestEvent.model_validate({
             "action": "opened",
-            "number": gh_pr.number,
-            "pull_request": {
-                "id": gh_pr.id,
-                "number": gh_pr.number,
-                "title": gh_pr.title,
-                "body": gh_pr.body or "",
-                "state": gh_pr.state,
-                "html_url": gh_pr.html_url,
-                "user": {
-                    "login": gh_pr.user.login,
-                    "avatar_url": gh_pr.user.avatar_url
-                },
-                "head": {
-                    "ref": gh_pr.head.ref,
-                    "sha": gh_pr.head.sha
-                },
-                "base": {
-                    "ref": gh_pr.base.ref,
-                    "sha": gh_pr.base.sha
-                },
-                "created_at": gh_pr.created_at.isoformat(),
-                "updated_at": gh_pr.updated_at.isoformat(),
-                "additions": gh_pr.additions,
-                "deletions": gh_pr.deletions,
-                "changed_files": gh_pr.changed_files
-            },
-            "repository": {
-                "id": repo.id,
-                "name": repo.name,
-                "full_name": repo.full_name,
-                "owner": {
-                    "login": repo.owner.login
-                },
-                "html_url": repo.html_url
-            },
-            "sender": {
-                "login": gh_pr.user.login
-            }
-        }
+            "pull_request": gh_pr,
+            "repository": gh_pr["repository"],
+            "sender": gh_pr["user"],
+        })
 
         print(f"   🤖 Generating AI summary...")
-        event = PullRequestEvent(**event_dict)
-        pr_summary = await generate_pr_summary(event)
-
-        print(f"   💾 Saving to database...")
-        notification_id = await database.save_notification(event, pr_summary)
+        pr_summary = await generate_pr_summary(
+            event, github_service.fetch_context(REPOSITORY, number, gh_pr)
+        )
 
-        # Update status if PR is closed or merged
-        if gh_pr.merged:
-            await database.update_notification_status(notification_id, "merged")
-            print(f"   🎉 Marked as merged")
-        elif gh_pr.state == "closed":
-            await database.update_notification_status(notification_id, "closed")
-            print(f"   🔒 Marked as closed")
+        new_prs.append((gh_pr, event, pr_summary))
+        print()
 
-        print(f"   ✅ Notification #{notification_id} saved!")
+    if new_prs:
+        print(f"💾 Saving {len(new_prs)} PR(s) to database...")
+        notification_ids = await database.upsert_notifications(
+            [(event, pr_summary) for _, event, pr_summary in new_prs]
+        )
+
+        for (gh_pr, _, _), notification_id in zip(new_prs, notification_ids):
+            # Update status if PR is closed or merged
+            if gh_pr["merged"]:
+                await database.update_notification_status(notification_id, "merged")
+                print(f"   🎉 PR #{gh_pr['number']}: Marked as merged")
+            elif gh_pr["state"] == "closed":
+                await database.update_notification_status(notification_id, "closed")
+                print(f"   🔒 PR #{gh_pr['number']}: Marked as closed")
+
+            print(f"   ✅ Notification #{notification_id} saved!")
         print()
 
     print("=" * 80)
@@ -123,5 +105,14 @@ async def fetch_and_add_pr():
     print("🔗 View dashboard: http://localhost:8000/dashboard/?token=demo-token-123")
     print("=" * 80)
 
+async def main():
+    try:
+        await fetch_and_add_pr()
+    finally:
+        # Saves the ETag cache for the next run
+        await github_service.close()
+        # Pooled connections run on worker threads that must be shut down
+        await database.close_db()
+
 if __name__ == "__main__":
-    asyncio.run(fetch_and_add_pr())
+    asyncio.run(main())
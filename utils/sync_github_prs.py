@@ -1,11 +1,16 @@
 """
 Script to sync GitHub PR status with the database
+
+The states of the PRs in the database are fetched in batched GraphQL
+queries (25 PRs per round trip) rather than by listing every PR of the
+repository.
 """
-from github import Github, Auth
-from app.config import settings
 from app import database
+from app.services.github_service import github_service
 import asyncio
 
+REPOSITORY = "shubhamgupta-dev/10X_Dev_Workshop"
+
 async def sync_prs():
     """Check GitHub PRs and update database"""
 
@@ -17,46 +22,42 @@ async def sync_prs():
     # Initialize database
     await database.init_db()
 
-    # Authenticate with GitHub
-    auth = Auth.Token(settings.github_token)
-    client = Github(auth=auth)
-
-    # Get repository
-    repo = client.get_repo("shubhamgupta-dev/10X_Dev_Workshop")
-
-    print(f"📦 Repository: {repo.full_name}")
+    print(f"📦 Repository: {REPOSITORY}")
     print()
 
-    # Get all PRs from GitHub
+    # Page through the whole inbox rather than only the newest rows
+    notifications = [
+        notif async for notif in database.iter_notifications()
+        # Only sync for the same repository
+        if notif['repository'] == REPOSITORY
+    ]
+
+    # Get the PRs from GitHub (state only: no files or commits)
     print("🔍 Checking GitHub PRs...")
     github_prs = {}
 
-    for pr in repo.get_pulls(state='all'):
-        github_prs[pr.number] = {
-            'number': pr.number,
-            'title': pr.title,
-            'state': pr.state,
-            'merged': pr.merged,
-            'url': pr.html_url
+    snapshots = await github_service.get_pr_snapshots(
+        REPOSITORY, [notif['pr_number'] for notif in notifications], files=0, commits=0
+    ) if notifications else {}
+    for pr in snapshots.values():
+        github_prs[pr['number']] = {
+            'number': pr['number'],
+            'title': pr['title'],
+            'state': pr['state'],
+            'merged': pr['merged'],
+            'url': pr['html_url']
         }
-        status = "merged" if pr.merged else pr.state
-        print(f"   PR #{pr.number}: {pr.title[:50]}... - {status}")
+        status = "merged" if pr['merged'] else pr['state']
+        print(f"   PR #{pr['number']}: {pr['title'][:50]}... - {status}")
 
     print()
 
     # Get notifications from database
     print("💾 Checking Database Notifications...")
-    notifications = await database.get_all_notifications(limit=100)
-
     updates_made = False
 
     for notif in notifications:
         pr_num = notif['pr_number']
-        notif_repo = notif['repository']
-
-        # Only sync for the same repository
-        if notif_repo != repo.full_name:
-            continue
 
         if pr_num in github_prs:
             gh_pr = github_prs[pr_num]
@@ -104,5 +105,14 @@ async def sync_prs():
     print()
     print("=" * 80)
 
+async def main():
+    try:
+        await sync_prs()
+    finally:
+        # Saves the ETag cache for the next run
+        await github_service.close()
+        # Pooled connections run on worker threads that must be shut down
+        await database.close_db()
+
 if __name__ == "__main__":
-    asyncio.run(sync_prs())
+    asyncio.run(main())
@@ -80,8 +80,8 @@ def trigger_webhook():
         print(f"Status Code: {response.status_code}")
         print(f"Response: {response.text}")
 
-        if response.status_code == 200:
-            print("\n✅ Webhook triggered successfully!")
+        if response.status_code == 202:
+            print("\n✅ Webhook queued; a worker will process it shortly")
             print("🔗 Check the dashboard: http://localhost:8000/dashboard/?token=demo-token-123")
         else:
             print(f"\n❌ Error: {response.status_code}")